@@ -1,35 +1,322 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""
+神迹输入法 - 词典形态与负载分析工具
+对词典源文件(.dict.yaml)或预编译文件(.dat)做一次遍历，输出：
+1. 每个拼音的候选数、拼音长度、词语长度直方图
+2. 字符级Trie（与应用内PinyinTrie一致，去空格连写）的分叉度与深度
+3. 按段落的字节构成（拼音、词语、词频、头部/长度字段）
+4. 截断损失：各个每拼音上限会丢掉多少词频总量
+
+预编译文件中，版本3文件直接解析；合并索引与有序索引文件通过 trie_reader 的读取器遍历键和候选
+（合并索引的候选取各来源的最高词频），字节构成按文件分段统计；
+其他分段容器（纠错索引、预热列表等）没有拼音键 -> 候选的结构，只输出分段字节构成。
+
+用法: python analyze_pinyin.py [文件...] [--json 输出.json] [--caps 10,20,40,50]
+不带参数时分析 chars.dict.yaml
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+from build_universal_trie import remove_tone_marks
+from trie_format import is_container, iter_v3_entries, read_container
+from trie_reader import detect_formats, open_reader
+
+DEFAULT_INPUT = 'app/src/main/assets/cn_dicts/chars.dict.yaml'
+DEFAULT_CAPS = [10, 20, 40, 50, 100, 200, 500]
+
+# 应用加载时的过滤规则（TrieManager.deserializeSimplifiedFormat）
+APP_NODE_CAP = 50
+APP_MIN_FREQUENCY = 100
+
+
+def iter_source_entries(file_path: str, sizes: Counter) -> Iterator[Tuple[str, str, int]]:
+    """逐行读取词典源文件（拼音去声调，与构建工具一致），同时按段落累计字节数"""
+    with open(file_path, 'rb') as f:
+        for raw in f:
+            parts = raw.rstrip(b'\r\n').split(b'\t')
+            if len(parts) < 3:
+                sizes['header'] += len(raw)
+                continue
+            try:
+                frequency = int(parts[2])
+            except ValueError:
+                sizes['header'] += len(raw)
+                continue
+            word = parts[0].decode('utf-8').strip()
+            pinyin = remove_tone_marks(parts[1].decode('utf-8').strip())
+            sizes['words'] += len(parts[0])
+            sizes['keys'] += len(parts[1])
+            sizes['frequencies'] += len(parts[2])
+            sizes['separators'] += len(raw) - len(parts[0]) - len(parts[1]) - len(parts[2])
+            yield word, pinyin, frequency
+
+
+def iter_dat_entries(data: bytes, sizes: Counter) -> Iterator[Tuple[str, str, int]]:
+    """读取版本3预编译文件，同时按段落累计字节数"""
+    sizes['header'] += 8
+    for key, words in iter_v3_entries(data):
+        key_bytes = len(key.encode('utf-8'))
+        sizes['keys'] += key_bytes
+        sizes['length_fields'] += 8
+        for word, frequency in words:
+            sizes['words'] += len(word.encode('utf-8'))
+            sizes['length_fields'] += 4
+            sizes['frequencies'] += 4
+            yield word, key, frequency
+
+
+def iter_reader_entries(file_path: str, format_name: str) -> Iterator[Tuple[str, str, int]]:
+    """通过 trie_reader 读取合并索引或有序索引文件，每个键下的同一词语只计一次"""
+    reader = open_reader(file_path, format_name)
+    try:
+        for key, words in reader.iter_entries():
+            for word, frequency in words:
+                yield word, key, frequency
+    finally:
+        reader.close()
+
+
+def histogram(values: Counter) -> Dict[str, int]:
+    """计数直方图，按数值升序输出"""
+    return {str(k): values[k] for k in sorted(values)}
+
+
+def bucketed(values: List[int]) -> Dict[str, int]:
+    """按2的幂分桶的直方图，用于长尾分布"""
+    buckets = Counter()
+    for value in values:
+        upper = 1
+        while upper < value:
+            upper *= 2
+        buckets[upper] += 1
+    result = {}
+    for upper in sorted(buckets):
+        lower = upper // 2 + 1 if upper > 1 else upper
+        result[f"{lower}-{upper}" if lower != upper else str(upper)] = buckets[upper]
+    return result
+
+
+def analyze_char_trie(keys: List[str]) -> Dict:
+    """模拟应用内PinyinTrie（去空格连写），统计节点数、分叉度和深度"""
+    root: Dict = {}
+    for key in keys:
+        node = root
+        for char in key.replace(' ', '').lower():
+            node = node.setdefault(char, {})
+
+    fan_out = Counter()
+    depth = Counter()
+    node_count = 0
+    stack = [(root, 0)]
+    while stack:
+        node, level = stack.pop()
+        node_count += 1
+        fan_out[len(node)] += 1
+        depth[level] += 1
+        for child in node.values():
+            stack.append((child, level + 1))
+
+    inner = node_count - fan_out[0]
+    return {
+        'nodes': node_count,
+        'leaves': fan_out[0],
+        'max_depth': max(depth) if depth else 0,
+        'avg_fan_out': round((node_count - 1) / inner, 3) if inner else 0,
+        'fan_out_histogram': histogram(fan_out),
+        'nodes_per_depth': histogram(depth),
+    }
+
+
+def truncation_loss(per_key: Dict[str, List[int]], caps: List[int], total_mass: int) -> Dict:
+    """计算每个上限丢掉的词频总量与词条数"""
+    result = {}
+    for cap in caps:
+        dropped_mass = dropped_entries = keys_hit = 0
+        for freqs in per_key.values():
+            if len(freqs) > cap:
+                keys_hit += 1
+                dropped_entries += len(freqs) - cap
+                dropped_mass += sum(freqs[cap:])
+        result[str(cap)] = {
+            'keys_truncated': keys_hit,
+            'entries_dropped': dropped_entries,
+            'mass_dropped': dropped_mass,
+            'mass_dropped_pct': round(dropped_mass * 100 / total_mass, 3) if total_mass else 0,
+        }
+    return result
+
+
+def app_load_loss(per_key: Dict[str, List[int]], total_mass: int) -> Dict:
+    """模拟非chars词典在应用加载时的过滤：词频>100且每个连写拼音节点最多50个词"""
+    merged: Dict[str, List[int]] = {}
+    for key, freqs in per_key.items():
+        merged.setdefault(key.replace(' ', ''), []).extend(f for f in freqs if f > APP_MIN_FREQUENCY)
+    kept_mass = kept_entries = 0
+    for freqs in merged.values():
+        freqs.sort(reverse=True)
+        kept_mass += sum(freqs[:APP_NODE_CAP])
+        kept_entries += min(len(freqs), APP_NODE_CAP)
+    total_entries = sum(len(freqs) for freqs in per_key.values())
+    return {
+        'entries_kept': kept_entries,
+        'entries_dropped': total_entries - kept_entries,
+        'mass_dropped_pct': round((total_mass - kept_mass) * 100 / total_mass, 3) if total_mass else 0,
+    }
+
+
+def analyze_file(file_path: str, caps: List[int]) -> Dict:
+    """一次遍历分析单个文件"""
+    sizes = Counter()
+    with open(file_path, 'rb') as f:
+        head = f.read(4)
+
+    if file_path.endswith('.dat') and is_container(head):
+        with open(file_path, 'rb') as f:
+            sections = read_container(f.read())
+        sizes.update({tag: len(view) for tag, view in sections.items()})
+        formats = detect_formats(file_path)
+        if not formats:
+            return {
+                'file': file_path,
+                'kind': 'container',
+                'file_bytes': os.path.getsize(file_path),
+                'bytes_by_section': dict(sizes),
+            }
+        kind = formats[0]
+        entries = iter_reader_entries(file_path, kind)
+    elif file_path.endswith('.dat'):
+        with open(file_path, 'rb') as f:
+            entries = iter_dat_entries(f.read(), sizes)
+            kind = 'v3'
+    else:
+        entries = iter_source_entries(file_path, sizes)
+        kind = 'source'
+
+    per_key: Dict[str, List[int]] = {}
+    word_lengths = Counter()
+    total_mass = 0
+    for word, key, frequency in entries:
+        per_key.setdefault(key, []).append(frequency)
+        word_lengths[len(word)] += 1
+        total_mass += max(frequency, 0)
+
+    for freqs in per_key.values():
+        freqs.sort(reverse=True)
+
+    candidates = [len(freqs) for freqs in per_key.values()]
+    key_chars = Counter(len(key.replace(' ', '')) for key in per_key)
+    key_syllables = Counter(len(key.split()) for key in per_key)
+    large_keys = sorted(per_key.items(), key=lambda x: len(x[1]), reverse=True)
+    top_keys = large_keys[:15]
+
+    return {
+        'file': file_path,
+        'kind': kind,
+        'file_bytes': os.path.getsize(file_path),
+        'keys': len(per_key),
+        'entries': sum(candidates),
+        'frequency_mass': total_mass,
+        'top_keys': [[key, len(freqs)] for key, freqs in top_keys],
+        'keys_over_200': [[key, len(freqs)] for key, freqs in large_keys if len(freqs) > 200],
+        'keys_over_500': [[key, len(freqs)] for key, freqs in large_keys if len(freqs) > 500],
+        'candidates_per_key': bucketed(candidates),
+        'key_length_chars': histogram(key_chars),
+        'key_length_syllables': histogram(key_syllables),
+        'word_length_chars': histogram(word_lengths),
+        'char_trie': analyze_char_trie(list(per_key)),
+        'bytes_by_section': dict(sizes),
+        'truncation_loss': truncation_loss(per_key, caps, total_mass),
+        'app_load_loss': app_load_loss(per_key, total_mass),
+    }
+
+
+def print_report(report: Dict):
+    """输出文本报告"""
+    print("=" * 60)
+    print(f"文件: {report['file']} ({report['kind']}, {report['file_bytes']} 字节)")
+    print("=" * 60)
+
+    if report['kind'] == 'container':
+        print("分段字节构成:")
+        for tag, size in report['bytes_by_section'].items():
+            print(f"  {tag}: {size} 字节")
+        return
 
-import collections
-
-def analyze_chars_dict():
-    pinyin_count = collections.Counter()
-    
-    with open('app/src/main/assets/cn_dicts/chars.dict.yaml', 'r', encoding='utf-8') as f:
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) >= 3:
-                pinyin_count[parts[1]] += 1
-    
     print('拼音词条数量排行（前15）:')
-    for pinyin, count in pinyin_count.most_common(15):
+    for pinyin, count in report['top_keys']:
         print(f'{pinyin}: {count}个词条')
-    
-    print(f'\n总拼音数: {len(pinyin_count)}')
-    print(f'总词条数: {sum(pinyin_count.values())}')
-    
-    # 统计超过200个词条的拼音
-    over_200 = [(pinyin, count) for pinyin, count in pinyin_count.items() if count > 200]
-    print(f'\n超过200个词条的拼音数量: {len(over_200)}')
-    for pinyin, count in sorted(over_200, key=lambda x: x[1], reverse=True):
-        print(f'  {pinyin}: {count}个词条')
-    
-    # 统计超过500个词条的拼音
-    over_500 = [(pinyin, count) for pinyin, count in pinyin_count.items() if count > 500]
-    print(f'\n超过500个词条的拼音数量: {len(over_500)}')
-    for pinyin, count in sorted(over_500, key=lambda x: x[1], reverse=True):
-        print(f'  {pinyin}: {count}个词条')
+
+    print(f"\n总拼音数: {report['keys']}")
+    print(f"总词条数: {report['entries']}")
+
+    for limit in (200, 500):
+        over = report[f'keys_over_{limit}']
+        print(f'\n超过{limit}个词条的拼音数量: {len(over)}')
+        for pinyin, count in over:
+            print(f'  {pinyin}: {count}个词条')
+
+    def show(title, hist):
+        print(f"\n{title}:")
+        for bucket, count in hist.items():
+            print(f"  {bucket:>10}: {count}")
+
+    show("每拼音候选数分布", report['candidates_per_key'])
+    show("拼音长度分布（字母）", report['key_length_chars'])
+    show("拼音长度分布（音节）", report['key_length_syllables'])
+    show("词语长度分布（字）", report['word_length_chars'])
+
+    trie = report['char_trie']
+    print(f"\n字符Trie: 节点 {trie['nodes']}，叶子 {trie['leaves']}，"
+          f"最大深度 {trie['max_depth']}，平均分叉 {trie['avg_fan_out']}")
+    show("分叉度分布", trie['fan_out_histogram'])
+
+    print("\n字节构成:")
+    total = sum(report['bytes_by_section'].values()) or 1
+    for section, size in sorted(report['bytes_by_section'].items(), key=lambda x: -x[1]):
+        print(f"  {section:>14}: {size:>10} 字节 ({size * 100 / total:.1f}%)")
+
+    print("\n截断损失（每拼音上限）:")
+    for cap, loss in report['truncation_loss'].items():
+        print(f"  上限 {cap:>4}: 截断 {loss['keys_truncated']} 个拼音，丢弃 {loss['entries_dropped']} 个词条，"
+              f"词频总量损失 {loss['mass_dropped_pct']}%")
+
+    load = report['app_load_loss']
+    print(f"\n应用加载过滤（词频>{APP_MIN_FREQUENCY}，每节点{APP_NODE_CAP}词，chars除外）: "
+          f"保留 {load['entries_kept']}，丢弃 {load['entries_dropped']}，词频总量损失 {load['mass_dropped_pct']}%")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="词典形态与负载分析")
+    parser.add_argument('files', nargs='*', default=[DEFAULT_INPUT], help="词典源文件或预编译.dat文件")
+    parser.add_argument('--caps', default=','.join(map(str, DEFAULT_CAPS)), help="要评估的每拼音上限，逗号分隔")
+    parser.add_argument('--json', dest='json_path', help="把完整报告写入JSON文件")
+    parser.add_argument('--quiet', action='store_true', help="不输出文本报告")
+    args = parser.parse_args()
+
+    caps = [int(c) for c in args.caps.split(',') if c]
+    reports = []
+    for file_path in args.files:
+        if not os.path.exists(file_path):
+            print(f"❌ 文件不存在: {file_path}")
+            return 1
+        report = analyze_file(file_path, caps)
+        if not args.quiet:
+            print_report(report)
+        reports.append(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n📁 JSON报告: {args.json_path}")
+    return 0
+
 
 if __name__ == '__main__':
-    analyze_chars_dict() 
\ No newline at end of file
+    sys.exit(main())
@@ -17,10 +17,14 @@ import pickle
 import struct
 from typing import Dict, List, Tuple, Optional
 from collections import defaultdict
+from dict_parser import RimeDictParser
+from pinyin_alias import canonical_key
 import unicodedata
 
 class WordItem:
     """词语项，对应Java中的WordItem类"""
+    __slots__ = ('word', 'frequency')
+
     def __init__(self, word: str, frequency: int):
         self.word = word
         self.frequency = frequency
@@ -29,76 +33,156 @@ class WordItem:
         return f"WordItem(word='{self.word}', frequency={self.frequency})"
 
 class TrieNode:
-    """Trie树节点，对应Java中的TrieNode类"""
+    """Trie树节点记录，对应Java中的TrieNode类
+
+    节点本身不再单独分配对象：子节点关系保存在PinyinTrie的并行数组中，
+    这里只是按下标访问arena的轻量视图，供需要节点接口的调用方使用。
+    """
+    __slots__ = ('trie', 'index')
     MAX_WORDS_PER_NODE = 50
     
-    def __init__(self):
-        self.children: Dict[str, 'TrieNode'] = {}
-        self.words: List[WordItem] = []
-        self.is_end_of_word = False
-    
-    def add_word(self, word: str, frequency: int) -> bool:
-        """添加词语到节点"""
-        # 如果列表未满，直接添加
-        if len(self.words) < self.MAX_WORDS_PER_NODE:
-            self.words.append(WordItem(word, frequency))
-            self.words.sort(key=lambda x: x.frequency, reverse=True)
-            return True
-        
-        # 如果列表已满，检查是否可以替换最低频率的词
-        lowest_freq_item = min(self.words, key=lambda x: x.frequency)
-        if frequency > lowest_freq_item.frequency:
-            self.words.remove(lowest_freq_item)
-            self.words.append(WordItem(word, frequency))
-            self.words.sort(key=lambda x: x.frequency, reverse=True)
-            return True
-        
-        return False
+    def __init__(self, trie: 'PinyinTrie', index: int):
+        self.trie = trie
+        self.index = index
     
-    def calculate_memory_stats(self) -> Tuple[int, int]:
-        """计算内存统计信息：(节点数, 词语数)"""
-        node_count = 1
-        word_count = len(self.words)
-        
-        for child in self.children.values():
-            child_nodes, child_words = child.calculate_memory_stats()
-            node_count += child_nodes
-            word_count += child_words
-        
-        return node_count, word_count
+    @property
+    def children(self) -> Dict[str, 'TrieNode']:
+        return {char: TrieNode(self.trie, child) for char, child in self.trie.iter_children(self.index)}
+    
+    @property
+    def words(self) -> List[WordItem]:
+        return self.trie.node_words[self.index] or []
+    
+    @property
+    def is_end_of_word(self) -> bool:
+        return self.trie.node_words[self.index] is not None
+
+def add_word(words: List[WordItem], word: str, frequency: int) -> bool:
+    """添加词语到节点的词语列表（按词频降序，同词频保持插入顺序），超过上限时替换最低词频的词"""
+    if len(words) >= TrieNode.MAX_WORDS_PER_NODE:
+        # 列表已满：只有词频高于最低词频时才替换（移除最低词频中最早插入的一个）
+        lowest = words[-1].frequency
+        if frequency <= lowest:
+            return False
+        position = len(words) - 1
+        while position > 0 and words[position - 1].frequency == lowest:
+            position -= 1
+        del words[position]
+    
+    # 插入到所有词频不低于它的词之后
+    position = len(words)
+    while position > 0 and words[position - 1].frequency < frequency:
+        position -= 1
+    words.insert(position, WordItem(word, frequency))
+    return True
 
 class PinyinTrie:
-    """拼音Trie树，对应Java中的PinyinTrie类"""
+    """拼音Trie树，对应Java中的PinyinTrie类
+
+    节点以下标表示，存放在一组并行数组（arena）中：
+        edge_char[i]     进入节点i的字符
+        first_child[i]   第一个子节点下标，-1表示没有
+        last_child[i]    最后一个子节点下标，追加子节点时保持插入顺序
+        next_sibling[i]  下一个兄弟节点下标，-1表示没有
+        node_words[i]    节点上的词语列表，只有词语结尾节点才分配
+    """
+    ROOT = 0
+    
     def __init__(self):
-        self.root = TrieNode()
+        self.edge_char: List[str] = ['']
+        self.first_child: List[int] = [-1]
+        self.last_child: List[int] = [-1]
+        self.next_sibling: List[int] = [-1]
+        self.node_words: List[Optional[List[WordItem]]] = [None]
         self.syllable_separator = "'"
     
+    @property
+    def root(self) -> TrieNode:
+        return TrieNode(self, self.ROOT)
+    
+    def _child(self, node: int, char: str) -> int:
+        """查找字符对应的子节点，不存在时返回-1"""
+        child = self.first_child[node]
+        edge_char = self.edge_char
+        next_sibling = self.next_sibling
+        while child >= 0 and edge_char[child] != char:
+            child = next_sibling[child]
+        return child
+    
+    def _add_child(self, node: int, char: str) -> int:
+        child = len(self.edge_char)
+        self.edge_char.append(char)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        self.node_words.append(None)
+        if self.last_child[node] < 0:
+            self.first_child[node] = child
+        else:
+            self.next_sibling[self.last_child[node]] = child
+        self.last_child[node] = child
+        return child
+    
+    def iter_children(self, node: int):
+        """按插入顺序返回 (字符, 子节点下标)"""
+        child = self.first_child[node]
+        while child >= 0:
+            yield self.edge_char[child], child
+            child = self.next_sibling[child]
+    
     def insert(self, pinyin: str, word: str, frequency: int):
         """插入拼音和对应的汉字"""
-        current = self.root
+        current = self.ROOT
         
         # 遍历拼音的每个字符
         for char in pinyin:
-            if char not in current.children:
-                current.children[char] = TrieNode()
-            current = current.children[char]
-        
-        # 标记为词语结尾
-        current.is_end_of_word = True
+            child = self._child(current, char)
+            if child < 0:
+                child = self._add_child(current, char)
+            current = child
         
-        # 添加词语到当前节点
-        current.add_word(word, frequency)
+        # 词语结尾节点才分配词语列表
+        words = self.node_words[current]
+        if words is None:
+            words = self.node_words[current] = []
+        add_word(words, word, frequency)
+    
+    def iter_entries(self):
+        """先序遍历（子节点按插入顺序）返回 (拼音, 词语列表)
+
+        使用显式栈和单个路径缓冲区，不递归、不在每层拼接字符串，只在词语结尾节点生成拼音。
+        """
+        path: List[str] = []
+        stack = [(self.ROOT, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth:
+                del path[depth - 1:]
+                path.append(self.edge_char[node])
+            words = self.node_words[node]
+            if words:
+                yield ''.join(path), words
+            
+            # 逆序压栈，使子节点按插入顺序出栈
+            children = []
+            child = self.first_child[node]
+            while child >= 0:
+                children.append(child)
+                child = self.next_sibling[child]
+            for child in reversed(children):
+                stack.append((child, depth + 1))
     
     def get_memory_stats(self) -> Tuple[int, int]:
-        """获取内存统计信息"""
-        return self.root.calculate_memory_stats()
+        """获取内存统计信息：(节点数, 词语数)"""
+        word_count = sum(len(words) for words in self.node_words if words)
+        return len(self.edge_char), word_count
     
     def is_empty(self) -> bool:
         """判断Trie树是否为空"""
-        return len(self.root.children) == 0
+        return self.first_child[self.ROOT] < 0
 
 def remove_tone_marks(pinyin: str) -> str:
-    """去除拼音中的声调符号"""
+    """去除拼音中的声调符号，ü 的各种写法统一为规范写法（见 pinyin_alias）"""
     # 声调符号映射表
     tone_map = {
         'ā': 'a', 'á': 'a', 'ǎ': 'a', 'à': 'a',
@@ -106,7 +190,7 @@ def remove_tone_marks(pinyin: str) -> str:
         'ī': 'i', 'í': 'i', 'ǐ': 'i', 'ì': 'i',
         'ō': 'o', 'ó': 'o', 'ǒ': 'o', 'ò': 'o',
         'ū': 'u', 'ú': 'u', 'ǔ': 'u', 'ù': 'u',
-        'ǖ': 'ü', 'ǘ': 'ü', 'ǚ': 'ü', 'ǜ': 'ü', 'ü': 'v',
+        'ǖ': 'ü', 'ǘ': 'ü', 'ǚ': 'ü', 'ǜ': 'ü',
         'ń': 'n', 'ň': 'n', 'ǹ': 'n'
     }
     
@@ -114,7 +198,7 @@ def remove_tone_marks(pinyin: str) -> str:
     for char in pinyin:
         result += tone_map.get(char, char)
     
-    return result
+    return canonical_key(result)
 
 def parse_dict_file(file_path: str) -> List[Tuple[str, str, int]]:
     """解析词典文件，返回(词语, 拼音, 词频)的列表"""
@@ -123,32 +207,14 @@ def parse_dict_file(file_path: str) -> List[Tuple[str, str, int]]:
     print(f"正在解析词典文件: {file_path}")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            line_count = 0
-            for line in f:
-                line_count += 1
-                if line_count % 50000 == 0:
-                    print(f"已处理 {line_count} 行...")
-                
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # 解析格式：词语\t拼音\t词频
-                parts = line.split('\t')
-                if len(parts) >= 3:
-                    word = parts[0].strip()
-                    pinyin = parts[1].strip()
-                    try:
-                        frequency = int(parts[2].strip())
-                        
-                        # 去除拼音声调
-                        pinyin_no_tone = remove_tone_marks(pinyin)
-                        
-                        entries.append((word, pinyin_no_tone, frequency))
-                    except ValueError:
-                        print(f"警告：无法解析词频，跳过行 {line_count}: {line}")
-                        continue
+        # 字节级解析：跳过YAML头部，按columns声明的列顺序取 词语/拼音/词频，拼音去除声调
+        with RimeDictParser(file_path) as parser:
+            for entry in parser.iter_entries(code_transform=remove_tone_marks):
+                entries.append(entry)
+                if len(entries) % 50000 == 0:
+                    print(f"已处理 {len(entries)} 个词条...")
+            if parser.skipped:
+                print(f"警告：跳过 {parser.skipped} 行无法解析的词条")
     
     except Exception as e:
         print(f"错误：解析文件失败 - {e}")
@@ -205,24 +271,8 @@ def save_trie_to_file(trie: PinyinTrie, output_path: str):
         # 确保输出目录存在
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # 收集所有拼音条目
-        trie_data = {}
-        
-        def collect_words(node, current_pinyin=""):
-            """递归收集所有词语"""
-            if node.words:
-                if current_pinyin not in trie_data:
-                    trie_data[current_pinyin] = []
-                for word_item in node.words:
-                    trie_data[current_pinyin].append({
-                        'word': word_item.word,
-                        'frequency': word_item.frequency
-                    })
-            
-            for char, child_node in node.children.items():
-                collect_words(child_node, current_pinyin + char)
-        
-        collect_words(trie.root)
+        # 收集所有拼音条目（每个节点对应唯一拼音，直接引用节点上的词语列表）
+        trie_data = list(trie.iter_entries())
         
         with open(output_path, 'wb') as f:
             # 写入版本号（使用LITTLE_ENDIAN）
@@ -232,7 +282,7 @@ def save_trie_to_file(trie: PinyinTrie, output_path: str):
             f.write(struct.pack('<i', len(trie_data)))
             
             # 写入每个条目
-            for pinyin, words in trie_data.items():
+            for pinyin, words in trie_data:
                 # 写入拼音长度和拼音
                 pinyin_bytes = pinyin.encode('utf-8')
                 f.write(struct.pack('<i', len(pinyin_bytes)))
@@ -243,10 +293,10 @@ def save_trie_to_file(trie: PinyinTrie, output_path: str):
                 
                 # 写入每个词语
                 for word_item in words:
-                    word_bytes = word_item['word'].encode('utf-8')
+                    word_bytes = word_item.word.encode('utf-8')
                     f.write(struct.pack('<i', len(word_bytes)))
                     f.write(word_bytes)
-                    f.write(struct.pack('<i', word_item['frequency']))
+                    f.write(struct.pack('<i', word_item.frequency))
         
         # 验证文件
         file_size = os.path.getsize(output_path)
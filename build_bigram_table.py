@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 下一词联想表构建工具
+功能：
+1. 解析关联词典(correlation)和联想词典(associational)
+2. 把每个词组在词表边界处拆成 (前词, 后继词) 对，按词频累计权重
+3. 每个前词保留权重最高的N个后继词，分数量化为1字节
+4. 以CSR布局（偏移表 + 扁平数组）写出，所有词共享同一个词池
+
+上屏一个词后，联想结果就是一次数组切片：
+    successors = SUCC[OFFS[id]:OFFS[id+1]]
+"""
+
+import argparse
+import math
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+from trie_format import (
+    MappedFile, StringPool, load_source_entries, load_v3_file, pack_array,
+    pack_json, pack_string_pool, read_container, trie_asset_path, unpack_json,
+    write_container,
+)
+
+DEFAULT_SOURCES = ['correlation', 'associational']
+DEFAULT_VOCAB = ['base', 'chars']
+DEFAULT_OUTPUT = "app/src/main/assets/trie/next_word_table.dat"
+
+
+def load_vocabulary(vocab_dicts: List[str]) -> Set[str]:
+    """读取用于切分词组的词表，源文件缺失时退回预编译Trie文件"""
+    vocabulary = set()
+    for name in vocab_dicts:
+        entries = load_source_entries(name)
+        if entries is not None:
+            vocabulary.update(word for word, _, _ in entries)
+        elif os.path.exists(trie_asset_path(name)):
+            for _, words in load_v3_file(trie_asset_path(name)).items():
+                vocabulary.update(word for word, _ in words)
+        else:
+            print(f"⚠️ 词表词典不存在，跳过: {name}")
+    return vocabulary
+
+
+def collect_bigrams(phrases: List[Tuple[str, str, int]], vocabulary: Set[str]) -> Dict[str, Dict[str, int]]:
+    """在词表边界处拆分词组，累计 前词 -> 后继词 的权重"""
+    bigrams: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    for word, _, frequency in phrases:
+        for split in range(1, len(word)):
+            head, tail = word[:split], word[split:]
+            if head in vocabulary and tail in vocabulary:
+                bigrams[head][tail] += max(frequency, 1)
+
+    return bigrams
+
+
+def quantize_score(weight: int, max_weight: int) -> int:
+    """对数量化到0-255，保留排序且压缩长尾"""
+    if max_weight <= 0:
+        return 0
+    return max(1, round(255 * math.log1p(weight) / math.log1p(max_weight)))
+
+
+def build_table(bigrams: Dict[str, Dict[str, int]], top_n: int) -> Dict:
+    """构建CSR联想表：共享词池 + 偏移表 + 后继词ID + 量化分数"""
+    rows = {}
+    max_weight = 0
+    for head, successors in bigrams.items():
+        ranked = sorted(successors.items(), key=lambda x: (-x[1], x[0]))[:top_n]
+        rows[head] = ranked
+        max_weight = max(max_weight, ranked[0][1])
+
+    # 词池按UTF-8字节序排序，读取端可直接二分查找词ID
+    pool_words = set(rows)
+    for ranked in rows.values():
+        pool_words.update(tail for tail, _ in ranked)
+    pool = sorted(pool_words, key=lambda w: w.encode('utf-8'))
+    word_ids = {word: i for i, word in enumerate(pool)}
+
+    offsets = [0]
+    successor_ids = []
+    scores = []
+    for word in pool:
+        for tail, weight in rows.get(word, ()):
+            successor_ids.append(word_ids[tail])
+            scores.append(quantize_score(weight, max_weight))
+        offsets.append(len(successor_ids))
+
+    return {
+        'pool': pool,
+        'offsets': offsets,
+        'successors': successor_ids,
+        'scores': scores,
+        'max_weight': max_weight,
+        'head_count': len(rows),
+    }
+
+
+def save_table(table: Dict, output_path: str, sources: List[str], top_n: int) -> bool:
+    """保存联想表文件"""
+    print(f"正在保存联想表到文件: {output_path}")
+
+    try:
+        meta = {
+            'sources': sources,
+            'top_n': top_n,
+            'max_weight': table['max_weight'],
+            'score_scale': 'log1p/255',
+        }
+        file_size = write_container(output_path, [
+            ('META', pack_json(meta)),
+            ('WPOL', pack_string_pool(table['pool'])),
+            ('OFFS', pack_array('I', table['offsets'])),
+            ('SUCC', pack_array('I', table['successors'])),
+            ('SCOR', pack_array('B', table['scores'])),
+        ])
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+        return True
+
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+class NextWordTable:
+    """联想表读取器：内存映射，查询为一次二分查找加一次数组切片"""
+
+    def __init__(self, path: str):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        self.pool = StringPool(sections['WPOL'])
+        self.offsets = sections['OFFS'].cast('I')
+        self.successors = sections['SUCC'].cast('I')
+        self.scores = sections['SCOR']
+
+    def close(self):
+        self._file.close()
+
+    def successors_of(self, word: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """返回上屏词的后继词 [(词语, 量化分数), ...]，按分数降序"""
+        word_id = self.pool.find(word)
+        if word_id < 0:
+            return []
+        start = self.offsets[word_id]
+        end = min(self.offsets[word_id + 1], start + limit)
+        return [(self.pool[self.successors[i]], self.scores[i]) for i in range(start, end)]
+
+
+def verify_table_file(file_path: str, table: Dict) -> bool:
+    """逐行比对文件内容与内存中的联想表"""
+    print(f"正在验证联想表文件: {file_path}")
+
+    reader = NextWordTable(file_path)
+    try:
+        pool = table['pool']
+        if len(reader.pool) != len(pool):
+            print(f"错误：词池大小不一致 {len(reader.pool)} != {len(pool)}")
+            return False
+        for word_id, word in enumerate(pool):
+            start, end = table['offsets'][word_id], table['offsets'][word_id + 1]
+            expected = [(pool[table['successors'][i]], table['scores'][i]) for i in range(start, end)]
+            if reader.successors_of(word, limit=end - start) != expected:
+                print(f"错误：'{word}' 的后继词不一致")
+                return False
+
+        sample = next((w for w in pool if reader.successors_of(w)), None)
+        if sample:
+            shown = ', '.join(f"{w}({s})" for w, s in reader.successors_of(sample, 5))
+            print(f"   '{sample}' -> {shown}")
+        print(f"验证成功！词池 {len(pool)} 个词，后继词 {len(table['successors'])} 条")
+        return True
+    finally:
+        reader.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="构建下一词联想表（CSR布局）")
+    parser.add_argument('--sources', default=','.join(DEFAULT_SOURCES), help="联想来源词典，逗号分隔")
+    parser.add_argument('--vocab', default=','.join(DEFAULT_VOCAB), help="用于切分词组的词表词典，逗号分隔")
+    parser.add_argument('--top', type=int, default=16, help="每个词保留的后继词数量")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    args = parser.parse_args()
+
+    sources = [s for s in args.sources.split(',') if s]
+    vocab_dicts = [s for s in args.vocab.split(',') if s]
+
+    print("=" * 60)
+    print("神迹输入法 - 下一词联想表构建工具")
+    print("=" * 60)
+    print(f"来源词典: {', '.join(sources)}")
+    print(f"词表词典: {', '.join(vocab_dicts)}")
+    print(f"输出文件: {args.output}")
+    print(f"策略: 每个词保留前{args.top}个后继词")
+    print("=" * 60)
+
+    phrases = []
+    for name in sources:
+        entries = load_source_entries(name)
+        if entries is None:
+            print(f"⚠️ 来源词典不存在，跳过: {name}")
+            continue
+        phrases.extend(entries)
+    if not phrases:
+        print("❌ 没有可用的来源词条")
+        return 1
+
+    vocabulary = load_vocabulary(vocab_dicts)
+    if not vocabulary:
+        # 没有词表时退化为以来源词组自身和单字作为切分边界
+        print("⚠️ 词表为空，改用来源词组和单字切分")
+        vocabulary = {word for word, _, _ in phrases}
+        vocabulary.update(char for word, _, _ in phrases for char in word)
+
+    bigrams = collect_bigrams(phrases, vocabulary)
+    if not bigrams:
+        print("❌ 没有拆分出任何前后词对")
+        return 1
+    print(f"拆分完成，共 {len(bigrams)} 个前词，{sum(len(v) for v in bigrams.values())} 个词对")
+
+    table = build_table(bigrams, args.top)
+    if not save_table(table, args.output, sources, args.top):
+        print("❌ 保存文件失败")
+        return 1
+
+    if not verify_table_file(args.output, table):
+        print("❌ 验证文件失败")
+        return 1
+
+    print("=" * 60)
+    print("✅ 下一词联想表构建成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 版本3词典的布隆过滤器附属文件构建工具
+有序索引文件（build_indexed_trie.py）把布隆过滤器作为BLOM分段写在文件内，
+应用实际查询的版本3文件（{词典}_trie.dat）格式固定，无法增加分段，
+因此与最小完美哈希索引（{词典}_mph.dat）一样，为每个版本3文件生成一个附属文件 {词典}_bloom.dat。
+查找前先查过滤器，判定不存在时直接返回空结果，省去一次Trie/二分查找。
+
+过滤器的键为连写规范形式（trie_reader.normalize_pinyin：去空格、转小写、ü 按规范写法），
+与应用内PinyinTrie的节点一致；查询按同样规则规范化后再查过滤器。
+位数组与哈希规则与有序索引的BLOM分段相同（trie_format.BloomFilter）：
+    h = FNV-1a 64(UTF-8连写键)，h1 = h 的低32位，h2 = (h 的高32位) | 1
+    第i个位置 = (h1 + i*h2) mod 位数，i = 0..哈希数-1；第n位在第n//8字节的第n%8位
+
+文件分段（通用容器格式）：
+    META  JSON：词典名、键数、位数、哈希数、目标误判率、版本3文件名和大小
+    BLOM  位数组
+版本3文件重新生成后大小不同时读取器拒绝使用旧的过滤器（与 _mph.dat 相同），需重新构建。
+
+用法:
+    python build_bloom_filter.py --dicts chars,place,people
+    python build_bloom_filter.py --dicts base --fpr 0.005 --output-dir build/bloom
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from build_indexed_trie import DEFAULT_BLOOM_FPR, negative_probes
+from build_merged_trie import TRIE_TYPES
+from trie_format import (
+    BloomFilter, MappedFile, bloom_asset_path, iter_v3_entries, pack_json,
+    read_container, trie_asset_path, unpack_json, write_container,
+)
+from trie_reader import V3MappedReader, normalize_pinyin
+
+TRIE_SUFFIX = '_trie.dat'
+BLOOM_SUFFIX = '_bloom.dat'
+
+
+def sidecar_path(trie_path: str) -> Optional[str]:
+    """版本3文件旁的过滤器文件路径（{词典}_trie.dat -> {词典}_bloom.dat），文件名不符合约定时返回None"""
+    name = os.path.basename(trie_path)
+    if not name.endswith(TRIE_SUFFIX):
+        return None
+    return os.path.join(os.path.dirname(trie_path), name[:-len(TRIE_SUFFIX)] + BLOOM_SUFFIX)
+
+
+def build_sections(name: str, trie_path: str, keys: List[str], fpr: float) -> Tuple[List[Tuple[str, bytes]], BloomFilter]:
+    bloom = BloomFilter.build(keys, fpr)
+    meta = dict(bloom.meta(), **{
+        'format': 'bloom',
+        'dict': name,
+        'keys': len(keys),
+        'fpr': fpr,
+        'key_form': 'normalized',
+        'trie': os.path.basename(trie_path),
+        'trie_size': os.path.getsize(trie_path),
+    })
+    return [('META', pack_json(meta)), ('BLOM', bytes(bloom.bits))], bloom
+
+
+# ==================== 读取 ====================
+
+class BloomSidecar:
+    """版本3文件的布隆过滤器附属文件读取器（内存映射）"""
+
+    def __init__(self, path: str, trie_path: Optional[str] = None):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        trie_path = trie_path or os.path.join(os.path.dirname(path), self.meta['trie'])
+        if os.path.getsize(trie_path) != self.meta['trie_size']:
+            del sections
+            self._file.close()
+            raise ValueError(f"{trie_path} 与过滤器构建时的大小不同，请重新生成过滤器")
+        self.bloom = BloomFilter(sections['BLOM'], self.meta['bits'], self.meta['hashes'])
+
+    @classmethod
+    def for_trie(cls, trie_path: str) -> Optional['BloomSidecar']:
+        """打开版本3文件旁的过滤器；不存在或已过期时返回None（查找不经过滤器）"""
+        path = sidecar_path(trie_path)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            return cls(path, trie_path)
+        except ValueError:
+            return None
+
+    def might_contain(self, pinyin: str) -> bool:
+        """False表示该拼音（任意写法）一定不是版本3文件中的键"""
+        return self.bloom.might_contain(normalize_pinyin(pinyin))
+
+    def close(self):
+        self.bloom = None
+        self._file.close()
+
+
+# ==================== 验证 ====================
+
+def verify_bloom_file(path: str, trie_path: str, keys: List[str], probes: int = 20000) -> bool:
+    """全部键不得漏判；不存在的查询中被误判为可能存在的比例即实测误判率，并比较过滤与查找的耗时"""
+    print(f"正在验证布隆过滤器: {path}")
+    try:
+        sidecar = BloomSidecar(path, trie_path)
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+    reader = V3MappedReader(trie_path)
+    try:
+        false_negatives = [key for key in keys if not sidecar.might_contain(key)]
+        if false_negatives:
+            print(f"错误：布隆过滤器漏判 {len(false_negatives)} 个键，例如 '{false_negatives[0]}'")
+            return False
+        negatives = negative_probes(set(keys), probes)
+        false_positives = sum(1 for probe in negatives if sidecar.might_contain(probe))
+        fpr = false_positives / max(len(negatives), 1)
+
+        start = time.perf_counter()
+        for probe in negatives:
+            sidecar.might_contain(probe)
+        bloom_us = (time.perf_counter() - start) * 1e6 / max(len(negatives), 1)
+        start = time.perf_counter()
+        for probe in negatives:
+            reader.key_range(probe, exact=True)
+        search_us = (time.perf_counter() - start) * 1e6 / max(len(negatives), 1)
+
+        target = sidecar.meta['fpr']
+        print(f"验证成功！{len(keys)} 个键无漏判；不存在的键 {len(negatives)} 个，误判 {false_positives} 个"
+              f"（实测 {fpr:.3%}，理论 {sidecar.bloom.expected_fpr(len(keys)):.3%}，目标 {target:.3%}）")
+        print(f"不存在的键: 过滤器 {bloom_us:.1f} us，版本3有序偏移二分查找 {search_us:.1f} us")
+        if fpr > target * 2 + 0.001:
+            print("错误：实测误判率明显高于目标")
+            return False
+        return True
+    finally:
+        reader.close()
+        sidecar.close()
+
+
+# ==================== 命令行 ====================
+
+def build_one(name: str, args) -> bool:
+    trie_path = trie_asset_path(name)
+    if not os.path.exists(trie_path):
+        print(f"⚠️ 词典不存在，跳过: {name}")
+        return True
+    output_path = os.path.join(args.output_dir, os.path.basename(bloom_asset_path(name))) if args.output_dir \
+        else bloom_asset_path(name)
+
+    with open(trie_path, 'rb') as f:
+        keys = sorted({normalize_pinyin(key) for key, _ in iter_v3_entries(f.read())})
+    if not keys:
+        print(f"⚠️ {name}: 没有拼音键，跳过")
+        return True
+
+    sections, bloom = build_sections(name, trie_path, keys, args.fpr)
+    file_size = write_container(output_path, sections)
+    print(f"{name}: {len(keys)} 个连写键，{bloom.bit_count // 8} 字节（{bloom.bit_count / len(keys):.1f} 位/键），"
+          f"{bloom.hash_count} 个哈希，文件共 {file_size} 字节: {output_path}")
+    return verify_bloom_file(output_path, trie_path, keys)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="为版本3词典文件构建布隆过滤器附属文件")
+    parser.add_argument('--dicts', default='chars,place,people', help="要构建的词典，逗号分隔")
+    parser.add_argument('--fpr', type=float, default=DEFAULT_BLOOM_FPR, help=f"目标误判率（默认 {DEFAULT_BLOOM_FPR}）")
+    parser.add_argument('--output-dir', help="输出目录（默认与版本3文件同目录）")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+    if not 0 < args.fpr < 1:
+        print("❌ --fpr 须在0和1之间")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 版本3词典布隆过滤器构建工具")
+    print("=" * 60)
+    failed = [name for name in names if not build_one(name, args)]
+    print("=" * 60)
+    if failed:
+        print(f"❌ 构建失败: {', '.join(failed)}")
+        return 1
+    print("✅ 布隆过滤器构建完成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1013 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 有序索引Trie构建工具
+把单个词典写成可内存映射、可二分查找的分段文件（通用容器格式），
+键按去空格连写形式排序（与应用内PinyinTrie一致），候选按词频降序存放。
+
+拼音键编码（--key-encoding）：
+    plain  KPOL 字符串池，每个键完整存放
+    front  前缀压缩：每16/32个键为一块，块首存完整键（重启点），其余键存
+           与前一个键的公共前缀长度 + 后缀；查找时先二分块首，再只解码一个块
+    syllable  每个音节存为u16音节ID（音节表在文件内），键即为短ID序列；
+           另存一份按ID序列排序的下标，切分结果可直接用整数比较查找
+
+词语编码（--word-encoding）：
+    utf8      WPOL 字符串池，每个汉字3字节
+    charcode  按所有词典中的出现次数给字符排名，词语存为字符ID的varint序列，
+           最常用的128个字符占1字节，前16384个占2字节；文件内附本文件用到的字符表
+
+文件分段：
+    META  JSON：词典名、键编码、块大小、键数、候选数，以及 ü 写法的别名表（aliases，见 pinyin_alias）；
+          键均为规范写法，查找时先按别名表改写，任意写法都只查一次
+    KPOL  （plain）字符串池
+    KFCB  （front）块数据：块首 varint(长度)+键，其余 varint(公共前缀) varint(后缀长度) 后缀
+    KFCO  （front）u32[块数+1]，块偏移
+    KSYL  （syllable）字符串池，音节表：前段与音节切分自动机的音节ID一致（ü 按规范写法，见 pinyin_alias.KEY_SYLLABLES），表外音节追加在后
+    KSOF  （syllable）u32[键数+1]，每个键在KSID中的区间
+    KSID  （syllable）u16[]，音节ID序列
+    KSRT  （syllable）u32[键数]，按音节ID序列排序的键下标
+    KIDX  u32[键数+1]，每个键的候选区间
+    WPOL  （utf8）字符串池，按UTF-8字节排序的词语表
+    CTAB  （charcode）字符表，UTF-8连续存放，按全部词典中的出现次数降序（ID即字符下标）
+    WCOD  （charcode）词语的字符ID varint序列，词语顺序与utf8编码相同
+    WOFF  （charcode）u32[词语数+1]，每个词语在WCOD中的区间
+    CWRD  u32[候选数]，词语ID
+    CFRQ  i32[候选数]，词频
+    BLOM  （可选）连写拼音键的布隆过滤器，参数在META的bloom字段；
+          查询不存在的键时只需几次位测试即可返回，无需二分查找
+    SPnK  （可选，--shuangpin）第n个双拼方案的编码字符串池，按字节序排序；方案列表在META的shuangpin字段
+    SPnO  u32[编码数+1]，每个编码在SPnI中的区间
+    SPnI  u32[]，编码对应的键下标，候选直接使用KIDX/CWRD/CFRQ，与全拼共用同一份候选存储
+    PCFB  （可选，--completion-top-k）最后一个音节未完成的键（如 "bei j"、"zhon"），前缀压缩，布局同KFCB；
+          未完成音节与补全表（build_syllable_completion.py）一致，参数在META的completion字段
+    PCFO  u32[块数+1]，块偏移
+    PCKX  i32[未完成键数]，>=0 时只补全成一个键，即该键下标（候选取前K个）；<0 时 -值-1 为PCOF中的合并列表号
+    PCOF  u32[列表数+1]，每个合并列表在PCCI中的区间
+    PCCI  u32[]，合并后的前K个候选在CWRD/CFRQ中的下标（同一词语取最高词频）
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from build_merged_trie import TRIE_TYPES, load_dictionary
+from dict_parser import RimeDictParser
+from pinyin_alias import KEY_SYLLABLES, SYLLABLE_ALIASES, alias_table, canonical_key, canonical_query
+from build_syllable_completion import build_completions
+from shuangpin import ShuangpinScheme, load_scheme
+from trie_format import (
+    BloomFilter, MappedFile, StringPool, append_varint, dict_source_path,
+    indexed_asset_path, iter_v3_entries, key_order, lower_bound, pack_array,
+    pack_json, pack_string_pool, read_container, read_varint,
+    trie_asset_path, unpack_json, write_container,
+)
+
+KEY_ENCODINGS = ['plain', 'front', 'syllable']
+DEFAULT_KEY_ENCODING = 'front'
+DEFAULT_BLOCK_SIZE = 16
+WORD_ENCODINGS = ['utf8', 'charcode']
+DEFAULT_WORD_ENCODING = 'utf8'
+DEFAULT_BLOOM_FPR = 0.01
+
+WordList = List[Tuple[str, int]]
+
+
+# ==================== 数据准备 ====================
+
+def prepare_entries(trie_data: Dict[str, WordList]) -> Tuple[List[str], Dict[str, WordList]]:
+    """键按连写形式排序；每个键的候选去重（保留最高词频）后按词频降序，同词频保持原顺序"""
+    keys = sorted(trie_data, key=key_order)
+    prepared = {}
+    for key in keys:
+        best: Dict[str, int] = {}
+        for word, frequency in trie_data[key]:
+            if frequency > best.get(word, frequency - 1):
+                best[word] = frequency
+        prepared[key] = sorted(best.items(), key=lambda x: x[1], reverse=True)
+    return keys, prepared
+
+
+# ==================== 拼音键编码 ====================
+
+def encode_front_coded(keys: List[str], block_size: int) -> Tuple[bytes, List[int]]:
+    """前缀压缩编码，返回 (块数据, 块偏移表)"""
+    blob = bytearray()
+    offsets = []
+    previous = b''
+    for i, key in enumerate(keys):
+        current = key.encode('utf-8')
+        if i % block_size == 0:
+            offsets.append(len(blob))
+            append_varint(blob, len(current))
+            blob += current
+        else:
+            shared = 0
+            limit = min(len(previous), len(current))
+            while shared < limit and previous[shared] == current[shared]:
+                shared += 1
+            append_varint(blob, shared)
+            append_varint(blob, len(current) - shared)
+            blob += current[shared:]
+        previous = current
+    offsets.append(len(blob))
+    return bytes(blob), offsets
+
+
+def encode_syllable_keys(keys: List[str]) -> Dict:
+    """把每个键拆成音节ID序列；键按空格拆分，不重新切分，保证能原样还原"""
+    extras = sorted({s for key in keys for s in key.split()} - set(KEY_SYLLABLES))
+    syllables = KEY_SYLLABLES + extras
+    if len(syllables) > 0xFFFF:
+        raise ValueError(f"音节数 {len(syllables)} 超出u16范围")
+    syllable_ids = {s: i for i, s in enumerate(syllables)}
+
+    offsets, ids, sequences = [0], [], []
+    for key in keys:
+        sequence = [syllable_ids[s] for s in key.split()]
+        ids.extend(sequence)
+        offsets.append(len(ids))
+        sequences.append(sequence)
+    return {
+        'syllables': syllables,
+        'extra_syllables': len(extras),
+        'offsets': offsets,
+        'ids': ids,
+        'sorted': sorted(range(len(keys)), key=sequences.__getitem__),
+    }
+
+
+class PlainKeyTable:
+    """完整存放的拼音键"""
+
+    def __init__(self, pool: StringPool):
+        self.pool = pool
+
+    def __len__(self) -> int:
+        return len(self.pool)
+
+    def key(self, index: int) -> str:
+        return self.pool[index]
+
+    def lower_bound(self, is_less: Callable[[str], bool]) -> int:
+        return lower_bound(len(self.pool), lambda i: is_less(self.pool[i]))
+
+
+class FrontCodedKeyTable:
+    """前缀压缩的拼音键：二分块首重启点，再解码单个块"""
+
+    def __init__(self, blob: memoryview, offsets: memoryview, count: int, block_size: int):
+        self.blob = blob
+        self.offsets = offsets
+        self.count = count
+        self.block_size = block_size
+        self.blocks = len(offsets) - 1
+        self._cached_block = -1
+        self._cached_keys: List[str] = []
+
+    def __len__(self) -> int:
+        return self.count
+
+    def restart(self, block: int) -> str:
+        """块首完整键，无需解码整个块"""
+        length, pos = read_varint(self.blob, self.offsets[block])
+        return bytes(self.blob[pos:pos + length]).decode('utf-8')
+
+    def block(self, block: int) -> List[str]:
+        if block == self._cached_block:
+            return self._cached_keys
+        blob = self.blob
+        pos = self.offsets[block]
+        end = self.offsets[block + 1]
+        length, pos = read_varint(blob, pos)
+        current = bytes(blob[pos:pos + length])
+        pos += length
+        keys = [current]
+        while pos < end:
+            shared, pos = read_varint(blob, pos)
+            length, pos = read_varint(blob, pos)
+            current = current[:shared] + bytes(blob[pos:pos + length])
+            pos += length
+            keys.append(current)
+        self._cached_block = block
+        self._cached_keys = [key.decode('utf-8') for key in keys]
+        return self._cached_keys
+
+    def key(self, index: int) -> str:
+        return self.block(index // self.block_size)[index % self.block_size]
+
+    def lower_bound(self, is_less: Callable[[str], bool]) -> int:
+        first_not_less = lower_bound(self.blocks, lambda b: is_less(self.restart(b)))
+        if first_not_less == 0:
+            return 0
+        block = first_not_less - 1
+        keys = self.block(block)
+        inner = lower_bound(len(keys), lambda j: is_less(keys[j]))
+        return block * self.block_size + inner
+
+
+class SyllableKeyTable:
+    """音节ID序列存放的拼音键：下标顺序与其它编码相同，另有按ID序列排序的查找表"""
+
+    def __init__(self, syllables: StringPool, offsets: memoryview, ids: memoryview, sorted_keys: memoryview):
+        self.syllables = [syllables[i] for i in range(len(syllables))]
+        self.syllable_ids = {s: i for i, s in enumerate(self.syllables)}
+        self.offsets = offsets
+        self.ids = ids
+        self.sorted_keys = sorted_keys
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def key_ids(self, index: int) -> List[int]:
+        return self.ids[self.offsets[index]:self.offsets[index + 1]].tolist()
+
+    def key(self, index: int) -> str:
+        return ' '.join(self.syllables[i] for i in self.key_ids(index))
+
+    def lower_bound(self, is_less: Callable[[str], bool]) -> int:
+        return lower_bound(len(self), lambda i: is_less(self.key(i)))
+
+    def encode(self, syllables: Sequence[str]) -> Optional[List[int]]:
+        """音节列表转为ID序列，含音节表外的音节时返回None"""
+        ids = []
+        for syllable in syllables:
+            sid = self.syllable_ids.get(syllable)
+            if sid is None:
+                return None
+            ids.append(sid)
+        return ids
+
+    def find_ids(self, ids: Sequence[int]) -> int:
+        """按音节ID序列精确查找（整数比较），返回键下标，未找到返回-1"""
+        target = list(ids)
+        pos = lower_bound(len(self.sorted_keys), lambda j: self.key_ids(self.sorted_keys[j]) < target)
+        if pos < len(self.sorted_keys) and self.key_ids(self.sorted_keys[pos]) == target:
+            return self.sorted_keys[pos]
+        return -1
+
+
+# ==================== 词语编码 ====================
+
+def count_characters(dict_names: List[str], input_mode: str) -> Counter:
+    """统计各词典全部词条中每个字符的出现次数；assets模式读预编译文件，source模式读词典源文件"""
+    counts: Counter = Counter()
+    for name in dict_names:
+        if input_mode == 'assets':
+            path = trie_asset_path(name)
+            if not os.path.exists(path):
+                continue
+            with MappedFile(path) as f:
+                for _, words in iter_v3_entries(f.buffer):
+                    counts.update(''.join(word for word, _ in words))
+        else:
+            path = dict_source_path(name)
+            if not os.path.exists(path):
+                continue
+            with RimeDictParser(path) as parser:
+                for (text,) in parser.iter_entries(fields=('text',)):
+                    counts.update(text)
+    return counts
+
+
+def rank_characters(words: List[str], counts: Counter) -> List[str]:
+    """本文件用到的字符，按全局出现次数降序，次数相同按码位"""
+    used = {ch for word in words for ch in word}
+    return sorted(used, key=lambda ch: (-counts.get(ch, 0), ch))
+
+
+def encode_char_codes(words: List[str], chars: List[str]) -> Tuple[bytes, List[int]]:
+    """词语编码为字符ID的varint序列，返回 (数据, 偏移表)"""
+    char_ids = {ch: i for i, ch in enumerate(chars)}
+    blob = bytearray()
+    offsets = [0]
+    for word in words:
+        for ch in word:
+            append_varint(blob, char_ids[ch])
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+
+class CharCodeWordPool:
+    """字符ID编码的词语表，接口与StringPool的下标访问一致"""
+
+    def __init__(self, chars: memoryview, blob: memoryview, offsets: memoryview):
+        self.chars = bytes(chars).decode('utf-8')
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        blob, chars = self.blob, self.chars
+        pos, end = self.offsets[index], self.offsets[index + 1]
+        result = []
+        while pos < end:
+            byte = blob[pos]
+            if byte < 0x80:
+                result.append(chars[byte])
+                pos += 1
+            else:
+                char_id, pos = read_varint(blob, pos)
+                result.append(chars[char_id])
+        return ''.join(result)
+
+
+# ==================== 双拼键索引 ====================
+
+def encode_shuangpin_keys(keys: List[str], scheme: ShuangpinScheme) -> Dict:
+    """按方案把每个键转为双拼编码，返回排序后的编码表及每个编码对应的键下标（升序）"""
+    by_code: Dict[str, List[int]] = defaultdict(list)
+    skipped = 0
+    for index, key in enumerate(keys):
+        code = scheme.encode_key(key)
+        if code is None:
+            skipped += 1
+        else:
+            by_code[code].append(index)
+    codes = sorted(by_code, key=lambda c: c.encode('utf-8'))
+    offsets, indices = [0], []
+    for code in codes:
+        indices.extend(by_code[code])
+        offsets.append(len(indices))
+    return {
+        'codes': codes,
+        'offsets': offsets,
+        'indices': indices,
+        'skipped': skipped,
+        'shared': sum(1 for code in codes if len(by_code[code]) > 1),
+    }
+
+
+def merge_candidates(lists: Sequence[WordList], limit: Optional[int] = None) -> WordList:
+    """合并多个键的候选：同一词语取最高词频，按词频降序，同词频保持键下标和原有顺序；单个键时结果不变"""
+    best: Dict[str, int] = {}
+    for words in lists:
+        for word, frequency in words:
+            if frequency > best.get(word, frequency - 1):
+                best[word] = frequency
+    merged = sorted(best.items(), key=lambda x: x[1], reverse=True)
+    return merged if limit is None else merged[:limit]
+
+
+def encode_partial_keys(keys: List[str], key_index: List[int], cand_words: List[int],
+                        frequencies: List[int], top_k: int) -> Dict:
+    """最后一个音节未完成的键 -> 合并后的前top_k个候选；未完成音节为任意音节的前缀，
+    完整音节只在它也是其他音节的前缀时（如 xia 可补全为 xian、xiao）计入。
+    只补全成一个键时只记键下标，否则记录合并列表（与 merge_candidates 的合并规则相同）"""
+    completions = build_completions(KEY_SYLLABLES, Counter())
+    known = set(KEY_SYLLABLES)
+    groups: Dict[str, List[int]] = defaultdict(list)
+    for index, key in enumerate(keys):
+        syllables = key.split(' ')
+        last = syllables[-1]
+        if last not in known:
+            continue
+        for length in range(1, len(last) + 1):
+            partial = last[:length]
+            if partial == last and len(completions[partial]) == 1:
+                continue
+            groups[' '.join(syllables[:-1] + [partial])].append(index)
+
+    partials = sorted(groups, key=key_order)
+    refs, list_offsets, list_cands = [], [0], []
+    for partial in partials:
+        indices = groups[partial]
+        if len(indices) == 1:
+            refs.append(indices[0])
+            continue
+        best: Dict[int, Tuple[int, int]] = {}
+        for index in indices:
+            for c in range(key_index[index], key_index[index + 1]):
+                if cand_words[c] not in best or frequencies[c] > best[cand_words[c]][0]:
+                    best[cand_words[c]] = (frequencies[c], c)
+        merged = sorted(best.values(), key=lambda x: -x[0])[:top_k]
+        refs.append(-(len(list_offsets) - 1) - 1)
+        list_cands.extend(c for _, c in merged)
+        list_offsets.append(len(list_cands))
+    return {'partials': partials, 'refs': refs, 'offsets': list_offsets, 'cands': list_cands}
+
+
+class ShuangpinIndex:
+    """双拼编码 -> 键下标，候选取自全拼索引的候选存储，查找时无需转回全拼"""
+
+    def __init__(self, trie: 'IndexedTrie', info: Dict, codes: StringPool, offsets: memoryview, indices: memoryview):
+        self.trie = trie
+        self.info = info
+        self.codes = codes
+        self.offsets = offsets
+        self.indices = indices
+
+    def key_indices(self, code: str) -> List[int]:
+        pos = self.codes.find(code)
+        if pos < 0:
+            return []
+        return list(self.indices[self.offsets[pos]:self.offsets[pos + 1]])
+
+    def lookup(self, code: str, limit: Optional[int] = None) -> WordList:
+        """完整双拼编码的候选；多个全拼键编码相同时合并"""
+        indices = self.key_indices(code)
+        if len(indices) == 1:
+            return self.trie.candidates(indices[0], limit)
+        return merge_candidates([self.trie.candidates(i) for i in indices], limit)
+
+    def prefix_indices(self, prefix: str) -> List[int]:
+        """编码以prefix开头的全部键下标（升序）；同前缀的编码在池中连续，对应的下标区间也连续"""
+        target = prefix.encode('utf-8')
+        start = lower_bound(len(self.codes), lambda i: self.codes.raw(i) < target)
+        end = lower_bound(len(self.codes), lambda i: self.codes.raw(i)[:len(target)] <= target)
+        return sorted(self.indices[self.offsets[start]:self.offsets[end]])
+
+    def search_prefix(self, prefix: str, limit: Optional[int] = None) -> WordList:
+        """编码前缀查询（可停在半个音节，即只输入了声母键）"""
+        return merge_candidates([self.trie.candidates(i) for i in self.prefix_indices(prefix)], limit)
+
+
+# ==================== 写出 ====================
+
+def build_sections(keys: List[str], prepared: Dict[str, WordList], name: str,
+                   key_encoding: str, block_size: int, word_encoding: str = DEFAULT_WORD_ENCODING,
+                   char_counts: Optional[Counter] = None, bloom_fpr: float = 0.0,
+                   schemes: Sequence[ShuangpinScheme] = (), completion_top_k: int = 0) -> Tuple[List[Tuple[str, bytes]], Dict]:
+    """生成各分段数据，返回 (分段列表, 统计信息)；charcode编码需提供全局字符计数，bloom_fpr为0时不写过滤器，
+    schemes为需要附加双拼键索引的方案，completion_top_k大于0时附加未完成键的合并候选"""
+    pool = sorted({word for words in prepared.values() for word, _ in words}, key=lambda w: w.encode('utf-8'))
+    word_ids = {word: i for i, word in enumerate(pool)}
+
+    key_index = [0]
+    cand_words, frequencies = [], []
+    for key in keys:
+        for word, frequency in prepared[key]:
+            cand_words.append(word_ids[word])
+            frequencies.append(frequency)
+        key_index.append(len(cand_words))
+
+    meta = {
+        'format': 'indexed',
+        'dict': name,
+        'key_order': 'normalized',
+        'key_encoding': key_encoding,
+        'word_encoding': word_encoding,
+        'keys': len(keys),
+        'candidates': len(cand_words),
+        'words': len(pool),
+        'aliases': alias_table(),
+    }
+    if key_encoding == 'front':
+        blob, offsets = encode_front_coded(keys, block_size)
+        meta['block_size'] = block_size
+        key_sections = [('KFCB', blob), ('KFCO', pack_array('I', offsets))]
+    elif key_encoding == 'syllable':
+        encoded = encode_syllable_keys(keys)
+        meta['syllables'] = len(encoded['syllables'])
+        meta['automaton_syllables'] = len(KEY_SYLLABLES)
+        key_sections = [
+            ('KSYL', pack_string_pool(encoded['syllables'])),
+            ('KSOF', pack_array('I', encoded['offsets'])),
+            ('KSID', pack_array('H', encoded['ids'])),
+            ('KSRT', pack_array('I', encoded['sorted'])),
+        ]
+    else:
+        key_sections = [('KPOL', pack_string_pool(keys))]
+
+    utf8_pool = pack_string_pool(pool)
+    if word_encoding == 'charcode':
+        chars = rank_characters(pool, char_counts or Counter())
+        blob, offsets = encode_char_codes(pool, chars)
+        meta['chars'] = len(chars)
+        word_sections = [
+            ('CTAB', ''.join(chars).encode('utf-8')),
+            ('WCOD', blob),
+            ('WOFF', pack_array('I', offsets)),
+        ]
+    else:
+        word_sections = [('WPOL', utf8_pool)]
+
+    filter_sections = []
+    if bloom_fpr > 0:
+        bloom = BloomFilter.build(sorted({key.replace(' ', '') for key in keys}), bloom_fpr)
+        meta['bloom'] = dict(bloom.meta(), fpr=bloom_fpr)
+        filter_sections.append(('BLOM', bytes(bloom.bits)))
+
+    if len(schemes) > 10:
+        raise ValueError("单个文件最多附加10个双拼方案")
+    shuangpin_sections, shuangpin_stats = [], []
+    for n, scheme in enumerate(schemes):
+        codes = encode_shuangpin_keys(keys, scheme)
+        info = {'scheme': scheme.scheme, 'name': scheme.name, 'codes': len(codes['codes']),
+                'keys': len(codes['indices']), 'skipped': codes['skipped'], 'shared': codes['shared']}
+        scheme_sections = [
+            (f'SP{n}K', pack_string_pool(codes['codes'])),
+            (f'SP{n}O', pack_array('I', codes['offsets'])),
+            (f'SP{n}I', pack_array('I', codes['indices'])),
+        ]
+        shuangpin_sections += scheme_sections
+        shuangpin_stats.append(dict(info, bytes=sum(len(data) for tag, data in scheme_sections)))
+        meta.setdefault('shuangpin', []).append(info)
+
+    completion_sections, completion_stats = [], None
+    if completion_top_k > 0:
+        encoded_partials = encode_partial_keys(keys, key_index, cand_words, frequencies, completion_top_k)
+        blob, offsets = encode_front_coded(encoded_partials['partials'], block_size)
+        completion_sections = [
+            ('PCFB', blob),
+            ('PCFO', pack_array('I', offsets)),
+            ('PCKX', pack_array('i', encoded_partials['refs'])),
+            ('PCOF', pack_array('I', encoded_partials['offsets'])),
+            ('PCCI', pack_array('I', encoded_partials['cands'])),
+        ]
+        meta['completion'] = {'top_k': completion_top_k, 'keys': len(encoded_partials['partials']),
+                              'lists': len(encoded_partials['offsets']) - 1, 'block_size': block_size}
+        completion_stats = dict(meta['completion'], bytes=sum(len(data) for tag, data in completion_sections))
+
+    sections = [('META', pack_json(meta))] + key_sections + [
+        ('KIDX', pack_array('I', key_index)),
+    ] + word_sections + [
+        ('CWRD', pack_array('I', cand_words)),
+        ('CFRQ', pack_array('i', frequencies)),
+    ] + filter_sections + shuangpin_sections + completion_sections
+    stats = {
+        'key_bytes': sum(len(data) for tag, data in key_sections),
+        'plain_key_bytes': len(pack_string_pool(keys)),
+        'word_bytes': sum(len(data) for tag, data in word_sections),
+        'utf8_word_bytes': len(utf8_pool),
+        'shuangpin': shuangpin_stats,
+        'completion': completion_stats,
+    }
+    if key_encoding == 'syllable':
+        stats['syllable_id_bytes'] = len(key_sections[2][1])
+        stats['extra_syllables'] = encoded['extra_syllables']
+    return sections, stats
+
+
+def save_indexed_file(output_path: str, sections: List[Tuple[str, bytes]]) -> bool:
+    """保存有序索引文件"""
+    print(f"正在保存有序索引到文件: {output_path}")
+    try:
+        file_size = write_container(output_path, sections)
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+        return True
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+# ==================== 读取 ====================
+
+class IndexedTrie:
+    """有序索引读取器：内存映射，按键下标访问候选"""
+
+    def __init__(self, path: str):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        count = self.meta['keys']
+        if self.meta['key_encoding'] == 'front':
+            self.keys = FrontCodedKeyTable(sections['KFCB'], sections['KFCO'].cast('I'),
+                                           count, self.meta['block_size'])
+        elif self.meta['key_encoding'] == 'syllable':
+            self.keys = SyllableKeyTable(StringPool(sections['KSYL']), sections['KSOF'].cast('I'),
+                                         sections['KSID'].cast('H'), sections['KSRT'].cast('I'))
+        else:
+            self.keys = PlainKeyTable(StringPool(sections['KPOL']))
+        self.key_index = sections['KIDX'].cast('I')
+        if self.meta.get('word_encoding') == 'charcode':
+            self.pool = CharCodeWordPool(sections['CTAB'], sections['WCOD'], sections['WOFF'].cast('I'))
+        else:
+            self.pool = StringPool(sections['WPOL'])
+        self.bloom = None
+        if 'bloom' in self.meta:
+            bloom = self.meta['bloom']
+            self.bloom = BloomFilter(sections['BLOM'], bloom['bits'], bloom['hashes'])
+        self.cand_words = sections['CWRD'].cast('I')
+        self.frequencies = sections['CFRQ'].cast('i')
+        self.shuangpin_indexes = {
+            info['scheme']: ShuangpinIndex(self, info, StringPool(sections[f'SP{n}K']),
+                                           sections[f'SP{n}O'].cast('I'), sections[f'SP{n}I'].cast('I'))
+            for n, info in enumerate(self.meta.get('shuangpin', []))
+        }
+        self.aliases = self.meta.get('aliases')
+        self.partial_keys = None
+        if 'completion' in self.meta:
+            completion = self.meta['completion']
+            self.partial_keys = FrontCodedKeyTable(sections['PCFB'], sections['PCFO'].cast('I'),
+                                                   completion['keys'], completion['block_size'])
+            self.partial_refs = sections['PCKX'].cast('i')
+            self.partial_offsets = sections['PCOF'].cast('I')
+            self.partial_cands = sections['PCCI'].cast('I')
+
+    def close(self):
+        self._file.close()
+
+    def key_count(self) -> int:
+        return len(self.keys)
+
+    def key(self, index: int) -> str:
+        return self.keys.key(index)
+
+    def lower_bound(self, is_less: Callable[[str], bool]) -> int:
+        """第一个不满足 is_less(拼音键) 的键下标，is_less须与键的排序一致"""
+        return self.keys.lower_bound(is_less)
+
+    def might_contain(self, normalized: str) -> bool:
+        """连写拼音键可能存在时返回True；没有过滤器时总是True"""
+        if self.aliases is not None:
+            normalized = canonical_query(normalized, self.aliases['rewrites'])
+        return self.bloom is None or self.bloom.might_contain(normalized)
+
+    def canonical(self, key: str) -> str:
+        """按文件附带的别名表把 ü 的各种写法改为规范写法；旧文件没有别名表时原样返回"""
+        return key if self.aliases is None else canonical_key(key, self.aliases['syllables'])
+
+    def find_key(self, key: str) -> int:
+        """精确查找拼音键（带空格的原始形式，ü 可用任意写法），未找到返回-1"""
+        key = self.canonical(key)
+        if isinstance(self.keys, SyllableKeyTable):
+            ids = self.keys.encode(key.split(' '))
+            return self.keys.find_ids(ids) if ids is not None else -1
+        target = key_order(key)
+        pos = self.lower_bound(lambda k: key_order(k) < target)
+        if pos < len(self.keys) and self.keys.key(pos) == key:
+            return pos
+        return -1
+
+    def candidates(self, index: int, limit: Optional[int] = None) -> WordList:
+        """键下标对应的候选（已去重、按词频降序），只解码前limit个"""
+        start, end = self.key_index[index], self.key_index[index + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return [(self.pool[self.cand_words[c]], self.frequencies[c]) for c in range(start, end)]
+
+    def lookup(self, key: str) -> WordList:
+        index = self.find_key(key)
+        return self.candidates(index) if index >= 0 else []
+
+    def lookup_syllables(self, syllables: Sequence[str], limit: Optional[int] = None) -> WordList:
+        """以音节切分结果直接查找，音节ID编码时不需要拼回字符串"""
+        if isinstance(self.keys, SyllableKeyTable):
+            ids = self.keys.encode([self.canonical(syllable) for syllable in syllables])
+            index = self.keys.find_ids(ids) if ids is not None else -1
+        else:
+            index = self.find_key(' '.join(syllables))
+        return self.candidates(index, limit) if index >= 0 else []
+
+    def lookup_partial(self, key: str, limit: Optional[int] = None) -> WordList:
+        """最后一个音节未完成的键（如 'bei j'）一次查找得到合并后的前K个候选；未附带该分段或键不存在时为空"""
+        if self.partial_keys is None:
+            return []
+        key = self.canonical(key)
+        target = key_order(key)
+        pos = self.partial_keys.lower_bound(lambda k: key_order(k) < target)
+        if pos >= len(self.partial_keys) or self.partial_keys.key(pos) != key:
+            return []
+        top_k = self.meta['completion']['top_k']
+        limit = top_k if limit is None else min(limit, top_k)
+        ref = self.partial_refs[pos]
+        if ref >= 0:
+            return self.candidates(ref, limit)
+        start, end = self.partial_offsets[-ref - 1], self.partial_offsets[-ref]
+        return [(self.pool[self.cand_words[c]], self.frequencies[c])
+                for c in self.partial_cands[start:min(end, start + limit)]]
+
+    def shuangpin(self, scheme: str) -> Optional[ShuangpinIndex]:
+        """文件内附带的双拼键索引，未构建该方案时返回None"""
+        return self.shuangpin_indexes.get(scheme)
+
+
+def negative_probes(normalized_keys: set, count: int, seed: int = 7) -> List[str]:
+    """生成不在键集合中的查询：连续输入的中间前缀、单字母替换的误触、随机音节拼接"""
+    rng = random.Random(seed)
+    keys = sorted(normalized_keys)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    probes = set()
+    attempts = 0
+    while len(probes) < count and attempts < count * 20:
+        attempts += 1
+        kind = attempts % 3
+        key = rng.choice(keys)
+        if kind == 0 and len(key) > 1:
+            probe = key[:rng.randint(1, len(key) - 1)]
+        elif kind == 1:
+            pos = rng.randrange(len(key))
+            probe = key[:pos] + rng.choice(letters) + key[pos + 1:]
+        else:
+            probe = ''.join(rng.choice(KEY_SYLLABLES) for _ in range(rng.randint(1, 4)))
+        if probe and probe not in normalized_keys:
+            probes.add(probe)
+    return sorted(probes)
+
+
+def measure_bloom_fpr(reader: 'IndexedTrie', keys: List[str], probes: int = 20000) -> Optional[Dict]:
+    """实测过滤器：全部键不得漏判，不存在的查询中被误判为可能存在的比例即实际误判率"""
+    if reader.bloom is None:
+        return None
+    normalized = {key.replace(' ', '') for key in keys}
+    false_negatives = sum(1 for key in normalized if not reader.might_contain(key))
+    negatives = negative_probes(normalized, probes)
+    false_positives = sum(1 for probe in negatives if reader.might_contain(probe))
+
+    start = time.perf_counter()
+    for probe in negatives:
+        reader.might_contain(probe)
+    bloom_us = (time.perf_counter() - start) * 1e6 / max(len(negatives), 1)
+    start = time.perf_counter()
+    for probe in negatives:
+        reader.lower_bound(lambda k: k.replace(' ', '') < probe)
+    search_us = (time.perf_counter() - start) * 1e6 / max(len(negatives), 1)
+
+    return {
+        'false_negatives': false_negatives,
+        'probes': len(negatives),
+        'false_positives': false_positives,
+        'fpr': false_positives / max(len(negatives), 1),
+        'expected_fpr': reader.bloom.expected_fpr(len(normalized)),
+        'target_fpr': reader.meta['bloom']['fpr'],
+        'bloom_us': bloom_us,
+        'search_us': search_us,
+    }
+
+
+def verify_shuangpin_index(reader: 'IndexedTrie', keys: List[str], scheme: ShuangpinScheme,
+                           prefix_samples: int = 300, page_size: int = 20) -> bool:
+    """双拼索引与全拼索引对照：每个双拼编码的查找结果必须等于把同编码的全拼键逐个用全拼查找后合并的结果；
+    抽样的编码前缀（含只输入声母键的半个音节）与按编码前缀筛选全拼键再合并的第一页结果一致"""
+    index = reader.shuangpin(scheme.scheme)
+    if index is None:
+        print(f"错误：文件中没有双拼方案 {scheme.scheme}")
+        return False
+
+    expected: Dict[str, List[int]] = defaultdict(list)
+    for i, key in enumerate(keys):
+        code = scheme.encode_key(key)
+        if code is not None:
+            expected[code].append(i)
+    if len(index.codes) != len(expected):
+        print(f"错误：{scheme.name} 编码数不一致 {len(index.codes)} != {len(expected)}")
+        return False
+    for code, indices in expected.items():
+        if index.key_indices(code) != indices:
+            print(f"错误：{scheme.name} 编码 '{code}' 对应的拼音键不一致")
+            return False
+        if index.lookup(code) != merge_candidates([reader.lookup(keys[i]) for i in indices]):
+            print(f"错误：{scheme.name} 编码 '{code}' 与全拼查找结果不一致")
+            return False
+
+    rng = random.Random(7)
+    codes = sorted(expected)
+    prefixes = set()
+    for code in rng.sample(codes, min(prefix_samples, len(codes))):
+        prefixes.update(code[:length] for length in range(1, len(code) + 1))
+    for prefix in sorted(prefixes):
+        matching = sorted(i for code in codes if code.startswith(prefix) for i in expected[code])
+        full = merge_candidates([reader.lookup(keys[i]) for i in matching], page_size)
+        if index.search_prefix(prefix, page_size) != full:
+            print(f"错误：{scheme.name} 前缀 '{prefix}' 与全拼查找结果不一致")
+            return False
+
+    queries = [(code, keys[indices[0]]) for code, indices in expected.items()][:2000]
+    start = time.perf_counter()
+    for code, _ in queries:
+        index.lookup(code, page_size)
+    shuangpin_us = (time.perf_counter() - start) * 1e6 / max(len(queries), 1)
+    start = time.perf_counter()
+    for _, key in queries:
+        reader.lookup_syllables(key.split(' '), page_size)
+    full_us = (time.perf_counter() - start) * 1e6 / max(len(queries), 1)
+    print(f"{scheme.name}: {len(expected)} 个编码与全拼结果一致，抽样前缀 {len(prefixes)} 个一致；"
+          f"双拼查找 {shuangpin_us:.1f} us，全拼查找 {full_us:.1f} us")
+    return True
+
+
+def verify_partial_keys(reader: 'IndexedTrie', keys: List[str], prepared: Dict[str, WordList]) -> bool:
+    """每个未完成键的结果与按补全表展开、逐键查找再合并的结果一致，且每个键最后一个音节的每个前缀都能查到"""
+    completions = build_completions(KEY_SYLLABLES, Counter())
+    positions = {key: index for index, key in enumerate(keys)}
+    top_k = reader.meta['completion']['top_k']
+    table = reader.partial_keys
+    partials = [table.key(pos) for pos in range(len(table))]
+
+    def expand(partial: str) -> List[str]:
+        head, _, last = partial.rpartition(' ')
+        expanded = (f"{head} {KEY_SYLLABLES[i]}" if head else KEY_SYLLABLES[i] for i in completions.get(last, []))
+        return sorted((key for key in expanded if key in positions), key=positions.get)
+
+    for partial in partials:
+        expanded = expand(partial)
+        if not expanded or reader.lookup_partial(partial) != merge_candidates([prepared[k] for k in expanded], top_k):
+            print(f"错误：未完成键 '{partial}' 的合并候选不一致")
+            return False
+    for key in keys:
+        syllables = key.split(' ')
+        if syllables[-1] not in completions:
+            continue
+        for length in range(1, len(syllables[-1])):
+            partial = ' '.join(syllables[:-1] + [syllables[-1][:length]])
+            if prepared[key] and not reader.lookup_partial(partial):
+                print(f"错误：未完成键 '{partial}' 缺失")
+                return False
+
+    start = time.perf_counter()
+    for partial in partials:
+        reader.lookup_partial(partial)
+    direct_us = (time.perf_counter() - start) * 1e6 / max(len(partials), 1)
+    start = time.perf_counter()
+    for partial in partials:
+        head, _, last = partial.rpartition(' ')
+        lists = [reader.lookup(f"{head} {KEY_SYLLABLES[i]}" if head else KEY_SYLLABLES[i]) for i in completions[last]]
+        merge_candidates([words for words in lists if words], top_k)
+    expand_us = (time.perf_counter() - start) * 1e6 / max(len(partials), 1)
+    print(f"未完成键: {len(partials)} 个，合并候选一致；直接查找 {direct_us:.1f} us，"
+          f"运行时展开音节逐个查找再合并 {expand_us:.1f} us")
+    return True
+
+
+def verify_aliases(reader: 'IndexedTrie', keys: List[str], prepared: Dict[str, WordList]) -> bool:
+    """键均为规范写法，且把其中的 ü 音节换成任意别名写法查找都得到同样的候选"""
+    spellings = defaultdict(list)
+    for alias, canonical in SYLLABLE_ALIASES.items():
+        spellings[canonical].append(alias)
+    probes = 0
+    for key in keys:
+        if canonical_key(key) != key:
+            print(f"错误：拼音键 '{key}' 不是规范写法")
+            return False
+        syllables = key.split(' ')
+        for i, syllable in enumerate(syllables):
+            for alias in spellings.get(syllable, ()):
+                variant = syllables[:i] + [alias] + syllables[i + 1:]
+                if reader.lookup(' '.join(variant)) != prepared[key] or reader.lookup_syllables(variant) != prepared[key]:
+                    print(f"错误：别名写法 '{' '.join(variant)}' 的查找结果与 '{key}' 不一致")
+                    return False
+                # lue/nue 只能按音节判断，连写查询不改写
+                joined = ''.join(variant)
+                if canonical_query(joined) == key.replace(' ', '') and not reader.might_contain(joined):
+                    print(f"错误：布隆过滤器未按别名表改写 '{joined}'")
+                    return False
+                probes += 1
+    print(f"别名查找: {probes} 个别名写法与规范写法结果一致")
+    return True
+
+
+def verify_indexed_file(file_path: str, keys: List[str], prepared: Dict[str, WordList],
+                        schemes: Sequence[ShuangpinScheme] = ()) -> bool:
+    """逐键核对：按下标顺序读出的键与候选、按键二分查找的结果都与构建数据一致"""
+    print(f"正在验证有序索引文件: {file_path}")
+
+    try:
+        reader = IndexedTrie(file_path)
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+
+    try:
+        if reader.key_count() != len(keys):
+            print(f"错误：键数不一致 {reader.key_count()} != {len(keys)}")
+            return False
+        for index, key in enumerate(keys):
+            if reader.key(index) != key or reader.candidates(index) != prepared[key]:
+                print(f"错误：第 {index} 个键 '{key}' 内容不一致")
+                return False
+        for key in keys:
+            if reader.lookup(key) != prepared[key] or reader.lookup_syllables(key.split()) != prepared[key]:
+                print(f"错误：查找拼音 '{key}' 的结果不一致")
+                return False
+        if any(reader.find_key(missing) != -1 for missing in ('', '\u0000', 'zzzzzz zzzz')):
+            print("错误：不存在的键返回了结果")
+            return False
+        bloom = measure_bloom_fpr(reader, keys)
+        if bloom is not None:
+            print(f"布隆过滤器: {reader.bloom.bit_count // 8} 字节，{reader.bloom.hash_count} 个哈希，"
+                  f"实测误判率 {bloom['fpr']:.3%}（{bloom['false_positives']}/{bloom['probes']}，"
+                  f"理论 {bloom['expected_fpr']:.3%}，目标 {bloom['target_fpr']:.3%}）")
+            print(f"不存在的键: 过滤器 {bloom['bloom_us']:.1f} us，二分查找 {bloom['search_us']:.1f} us")
+            if bloom['false_negatives']:
+                print(f"错误：布隆过滤器漏判 {bloom['false_negatives']} 个键")
+                return False
+            if bloom['fpr'] > bloom['target_fpr'] * 2 + 0.001:
+                print("错误：实测误判率明显高于目标值")
+                return False
+        if not verify_aliases(reader, keys, prepared):
+            return False
+        if reader.partial_keys is not None and not verify_partial_keys(reader, keys, prepared):
+            return False
+        if not all(verify_shuangpin_index(reader, keys, scheme) for scheme in schemes):
+            return False
+        print(f"验证成功！共 {len(keys)} 个拼音键")
+        return True
+    finally:
+        reader.close()
+
+
+# ==================== 命令行 ====================
+
+def build_one(name: str, args, output_path: str, char_counts: Optional[Counter],
+              schemes: Sequence[ShuangpinScheme] = ()) -> bool:
+    trie_data = load_dictionary(name, args.input, args.percentage, args.max_words)
+    if not trie_data:
+        print(f"⚠️ 词典不存在或为空，跳过: {name}")
+        return True
+
+    keys, prepared = prepare_entries(trie_data)
+    sections, stats = build_sections(keys, prepared, name, args.key_encoding, args.block_size,
+                                     args.word_encoding, char_counts, args.bloom_fpr, schemes,
+                                     args.completion_top_k)
+    print(f"{name}: {len(keys)} 个拼音键，{sum(len(w) for w in prepared.values())} 个候选")
+    print(f"拼音键分段: {stats['key_bytes']} 字节（完整存放 {stats['plain_key_bytes']} 字节）")
+    if 'syllable_id_bytes' in stats:
+        print(f"其中音节ID序列 {stats['syllable_id_bytes']} 字节，音节表外音节 {stats['extra_syllables']} 个")
+    print(f"词语分段: {stats['word_bytes']} 字节（UTF-8 {stats['utf8_word_bytes']} 字节）")
+    for info in stats['shuangpin']:
+        print(f"双拼键索引 {info['name']}: {info['codes']} 个编码，{info['bytes']} 字节，"
+              f"{info['shared']} 个编码对应多个拼音键，{info['skipped']} 个拼音键含方案无法表示的音节")
+    if stats['completion'] is not None:
+        info = stats['completion']
+        print(f"未完成键: {info['keys']} 个（其中 {info['lists']} 个补全成多个键，存合并列表），"
+              f"前{info['top_k']}个候选，{info['bytes']} 字节")
+
+    if not save_indexed_file(output_path, sections):
+        return False
+    if args.input == 'assets':
+        print(f"版本3文件 {os.path.getsize(trie_asset_path(name))} 字节，有序索引 {os.path.getsize(output_path)} 字节")
+    return verify_indexed_file(output_path, keys, prepared, schemes)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="构建可二分查找的有序索引Trie文件")
+    parser.add_argument('--dicts', default='chars,place,people', help="要构建的词典，逗号分隔")
+    parser.add_argument('--input', choices=['assets', 'source'], default='assets', help="读取预编译文件或词典源文件")
+    parser.add_argument('--percentage', type=float, default=1.0, help="source模式下的高频词筛选比例")
+    parser.add_argument('--max-words', type=int, default=40, help="source模式下每个拼音最大词数，0表示不限制")
+    parser.add_argument('--key-encoding', choices=KEY_ENCODINGS, default=DEFAULT_KEY_ENCODING, help="拼音键编码")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, help="前缀压缩的块大小（16或32）")
+    parser.add_argument('--word-encoding', choices=WORD_ENCODINGS, default=DEFAULT_WORD_ENCODING, help="词语编码")
+    parser.add_argument('--bloom-fpr', type=float, default=DEFAULT_BLOOM_FPR, help="布隆过滤器目标误判率，0表示不写过滤器")
+    parser.add_argument('--char-dicts', default=','.join(TRIE_TYPES), help="charcode编码统计字符频次的词典，逗号分隔")
+    parser.add_argument('--shuangpin', default='', help="附加双拼键索引的方案，逗号分隔（方案名或JSON文件路径，如 xiaohe,ziranma,microsoft）")
+    parser.add_argument('--completion-top-k', type=int, default=0,
+                        help="附加“最后一个音节未完成的键 -> 合并后的前K个候选”分段，0表示不附加")
+    parser.add_argument('--output', help="输出文件路径（仅构建单个词典时可用）")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+    if args.output and len(names) != 1:
+        print("❌ --output 只能在构建单个词典时使用")
+        return 1
+    if args.block_size < 2:
+        print("❌ 块大小至少为2")
+        return 1
+    if args.completion_top_k < 0:
+        print("❌ --completion-top-k 不能为负数")
+        return 1
+    if not 0 <= args.bloom_fpr < 1:
+        print("❌ 布隆过滤器误判率应在 [0, 1) 之间")
+        return 1
+
+    try:
+        schemes = [load_scheme(scheme) for scheme in args.shuangpin.split(',') if scheme]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ 无法加载双拼方案: {e}")
+        return 1
+    if len(schemes) > 10:
+        print("❌ 最多附加10个双拼方案")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 有序索引Trie构建工具")
+    print("=" * 60)
+    print(f"词典: {', '.join(names)}")
+    print(f"读取方式: {args.input}，键编码: {args.key_encoding}，词语编码: {args.word_encoding}")
+    if schemes:
+        print(f"双拼方案: {', '.join(scheme.name for scheme in schemes)}")
+    print("=" * 60)
+
+    char_counts = None
+    if args.word_encoding == 'charcode':
+        char_counts = count_characters([d for d in args.char_dicts.split(',') if d], args.input)
+        top = sum(c for _, c in char_counts.most_common(2000))
+        total = sum(char_counts.values())
+        print(f"字符表: {len(char_counts)} 个字符，前2000个覆盖 {top / max(total, 1):.1%} 的出现次数")
+
+    for name in names:
+        output_path = args.output or indexed_asset_path(name)
+        if not build_one(name, args, output_path, char_counts, schemes):
+            print(f"❌ {name} 构建失败")
+            return 1
+
+    print("=" * 60)
+    print("✅ 有序索引Trie文件构建成功！")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 多词典合并索引构建工具
+功能：
+1. 读取多个词典（默认9种TrieType全部）的预编译文件或源文件
+2. 相同拼音键只存一次，相同词语只在共享词池中存一次
+3. 每个候选记录来源词典位掩码，以及每个来源各自的词频
+4. 写出单个合并索引文件，一次查询即可得到所有来源的候选
+
+候选布局：
+    KIDX[k]..KIDX[k+1]      拼音键k的候选范围
+    CWRD[c] / CMSK[c]       候选c的词语ID与来源位掩码（第b位对应 META.sources[b]）
+    CFRQ[KFOF[k]..KFOF[k+1]] 拼音键k下所有候选在各来源中的词频，
+                            按候选顺序、来源位序依次存放，位置由掩码位数累加得到
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from pinyin_alias import alias_table, canonical_key, canonical_trie_data
+from trie_format import (
+    MappedFile, StringPool, dict_source_path, key_order, lower_bound,
+    load_v3_file, pack_array, pack_json, pack_string_pool, read_container,
+    trie_asset_path, unpack_json, write_container,
+)
+
+# 与TrieType枚举顺序一致，也是默认的读取顺序；来源位按实际读取到的词典依次编号（跳过的词典不占位），
+# 写入META的sources，读取方须通过 META.sources 把位序映射回词典名，不能按此列表的下标解释
+TRIE_TYPES = [
+    'chars', 'base', 'correlation', 'associational', 'place',
+    'people', 'poetry', 'corrections', 'compatible',
+]
+DEFAULT_OUTPUT = "app/src/main/assets/trie/merged_trie.dat"
+
+
+def load_dictionary(dict_name: str, input_mode: str, percentage: float, max_words: int) -> Dict[str, List[Tuple[str, int]]]:
+    """读取单个词典为 拼音 -> [(词语, 词频)]，assets模式读取预编译文件（键改为 ü 的规范写法），source模式从源文件构建"""
+    if input_mode == 'assets':
+        path = trie_asset_path(dict_name)
+        if not os.path.exists(path):
+            return {}
+        return canonical_trie_data(load_v3_file(path))
+
+    from build_universal_trie import build_trie_data, parse_dict_file
+
+    path = dict_source_path(dict_name)
+    if not os.path.exists(path):
+        return {}
+    entries = parse_dict_file(path, percentage)
+    trie_data = build_trie_data(entries, max_words if max_words > 0 else sys.maxsize)
+    return {key: [(item['word'], item['frequency']) for item in items] for key, items in trie_data.items()}
+
+
+def merge_dictionaries(dictionaries: List[Tuple[str, Dict[str, List[Tuple[str, int]]]]]) -> Dict[str, Dict[str, Dict[int, int]]]:
+    """合并为 拼音 -> 词语 -> {来源位: 词频}，同一来源内重复词语取最高词频"""
+    merged: Dict[str, Dict[str, Dict[int, int]]] = {}
+    for bit, (_, trie_data) in enumerate(dictionaries):
+        for key, words in trie_data.items():
+            candidates = merged.setdefault(key, {})
+            for word, frequency in words:
+                per_source = candidates.setdefault(word, {})
+                if frequency > per_source.get(bit, -1):
+                    per_source[bit] = frequency
+    return merged
+
+
+def build_index(merged: Dict[str, Dict[str, Dict[int, int]]]) -> Dict:
+    """构建合并索引的扁平数组"""
+    keys = sorted(merged, key=key_order)
+    pool = sorted({word for candidates in merged.values() for word in candidates}, key=lambda w: w.encode('utf-8'))
+    word_ids = {word: i for i, word in enumerate(pool)}
+
+    key_index = [0]
+    cand_words, cand_masks, freq_offsets, frequencies = [], [], [0], []
+    for key in keys:
+        # 候选按各来源中的最高词频降序
+        ranked = sorted(merged[key].items(), key=lambda x: (-max(x[1].values()), x[0]))
+        for word, per_source in ranked:
+            mask = 0
+            for bit in sorted(per_source):
+                mask |= 1 << bit
+                frequencies.append(per_source[bit])
+            cand_words.append(word_ids[word])
+            cand_masks.append(mask)
+        key_index.append(len(cand_words))
+        freq_offsets.append(len(frequencies))
+
+    return {
+        'keys': keys,
+        'pool': pool,
+        'key_index': key_index,
+        'cand_words': cand_words,
+        'cand_masks': cand_masks,
+        'freq_offsets': freq_offsets,
+        'frequencies': frequencies,
+    }
+
+
+def save_index(index: Dict, sources: List[str], output_path: str) -> bool:
+    """保存合并索引文件"""
+    print(f"正在保存合并索引到文件: {output_path}")
+
+    try:
+        file_size = write_container(output_path, [
+            ('META', pack_json({'sources': sources, 'key_order': 'normalized', 'aliases': alias_table()})),
+            ('KPOL', pack_string_pool(index['keys'])),
+            ('KIDX', pack_array('I', index['key_index'])),
+            ('WPOL', pack_string_pool(index['pool'])),
+            ('CWRD', pack_array('I', index['cand_words'])),
+            ('CMSK', pack_array('H', index['cand_masks'])),
+            ('KFOF', pack_array('I', index['freq_offsets'])),
+            ('CFRQ', pack_array('i', index['frequencies'])),
+        ])
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+        return True
+
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+class MergedTrieReader:
+    """合并索引读取器：内存映射，一次二分查找得到所有来源的候选"""
+
+    def __init__(self, path: str):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        self.sources: List[str] = self.meta['sources']
+        self.keys = StringPool(sections['KPOL'])
+        self.key_index = sections['KIDX'].cast('I')
+        self.pool = StringPool(sections['WPOL'])
+        self.cand_words = sections['CWRD'].cast('I')
+        self.cand_masks = sections['CMSK'].cast('H')
+        self.freq_offsets = sections['KFOF'].cast('I')
+        self.frequencies = sections['CFRQ'].cast('i')
+        self.aliases = self.meta.get('aliases')
+
+    def close(self):
+        self._file.close()
+
+    def find_key(self, key: str) -> int:
+        """精确查找拼音键，返回键下标，未找到返回-1；文件附带别名表时 ü 的任意写法都按规范写法查找"""
+        if self.aliases is not None:
+            key = canonical_key(key, self.aliases['syllables'])
+        target = key_order(key)
+        pos = lower_bound(len(self.keys), lambda i: key_order(self.keys[i]) < target)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return pos
+        return -1
+
+    def candidates_at(self, key_id: int) -> List[Tuple[str, Dict[str, int]]]:
+        """返回键下标对应的全部候选 [(词语, {来源: 词频})]"""
+        result = []
+        freq_pos = self.freq_offsets[key_id]
+        for c in range(self.key_index[key_id], self.key_index[key_id + 1]):
+            mask = self.cand_masks[c]
+            per_source = {}
+            for bit, source in enumerate(self.sources):
+                if mask & (1 << bit):
+                    per_source[source] = self.frequencies[freq_pos]
+                    freq_pos += 1
+            result.append((self.pool[self.cand_words[c]], per_source))
+        return result
+
+    def top_candidates_at(self, key_id: int, limit: int, source: Optional[str] = None) -> List[Tuple[str, int]]:
+        """返回键下标对应的前limit个候选 [(词语, 词频)]，只解码入选的词语；
+        指定source时只取该来源的候选和词频，否则取各来源中的最高词频"""
+        bit_filter = 1 << self.sources.index(source) if source is not None else 0
+        ranked = []
+        freq_pos = self.freq_offsets[key_id]
+        for c in range(self.key_index[key_id], self.key_index[key_id + 1]):
+            mask = self.cand_masks[c]
+            count = bin(mask).count('1')
+            if not bit_filter:
+                ranked.append((max(self.frequencies[freq_pos:freq_pos + count]), c))
+            elif mask & bit_filter:
+                ranked.append((self.frequencies[freq_pos + bin(mask & (bit_filter - 1)).count('1')], c))
+            freq_pos += count
+        ranked.sort(key=lambda x: -x[0])
+        return [(self.pool[self.cand_words[c]], frequency) for frequency, c in ranked[:limit]]
+
+    def lookup(self, key: str) -> List[Tuple[str, Dict[str, int]]]:
+        key_id = self.find_key(key)
+        return self.candidates_at(key_id) if key_id >= 0 else []
+
+
+def verify_index_file(file_path: str, merged: Dict[str, Dict[str, Dict[int, int]]], sources: List[str]) -> bool:
+    """逐键比对文件内容与合并前的数据"""
+    print(f"正在验证合并索引文件: {file_path}")
+
+    reader = MergedTrieReader(file_path)
+    try:
+        for key, candidates in merged.items():
+            expected = {word: {sources[b]: f for b, f in per_source.items()} for word, per_source in candidates.items()}
+            actual = dict(reader.lookup(key))
+            if actual != expected:
+                print(f"错误：拼音 '{key}' 的候选不一致")
+                return False
+
+        sample = max(merged, key=lambda k: len(merged[k]))
+        shown = ', '.join(f"{w}{dict(s)}" for w, s in reader.lookup(sample)[:3])
+        print(f"   '{sample}' -> {shown}")
+        print(f"验证成功！共 {len(merged)} 个拼音键")
+        return True
+    finally:
+        reader.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="构建多词典合并索引")
+    parser.add_argument('--dicts', default=','.join(TRIE_TYPES), help="参与合并的词典，逗号分隔")
+    parser.add_argument('--input', choices=['assets', 'source'], default='assets', help="读取预编译文件或词典源文件")
+    parser.add_argument('--percentage', type=float, default=1.0, help="source模式下的高频词筛选比例")
+    parser.add_argument('--max-words', type=int, default=40, help="source模式下每个拼音最大词数，0表示不限制")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 多词典合并索引构建工具")
+    print("=" * 60)
+    print(f"参与词典: {', '.join(names)}")
+    print(f"读取方式: {args.input}")
+    print(f"输出文件: {args.output}")
+    print("=" * 60)
+
+    dictionaries = []
+    separate_keys = separate_words = separate_bytes = 0
+    for name in names:
+        trie_data = load_dictionary(name, args.input, args.percentage, args.max_words)
+        if not trie_data:
+            print(f"⚠️ 词典不存在或为空，跳过: {name}")
+            continue
+        word_count = sum(len(words) for words in trie_data.values())
+        separate_keys += len(trie_data)
+        separate_words += word_count
+        if args.input == 'assets':
+            separate_bytes += os.path.getsize(trie_asset_path(name))
+        print(f"   {name}: {len(trie_data)} 个拼音键, {word_count} 个词条")
+        dictionaries.append((name, trie_data))
+
+    if not dictionaries:
+        print("❌ 没有可合并的词典")
+        return 1
+
+    sources = [name for name, _ in dictionaries]
+    merged = merge_dictionaries(dictionaries)
+    index = build_index(merged)
+
+    print(f"合并完成：拼音键 {separate_keys} -> {len(index['keys'])}，"
+          f"词条 {separate_words} -> {len(index['cand_words'])}，共享词池 {len(index['pool'])} 个词")
+
+    if not save_index(index, sources, args.output):
+        print("❌ 保存文件失败")
+        return 1
+    if separate_bytes:
+        print(f"独立文件合计 {separate_bytes} 字节，合并索引 {os.path.getsize(args.output)} 字节")
+
+    if not verify_index_file(args.output, merged, sources):
+        print("❌ 验证文件失败")
+        return 1
+
+    print("=" * 60)
+    print("✅ 多词典合并索引构建成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 拼音键最小完美哈希索引构建工具
+为每个词典的版本3文件生成一个附属索引文件（{词典}_mph.dat），精确查找拼音键时：
+    哈希一次 -> 取桶的位移值 -> 算出槽位 -> 比对指纹 -> 按槽位记录的偏移直接读版本3词条
+一次查找O(1)，打开时只需内存映射两个文件，不再逐条读入版本3文件建立HashMap。
+
+构建方法（CHD / PTHash 式“哈希-位移”）：
+    键先按哈希分入约 键数/桶大小 个桶（60%的键落入前30%的桶，大桶先放置），
+    按桶从大到小为每个桶搜索最小的位移值 pilot，使桶内每个键的位置 mix(h ^ pilot*φ) mod m
+    都落在尚未占用的位置上。m = 键数/0.98 略大于键数，最后几个桶不必为仅剩的几个空位搜索很大的位移值；
+    落在 [键数, m) 的少数位置再映射到 [0, 键数) 中空出的槽位，n 个键恰好占满 n 个槽位（最小完美哈希）。
+    位移值大多很小，按出现次数编成字典，每个桶只存字典下标（定宽位压缩）。
+
+键为带空格的规范写法拼音（ü 按 pinyin_alias 的规范写法，查询时先按别名表改写），与版本3文件中的键相同。
+
+哈希规则（应用侧可按同样规则实现）：
+    base = FNV-1a 64(UTF-8键)
+    指纹 = splitmix64(base) >> 48（只差一个字母的键 FNV-1a 结果相近，需先混合）
+    h    = splitmix64(base ^ salt)
+    桶   = (h & 0xFFFFFFFF) 在 (h >> 32) < 0.6*2^32 时映射到前 dense 个桶，否则映射到其余桶
+    位置 = splitmix64(h ^ (pilot * 0x9E3779B97F4A7C15 mod 2^64)) mod m，位置 >= 键数 时 槽位 = MREM[位置 - 键数]
+
+文件分段（通用容器格式）：
+    META  JSON：词典名、键数、位置数m、桶数、dense桶数、salt、位移字典大小与位宽、版本3文件名和大小
+    MDIC  u32[]，位移值字典，按出现次数降序
+    MPIL  u64[]，每个桶的位移字典下标，定宽位压缩（第i个值占第 i*位宽 位起的位宽个位，小端）
+    MREM  u64[]，位置 [键数, m) -> 空出的槽位，定宽位压缩（位宽为键数的二进制位数）
+    MOFS  u32[键数]，槽位 -> 键在版本3文件中的字节偏移（指向键长度字段）
+    MFPR  u16[键数]，槽位 -> 键指纹，不存在的键绝大多数在读版本3文件之前即被拒绝
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from build_merged_trie import TRIE_TYPES
+from pinyin_alias import canonical_key
+from trie_format import (
+    MappedFile, V3_VERSION, fnv1a_64, mph_asset_path, pack_array, pack_json,
+    read_container, trie_asset_path, unpack_json, write_container,
+)
+
+DEFAULT_BUCKET_SIZE = 4.0
+# 放置时的位置数为 键数/LOAD_FACTOR
+LOAD_FACTOR = 0.98
+DENSE_KEY_SHARE = 0.6
+DENSE_BUCKET_SHARE = 0.3
+MAX_PILOT = 1 << 24
+MAX_SALTS = 16
+GOLDEN = 0x9E3779B97F4A7C15
+FINGERPRINT_BITS = 16
+# 生成不存在的键时最多尝试 目标个数×该倍数 次；键少时改动一个字母凑不满目标个数，按尝试次数截止
+PROBE_ATTEMPT_FACTOR = 20
+
+_MASK64 = (1 << 64) - 1
+_DENSE_LIMIT = int(DENSE_KEY_SHARE * (1 << 32))
+
+WordList = List[Tuple[str, int]]
+
+
+# ==================== 哈希 ====================
+
+def splitmix64(x: int) -> int:
+    x ^= x >> 30
+    x = (x * 0xBF58476D1CE4E5B9) & _MASK64
+    x ^= x >> 27
+    x = (x * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def key_hash(key: str, salt: int) -> Tuple[int, int]:
+    """返回 (h, 指纹)"""
+    base = fnv1a_64(key.encode('utf-8'))
+    return splitmix64(base ^ salt), splitmix64(base) >> 48
+
+
+def bucket_of(h: int, dense: int, buckets: int) -> int:
+    low = h & 0xFFFFFFFF
+    if (h >> 32) < _DENSE_LIMIT:
+        return low % dense
+    return dense + low % (buckets - dense)
+
+
+def slot_of(h: int, pilot: int, count: int) -> int:
+    return splitmix64(h ^ ((pilot * GOLDEN) & _MASK64)) % count
+
+
+def table_size(count: int) -> int:
+    return max(count, int(count / LOAD_FACTOR) + 1)
+
+
+def bucket_counts(count: int, bucket_size: float) -> Tuple[int, int]:
+    """(桶数, dense桶数)，两部分至少各一个桶"""
+    buckets = max(2, round(count / bucket_size))
+    dense = min(buckets - 1, max(1, round(buckets * DENSE_BUCKET_SHARE)))
+    return buckets, dense
+
+
+# ==================== 位压缩 ====================
+
+def pack_bits(values: Sequence[int], width: int) -> bytes:
+    """定宽位压缩为u64小端数组"""
+    words = [0] * ((len(values) * width + 63) // 64 or 1)
+    for i, value in enumerate(values):
+        bit = i * width
+        words[bit >> 6] |= (value << (bit & 63)) & _MASK64
+        if (bit & 63) + width > 64:
+            words[(bit >> 6) + 1] |= value >> (64 - (bit & 63))
+    return pack_array('Q', words)
+
+
+def read_bits(words, index: int, width: int) -> int:
+    bit = index * width
+    word, shift = bit >> 6, bit & 63
+    value = words[word] >> shift
+    if shift + width > 64:
+        value |= words[word + 1] << (64 - shift)
+    return value & ((1 << width) - 1)
+
+
+# ==================== 构建 ====================
+
+def iter_v3_key_offsets(buf) -> Iterator[Tuple[str, int]]:
+    """顺序扫描版本3文件，产出 (拼音键, 键长度字段的字节偏移)"""
+    view = memoryview(buf)
+    version, count = struct.unpack_from('<ii', view, 0)
+    if version != V3_VERSION:
+        raise ValueError(f"不支持的版本号 {version}，期望版本3")
+    unpack_int = struct.Struct('<i').unpack_from
+    pos = 8
+    for _ in range(count):
+        offset = pos
+        key_len = unpack_int(view, pos)[0]
+        key = bytes(view[pos + 4:pos + 4 + key_len]).decode('utf-8')
+        pos += 4 + key_len
+        word_count = unpack_int(view, pos)[0]
+        pos += 4
+        for _ in range(word_count):
+            pos += 8 + unpack_int(view, pos)[0]
+        yield key, offset
+
+
+def search_pilots(hashes: List[int], buckets: int, dense: int, size: int) -> Optional[List[int]]:
+    """在 size 个位置上为每个桶搜索位移值，返回各桶的位移值；某个桶超过 MAX_PILOT 仍放不下时返回None"""
+    members: List[List[int]] = [[] for _ in range(buckets)]
+    for h in hashes:
+        members[bucket_of(h, dense, buckets)].append(h)
+    pilots = [0] * buckets
+    taken = bytearray(size)
+    for bucket in sorted(range(buckets), key=lambda b: -len(members[b])):
+        keys = members[bucket]
+        if not keys:
+            break
+        for pilot in range(MAX_PILOT):
+            mixed = (pilot * GOLDEN) & _MASK64
+            positions = [splitmix64(h ^ mixed) % size for h in keys]
+            if all(not taken[p] for p in positions) and len(set(positions)) == len(positions):
+                break
+        else:
+            return None
+        for p in positions:
+            taken[p] = 1
+        pilots[bucket] = pilot
+    return pilots
+
+
+def build_mph(keys: List[str], bucket_size: float = DEFAULT_BUCKET_SIZE) -> Dict:
+    """对键集合构建最小完美哈希，返回 salt、桶数、各桶位移值、超出键数的位置到空槽位的映射，以及每个键的 (槽位, 指纹)；
+    哈希值冲突或放置失败时换salt重试"""
+    count = len(keys)
+    size = table_size(count)
+    buckets, dense = bucket_counts(count, bucket_size)
+    for salt_index in range(MAX_SALTS):
+        salt = splitmix64(salt_index + 1)
+        hashed = [key_hash(key, salt) for key in keys]
+        hashes = [h for h, _ in hashed]
+        if len(set(hashes)) != count:
+            continue
+        pilots = search_pilots(hashes, buckets, dense, size)
+        if pilots is None:
+            continue
+        positions = [slot_of(h, pilots[bucket_of(h, dense, buckets)], size) for h in hashes]
+        # 落在 [键数, size) 的位置依次改到 [0, 键数) 中空出的槽位，两者个数相同
+        used = set(positions)
+        free = iter(slot for slot in range(count) if slot not in used)
+        remap = [0] * (size - count)
+        for position in sorted(p for p in positions if p >= count):
+            remap[position - count] = next(free)
+        slots = [p if p < count else remap[p - count] for p in positions]
+        return {
+            'salt': salt,
+            'buckets': buckets,
+            'dense': dense,
+            'size': size,
+            'pilots': pilots,
+            'remap': remap,
+            'slots': slots,
+            'fingerprints': [fingerprint for _, fingerprint in hashed],
+            'attempts': salt_index + 1,
+        }
+    raise ValueError(f"{MAX_SALTS} 个salt均无法完成放置，请调整 --bucket-size")
+
+
+def encode_pilots(pilots: List[int]) -> Tuple[List[int], List[int], int]:
+    """位移值字典编码，返回 (字典, 每个桶的字典下标, 位宽)"""
+    dictionary = [value for value, _ in sorted(Counter(pilots).items(), key=lambda x: (-x[1], x[0]))]
+    index = {value: i for i, value in enumerate(dictionary)}
+    width = max(1, (len(dictionary) - 1).bit_length())
+    return dictionary, [index[value] for value in pilots], width
+
+
+def build_sections(name: str, trie_path: str, keys: List[str], offsets: List[int],
+                   bucket_size: float) -> Tuple[List[Tuple[str, bytes]], Dict]:
+    mph = build_mph(keys, bucket_size)
+    dictionary, codes, width = encode_pilots(mph['pilots'])
+    remap_width = max(1, (len(keys) - 1).bit_length())
+    slot_offsets = [0] * len(keys)
+    slot_fingerprints = [0] * len(keys)
+    for slot, offset, fingerprint in zip(mph['slots'], offsets, mph['fingerprints']):
+        slot_offsets[slot] = offset
+        slot_fingerprints[slot] = fingerprint
+
+    meta = {
+        'format': 'mph',
+        'dict': name,
+        'keys': len(keys),
+        'positions': mph['size'],
+        'buckets': mph['buckets'],
+        'dense_buckets': mph['dense'],
+        'salt': mph['salt'],
+        'pilot_dictionary': len(dictionary),
+        'pilot_width': width,
+        'remap_width': remap_width,
+        'fingerprint_bits': FINGERPRINT_BITS,
+        'hash': 'fnv1a64-splitmix64',
+        'trie': os.path.basename(trie_path),
+        'trie_size': os.path.getsize(trie_path),
+    }
+    sections = [
+        ('META', pack_json(meta)),
+        ('MDIC', pack_array('I', dictionary)),
+        ('MPIL', pack_bits(codes, width)),
+        ('MREM', pack_bits(mph['remap'], remap_width)),
+        ('MOFS', pack_array('I', slot_offsets)),
+        ('MFPR', pack_array('H', slot_fingerprints)),
+    ]
+    function_bytes = sum(len(data) for tag, data in sections[1:4])
+    stats = {
+        'function_bytes': function_bytes,
+        'bits_per_key': function_bytes * 8 / max(len(keys), 1),
+        'max_pilot': max(mph['pilots']),
+        'attempts': mph['attempts'],
+    }
+    return sections, stats
+
+
+# ==================== 读取 ====================
+
+class MphIndex:
+    """最小完美哈希索引读取器：内存映射索引文件和对应的版本3文件"""
+
+    def __init__(self, path: str, trie_path: Optional[str] = None):
+        start = time.perf_counter()
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        trie_path = trie_path or os.path.join(os.path.dirname(path), self.meta['trie'])
+        if os.path.getsize(trie_path) != self.meta['trie_size']:
+            self._file.close()
+            raise ValueError(f"{trie_path} 与索引构建时的大小不同，请重新生成索引")
+        self._trie = MappedFile(trie_path)
+        self.count = self.meta['keys']
+        self.size = self.meta['positions']
+        self.buckets = self.meta['buckets']
+        self.dense = self.meta['dense_buckets']
+        self.salt = self.meta['salt']
+        self.width = self.meta['pilot_width']
+        self.dictionary = sections['MDIC'].cast('I')
+        self.pilot_words = sections['MPIL'].cast('Q')
+        self.remap_words = sections['MREM'].cast('Q')
+        self.remap_width = self.meta['remap_width']
+        self.offsets = sections['MOFS'].cast('I')
+        self.fingerprints = sections['MFPR'].cast('H')
+        self._unpack_int = struct.Struct('<i').unpack_from
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def close(self):
+        self._file.close()
+        self._trie.close()
+
+    def slot(self, key: str) -> int:
+        """键（规范写法）对应的槽位，指纹不符时返回-1；返回的槽位仍需比对键本身"""
+        h, fingerprint = key_hash(key, self.salt)
+        bucket = bucket_of(h, self.dense, self.buckets)
+        pilot = self.dictionary[read_bits(self.pilot_words, bucket, self.width)]
+        slot = slot_of(h, pilot, self.size)
+        if slot >= self.count:
+            slot = read_bits(self.remap_words, slot - self.count, self.remap_width)
+        return slot if self.fingerprints[slot] == fingerprint else -1
+
+    def _key_at(self, offset: int) -> str:
+        key_len = self._unpack_int(self._trie.buffer, offset)[0]
+        return self._trie.buffer[offset + 4:offset + 4 + key_len].decode('utf-8')
+
+    def find(self, key: str) -> int:
+        """精确查找带空格的拼音键（ü 可用任意写法），返回词条在版本3文件中的偏移，不存在时返回-1"""
+        key = canonical_key(key)
+        slot = self.slot(key)
+        if slot < 0:
+            return -1
+        offset = self.offsets[slot]
+        # 旧的版本3文件中的键可能不是规范写法
+        stored = self._key_at(offset)
+        return offset if stored == key or canonical_key(stored) == key else -1
+
+    def candidates_at(self, offset: int, limit: Optional[int] = None) -> WordList:
+        buf = self._trie.buffer
+        unpack_int = self._unpack_int
+        pos = offset + 4 + unpack_int(buf, offset)[0]
+        word_count = unpack_int(buf, pos)[0]
+        if limit is not None:
+            word_count = min(word_count, limit)
+        pos += 4
+        words = []
+        for _ in range(word_count):
+            word_len = unpack_int(buf, pos)[0]
+            words.append((buf[pos + 4:pos + 4 + word_len].decode('utf-8'), unpack_int(buf, pos + 4 + word_len)[0]))
+            pos += 8 + word_len
+        return words
+
+    def lookup(self, key: str, limit: Optional[int] = None) -> WordList:
+        offset = self.find(key)
+        return self.candidates_at(offset, limit) if offset >= 0 else []
+
+
+# ==================== 验证与基准 ====================
+
+def non_member_probes(keys: List[str], count: int, seed: int = 11) -> List[str]:
+    """由真实键改动一个字母得到的不存在的键（互不相同），更接近实际输入中的查找失败；
+    键集合能产生的这类键不足count个时，尝试 count*PROBE_ATTEMPT_FACTOR 次后返回已得到的部分"""
+    existing = set(keys)
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    probes: List[str] = []
+    for _ in range(count * PROBE_ATTEMPT_FACTOR if keys else 0):
+        if len(probes) >= count:
+            break
+        key = rng.choice(keys)
+        pos = rng.randrange(len(key))
+        probe = key[:pos] + rng.choice(letters) + key[pos + 1:]
+        if probe not in existing and canonical_key(probe) not in existing:
+            existing.add(probe)
+            probes.append(probe)
+    return probes
+
+
+def verify_mph_file(path: str, trie_path: str, keys: List[str], offsets: List[int]) -> bool:
+    """每个键都查到自己的词条、槽位恰好是0..n-1的排列，并统计不存在的键被指纹拒绝的比例"""
+    print(f"正在验证最小完美哈希索引: {path}")
+    try:
+        index = MphIndex(path, trie_path)
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+    try:
+        if sorted(index.offsets) != sorted(offsets):
+            print("错误：槽位记录的偏移与版本3文件的词条不一致")
+            return False
+        for key, offset in zip(keys, offsets):
+            if index.find(key) != offset:
+                print(f"错误：键 '{key}' 未查到自己的词条")
+                return False
+        probes = non_member_probes(keys, 20000)
+        passed = sum(1 for probe in probes if index.slot(canonical_key(probe)) >= 0)
+        if any(index.find(probe) >= 0 for probe in probes):
+            print("错误：不存在的键返回了词条")
+            return False
+        print(f"验证成功！{len(keys)} 个键各占一个槽位；不存在的键 {len(probes)} 个，"
+              f"指纹放过 {passed} 个（{passed / max(len(probes), 1):.4%}，理论 {1 / (1 << FINGERPRINT_BITS):.4%}），"
+              f"均在比对版本3词条的键时拒绝")
+        return True
+    finally:
+        index.close()
+
+
+def benchmark(path: str, trie_path: str, keys: List[str], queries: int, seed: int = 5) -> List[Dict]:
+    """比较三种精确查找方式的打开耗时与吞吐量：最小完美哈希、加载时建HashMap、有序键数组二分查找；
+    查询为一半存在、一半不存在的键，均只返回词条偏移"""
+    rng = random.Random(seed)
+    members = [rng.choice(keys) for _ in range(queries // 2)]
+    misses = queries - len(members)
+    probes = non_member_probes(keys, misses, seed)
+    # 不存在的键不足时与存在的键一样重复抽取
+    workload = members + probes + [rng.choice(probes) for _ in range(misses - len(probes)) if probes]
+    rng.shuffle(workload)
+
+    def timed(find) -> Tuple[float, int]:
+        start = time.perf_counter()
+        hits = sum(1 for key in workload if find(key) >= 0)
+        return time.perf_counter() - start, hits
+
+    results = []
+    index = MphIndex(path, trie_path)
+    try:
+        elapsed, hits = timed(index.find)
+        results.append({'method': 'mph', 'load_ms': index.load_ms, 'elapsed': elapsed, 'hits': hits})
+    finally:
+        index.close()
+
+    start = time.perf_counter()
+    with open(trie_path, 'rb') as f:
+        table = {canonical_key(key): offset for key, offset in iter_v3_key_offsets(f.read())}
+    load_ms = (time.perf_counter() - start) * 1000
+    elapsed, hits = timed(lambda key: table.get(canonical_key(key), -1))
+    results.append({'method': 'hashmap', 'load_ms': load_ms, 'elapsed': elapsed, 'hits': hits})
+
+    start = time.perf_counter()
+    with open(trie_path, 'rb') as f:
+        pairs = sorted((canonical_key(key), offset) for key, offset in iter_v3_key_offsets(f.read()))
+    sorted_keys = [key for key, _ in pairs]
+    sorted_offsets = [offset for _, offset in pairs]
+    load_ms = (time.perf_counter() - start) * 1000
+
+    def binary_search(key: str) -> int:
+        key = canonical_key(key)
+        pos = bisect_left(sorted_keys, key)
+        return sorted_offsets[pos] if pos < len(sorted_keys) and sorted_keys[pos] == key else -1
+
+    elapsed, hits = timed(binary_search)
+    results.append({'method': 'sorted', 'load_ms': load_ms, 'elapsed': elapsed, 'hits': hits})
+    for result in results:
+        result['per_second'] = len(workload) / max(result['elapsed'], 1e-9)
+    if len({result['hits'] for result in results}) != 1:
+        raise ValueError("三种查找方式的命中数不一致")
+    return results
+
+
+# ==================== 命令行 ====================
+
+def build_one(name: str, args) -> bool:
+    trie_path = trie_asset_path(name)
+    if not os.path.exists(trie_path):
+        print(f"⚠️ 词典不存在，跳过: {name}")
+        return True
+    output_path = os.path.join(args.output_dir, os.path.basename(mph_asset_path(name))) if args.output_dir \
+        else mph_asset_path(name)
+
+    with open(trie_path, 'rb') as f:
+        entries = [(canonical_key(key), offset) for key, offset in iter_v3_key_offsets(f.read())]
+    keys = [key for key, _ in entries]
+    offsets = [offset for _, offset in entries]
+    if len(set(keys)) != len(keys):
+        print(f"❌ {name}: 版本3文件中有 {len(keys) - len(set(keys))} 个键改为规范写法后重复，请先用当前构建工具重新生成")
+        return False
+    if not keys:
+        print(f"⚠️ {name}: 没有拼音键，跳过")
+        return True
+
+    start = time.perf_counter()
+    try:
+        sections, stats = build_sections(name, trie_path, keys, offsets, args.bucket_size)
+    except ValueError as e:
+        print(f"❌ {name}: {e}")
+        return False
+    build_ms = (time.perf_counter() - start) * 1000
+    file_size = write_container(output_path, sections)
+    print(f"{name}: {len(keys)} 个拼音键，构建 {build_ms:.0f} ms（第 {stats['attempts']} 个salt），最大位移 {stats['max_pilot']}")
+    print(f"哈希函数 {stats['function_bytes']} 字节（{stats['bits_per_key']:.2f} 位/键），"
+          f"偏移表+指纹 {len(keys) * 6} 字节，文件共 {file_size} 字节: {output_path}")
+    if not verify_mph_file(output_path, trie_path, keys, offsets):
+        return False
+
+    if args.benchmark > 0:
+        print(f"{'方式':<10}{'打开(ms)':>10}{'查找/秒':>14}{'平均(us)':>10}")
+        for result in benchmark(output_path, trie_path, keys, args.benchmark):
+            print(f"{result['method']:<10}{result['load_ms']:>10.2f}{result['per_second']:>14,.0f}"
+                  f"{result['elapsed'] * 1e6 / args.benchmark:>10.2f}")
+    return True
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="为版本3词典文件构建拼音键最小完美哈希索引")
+    parser.add_argument('--dicts', default='chars,place,people', help="要构建的词典，逗号分隔")
+    parser.add_argument('--bucket-size', type=float, default=DEFAULT_BUCKET_SIZE,
+                        help=f"平均每桶键数，越大哈希函数越小、构建越慢（默认 {DEFAULT_BUCKET_SIZE}）")
+    parser.add_argument('--output-dir', help="输出目录（默认与版本3文件同目录）")
+    parser.add_argument('--benchmark', type=int, default=0, help="构建后用多少次查询比较吞吐量，0表示不比较")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+    if args.bucket_size < 1:
+        print("❌ --bucket-size 至少为1")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 拼音键最小完美哈希索引构建工具")
+    print("=" * 60)
+    failed = [name for name in names if not build_one(name, args)]
+    print("=" * 60)
+    if failed:
+        print(f"❌ 构建失败: {', '.join(failed)}")
+        return 1
+    print("✅ 最小完美哈希索引构建完成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
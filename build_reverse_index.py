@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 反查索引构建工具（词语 -> 全部读音）
+功能：
+1. 读取词典源文件（缺失时退回预编译Trie文件），收集每个词语的全部读音及词频
+2. 读音以音节ID序列存储，音节ID与音节切分自动机（syllable_dfa.dat）一致；
+   音节按规范写法输出（pinyin_alias.KEY_SYLLABLES：lü、nüe、ju），与其他构建工具的键写法相同
+3. 词语表按UTF-8字节排序，反查时在映射的文件上做一次二分查找，无需扫描全部拼音或查询数据库
+
+文件分段：
+    META  JSON：来源词典、词语数、读音数、音节数
+    WPOL  字符串池，按UTF-8字节排序的词语表
+    ROFF  u32[词语数+1]，每个词语的读音区间
+    RDOF  u32[读音数+1]，每个读音在SIDS中的音节区间
+    SIDS  u16[]，音节ID序列
+    RFRQ  i32[读音数]，读音词频（同一词语内按词频降序）
+    SYLL  字符串池，音节表：前段为 KEY_SYLLABLES（与音节自动机的音节ID一一对应），音节表之外的读音（如 m、ng、hm）追加在后
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from build_syllable_automaton import SYLLABLES, reference_segment
+from pinyin_alias import KEY_SYLLABLES, canonical_syllable
+from trie_format import (
+    MappedFile, StringPool, load_source_entries, load_v3_file, pack_array,
+    pack_json, pack_string_pool, read_container, trie_asset_path, unpack_json,
+    write_container,
+)
+
+DEFAULT_DICTS = ['chars', 'base']
+DEFAULT_OUTPUT = "app/src/main/assets/trie/reverse_index.dat"
+
+Readings = Dict[str, Dict[Tuple[str, ...], int]]
+KEY_SYLLABLE_SET = set(KEY_SYLLABLES)
+
+
+def reading_syllables(key: str, syllable_set) -> Tuple[str, ...]:
+    """把拼音键拆成规范写法的音节（lü、nüe、ju）；没有空格分隔的连写键按cutWithDP规则切分，
+    syllable_set 为音节自动机的v写法音节表，切分后再逐个转为规范写法"""
+    syllables = []
+    for token in key.lower().replace("'", ' ').split():
+        token = canonical_syllable(token)
+        if token in KEY_SYLLABLE_SET:
+            syllables.append(token)
+            continue
+        parts = reference_segment(token.replace('ü', 'v'), syllable_set)
+        syllables.extend([canonical_syllable(part) for part in parts] if parts else [token])
+    return tuple(syllables)
+
+
+def collect_readings(dict_names: List[str]) -> Tuple[Readings, List[str]]:
+    """收集 词语 -> {音节序列: 最高词频}，返回读音表和实际使用的来源"""
+    syllable_set = set(SYLLABLES)
+    readings: Readings = {}
+    used = []
+    for name in dict_names:
+        entries = load_source_entries(name)
+        if entries is None:
+            path = trie_asset_path(name)
+            if not os.path.exists(path):
+                print(f"⚠️ 词典不存在，跳过: {name}")
+                continue
+            print(f"源文件不存在，使用预编译文件: {path}")
+            entries = [(word, key, frequency) for key, words in load_v3_file(path).items()
+                       for word, frequency in words]
+        used.append(name)
+
+        split_cache: Dict[str, Tuple[str, ...]] = {}
+        for word, key, frequency in entries:
+            syllables = split_cache.get(key)
+            if syllables is None:
+                syllables = split_cache[key] = reading_syllables(key, syllable_set)
+            if not syllables:
+                continue
+            per_word = readings.setdefault(word, {})
+            if frequency > per_word.get(syllables, -1):
+                per_word[syllables] = frequency
+        print(f"{name}: {len(entries)} 个词条，累计 {len(readings)} 个词语")
+    return readings, used
+
+
+def build_index(readings: Readings) -> Dict:
+    """构建反查索引的扁平数组"""
+    extras = sorted({s for per_word in readings.values() for r in per_word for s in r} - KEY_SYLLABLE_SET)
+    syllables = KEY_SYLLABLES + extras
+    syllable_ids = {s: i for i, s in enumerate(syllables)}
+
+    words = sorted(readings, key=lambda w: w.encode('utf-8'))
+    reading_offsets, sid_offsets, sids, frequencies = [0], [0], [], []
+    for word in words:
+        for syllable_seq, frequency in sorted(readings[word].items(), key=lambda x: (-x[1], x[0])):
+            sids.extend(syllable_ids[s] for s in syllable_seq)
+            sid_offsets.append(len(sids))
+            frequencies.append(frequency)
+        reading_offsets.append(len(frequencies))
+
+    return {
+        'words': words,
+        'reading_offsets': reading_offsets,
+        'sid_offsets': sid_offsets,
+        'sids': sids,
+        'frequencies': frequencies,
+        'syllables': syllables,
+        'extra_syllables': len(extras),
+    }
+
+
+def save_index(index: Dict, output_path: str, sources: List[str]) -> bool:
+    """保存反查索引"""
+    print(f"正在保存反查索引到文件: {output_path}")
+
+    try:
+        meta = {
+            'sources': sources,
+            'words': len(index['words']),
+            'readings': len(index['frequencies']),
+            'syllables': len(index['syllables']),
+            'automaton_syllables': len(KEY_SYLLABLES),
+        }
+        file_size = write_container(output_path, [
+            ('META', pack_json(meta)),
+            ('WPOL', pack_string_pool(index['words'])),
+            ('ROFF', pack_array('I', index['reading_offsets'])),
+            ('RDOF', pack_array('I', index['sid_offsets'])),
+            ('SIDS', pack_array('H', index['sids'])),
+            ('RFRQ', pack_array('i', index['frequencies'])),
+            ('SYLL', pack_string_pool(index['syllables'])),
+        ])
+        print(f"词语数: {meta['words']}，读音数: {meta['readings']}，音节表外读音: {index['extra_syllables']}")
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+        return True
+
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+class ReverseIndex:
+    """反查索引读取器，在映射的文件上二分查找词语"""
+
+    def __init__(self, path: str = DEFAULT_OUTPUT):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        self.words = StringPool(sections['WPOL'])
+        self.reading_offsets = sections['ROFF'].cast('I')
+        self.sid_offsets = sections['RDOF'].cast('I')
+        self.sids = sections['SIDS'].cast('H')
+        self.frequencies = sections['RFRQ'].cast('i')
+        pool = StringPool(sections['SYLL'])
+        self.syllables = [pool[i] for i in range(len(pool))]
+
+    def close(self):
+        self._file.close()
+
+    def reading_ids(self, word: str) -> List[Tuple[List[int], int]]:
+        """返回 [(音节ID序列, 词频)]，按词频降序；词语不存在时返回空列表"""
+        index = self.words.find(word)
+        if index < 0:
+            return []
+        result = []
+        for r in range(self.reading_offsets[index], self.reading_offsets[index + 1]):
+            ids = list(self.sids[self.sid_offsets[r]:self.sid_offsets[r + 1]])
+            result.append((ids, self.frequencies[r]))
+        return result
+
+    def readings(self, word: str) -> List[Tuple[str, int]]:
+        """返回 [(以空格分隔的拼音, 词频)]，按词频降序"""
+        return [(' '.join(self.syllables[i] for i in ids), frequency)
+                for ids, frequency in self.reading_ids(word)]
+
+
+def verify_index_file(file_path: str, readings: Readings, samples: int = 2000) -> bool:
+    """抽样核对反查结果与构建时的读音表一致，并对比全量扫描的耗时"""
+    print(f"\n正在验证反查索引: {file_path}")
+
+    try:
+        reader = ReverseIndex(file_path)
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+
+    try:
+        rng = random.Random(7)
+        words = list(readings)
+        sample = rng.sample(words, min(samples, len(words)))
+        mismatches = 0
+        start = time.perf_counter()
+        for word in sample:
+            got = {tuple(p.split()): f for p, f in reader.readings(word)}
+            if got != readings[word]:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  ❌ {word}: 期望 {readings[word]}，实际 {got}")
+        probe_us = (time.perf_counter() - start) * 1e6 / max(len(sample), 1)
+
+        missing_ok = reader.readings('\u0000不存在的词\u0000') == []
+
+        # 对照：在 拼音 -> 词语 结构上反查一个词需要扫描全部拼音
+        forward: Dict[str, List[str]] = {}
+        for word, per_word in readings.items():
+            for syllable_seq in per_word:
+                forward.setdefault(' '.join(syllable_seq), []).append(word)
+        scan_word = sample[0] if sample else ''
+        start = time.perf_counter()
+        _ = [key for key, key_words in forward.items() if scan_word in key_words]
+        scan_us = (time.perf_counter() - start) * 1e6
+
+        poly = sum(1 for per_word in readings.values() if len(per_word) > 1)
+        print(f"  抽样词语: {len(sample)}，结果不一致: {mismatches}")
+        print(f"  多音词语: {poly} / {len(readings)}")
+        print(f"  单次反查: {probe_us:.1f} us，全量扫描: {scan_us:.0f} us")
+        print(f"  不存在的词返回空: {'✅' if missing_ok else '❌'}")
+
+        ok = mismatches == 0 and missing_ok and reader.meta['words'] == len(readings)
+        print("✅ 反查索引验证通过" if ok else "❌ 反查索引验证失败")
+        return ok
+    finally:
+        reader.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="构建词语到读音的反查索引")
+    parser.add_argument('--dicts', default=','.join(DEFAULT_DICTS), help="来源词典，逗号分隔")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    parser.add_argument('--lookup', help="构建后反查并打印这些词语的读音，逗号分隔")
+    args = parser.parse_args()
+
+    dict_names = [d for d in args.dicts.split(',') if d]
+
+    print("=" * 60)
+    print("神迹输入法 - 反查索引构建工具")
+    print("=" * 60)
+    print(f"来源词典: {', '.join(dict_names)}")
+    print(f"输出文件: {args.output}")
+    print("=" * 60)
+
+    readings, used = collect_readings(dict_names)
+    if not readings:
+        print("❌ 没有可用的词条")
+        return 1
+
+    index = build_index(readings)
+    if not save_index(index, args.output, used):
+        print("❌ 保存文件失败")
+        return 1
+
+    if not verify_index_file(args.output, readings):
+        print("❌ 验证文件失败")
+        return 1
+
+    if args.lookup:
+        reader = ReverseIndex(args.output)
+        try:
+            for word in args.lookup.split(','):
+                found = reader.readings(word)
+                print(f"  {word}: " + ('，'.join(f"{p}({f})" for p, f in found) if found else "未收录"))
+        finally:
+            reader.close()
+
+    print("=" * 60)
+    print("✅ 反查索引构建成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
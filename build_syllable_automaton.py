@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 拼音音节切分自动机生成工具
+功能：
+1. 以PinyinSegmenterOptimized的音节表为准（ü统一写作v），构建音节字母Trie
+2. 合并等价状态，得到接受全部音节的最小DFA
+3. 为每个状态记录可接受的后缀数，沿转移累加即得到音节ID（按字母序）
+4. 写出紧凑的二进制转移表资源，运行时切分变为查表，不再回溯和创建子串
+5. 附带Python参考切分器，并与回溯切分器交叉验证
+
+资源分段：
+    META  JSON：字母表、状态数、起始状态、音节数
+    TRNS  u16[状态数 × 26]，下一状态，0xFFFF表示无转移
+    FINL  u8[状态数]，是否为音节结尾
+    CNTS  u16[状态数]，从该状态出发可接受的音节数
+    SYLL  字符串池，按音节ID排列的音节表
+"""
+
+import argparse
+import random
+import sys
+from typing import Dict, List, Tuple
+
+from trie_format import (
+    MappedFile, StringPool, pack_array, pack_json, pack_string_pool,
+    read_container, unpack_json, write_container,
+)
+
+DEFAULT_OUTPUT = "app/src/main/assets/pinyin/syllable_dfa.dat"
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+NO_STATE = 0xFFFF
+MAX_SYLLABLE_LENGTH = 6
+
+# 与PinyinSegmenterOptimized.syllableSet一致，ü写作v（键盘输入形式）
+SYLLABLES = sorted(set(s.replace('ü', 'v') for s in """
+a ai an ang ao o ou e en eng er i ia ie iao iu iong in ing
+u ua uo uai ui uan un uang ung ü üe üan ün v ve van vn
+zhi chi shi ri zi ci si yi wu yu ye yue yuan yin yun ying
+ba bo bai bei bao ban ben bang beng bi bie biao bian bin bing bu
+pa po pai pao pou pan pen pei pang peng pi pie piao pian pin ping pu
+ma mo me mai mao mou man men mei mang meng mi mie miao miu mian min ming mu
+fa fo fei fou fan fen fang feng fu
+da de dai dei dao dou dan dang den deng di die diao diu dian ding dong du duan dun dui duo
+ta te tai tao tou tan tang teng ti tie tiao tian ting tong tu tuan tun tui tuo
+na nai nei nao ne nen nan nang neng ni nie niao niu nian nin niang ning nong nou
+nu nuan nun nuo nü nüe
+la le lo lai lei lao lou lan lang leng li lia lie liao liu lian lin liang ling long
+lu luo luan lun lü lüe
+ga ge gai gei gao gou gan gen gang geng gong gu gua guai guan guang gui gun guo
+ka ke kai kao kou kan ken kang keng kong ku kua kuai kuan kuang kui kun kuo
+ha he hai han hei hao hou hen hang heng hong hu hua huai huan hui huo hun huang
+ji jia jie jiao jiu jian jin jiang jing jiong ju juan jun jue
+qi qia qie qiao qiu qian qin qiang qing qiong qu quan qun que
+xi xia xie xiao xiu xian xin xiang xing xiong xu xuan xun xue
+zha zhe zhai zhao zhou zhan zhen zhang zheng zhong zhu zhua zhuai zhuan zhuang zhun zhui zhuo
+cha che chai chao chou chan chen chang cheng chong chu chua chuai chuan chuang chun chui chuo
+sha she shai shao shou shan shen shang sheng shu shua shuai shuan shuang shun shui shuo
+re rao rou ran ren rang reng rong ru rui ruan run ruo
+za ze zai zao zan zou zang zei zen zeng zong zu zuan zun zui zuo
+ca ce cai cao cou can cen cang ceng cong cu cuan cun cui cuo
+sa se sai sao sou san sen sang seng song su suan sun sui suo
+ya yao you yan yang yo yong
+wa wo wai wei wan wen wang weng
+""".split()))
+
+
+# ==================== 自动机构建 ====================
+
+def build_minimal_dfa(syllables: List[str]) -> Tuple[List[Dict[str, int]], List[bool], int]:
+    """构建音节Trie并合并右语言相同的状态，返回 (转移表, 终态标记, 起始状态)"""
+    trie: List[Dict] = [{'next': {}, 'final': False}]
+    for syllable in syllables:
+        node = 0
+        for char in syllable:
+            nxt = trie[node]['next'].get(char)
+            if nxt is None:
+                nxt = len(trie)
+                trie.append({'next': {}, 'final': False})
+                trie[node]['next'][char] = nxt
+            node = nxt
+        trie[node]['final'] = True
+
+    # 后序遍历，以 (是否终态, 有序转移) 为签名登记等价状态
+    registry: Dict[Tuple, int] = {}
+    canonical: Dict[int, int] = {}
+    transitions: List[Dict[str, int]] = []
+    finals: List[bool] = []
+
+    order = []
+    stack = [(0, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        stack.append((node, True))
+        for child in trie[node]['next'].values():
+            stack.append((child, False))
+
+    for node in order:
+        edges = tuple(sorted((c, canonical[child]) for c, child in trie[node]['next'].items()))
+        signature = (trie[node]['final'], edges)
+        state = registry.get(signature)
+        if state is None:
+            state = len(transitions)
+            registry[signature] = state
+            transitions.append(dict(edges))
+            finals.append(trie[node]['final'])
+        canonical[node] = state
+
+    return transitions, finals, canonical[0]
+
+
+def count_accepted(transitions: List[Dict[str, int]], finals: List[bool]) -> List[int]:
+    """每个状态可接受的后缀数（子状态编号总是小于父状态，按编号顺序即可计算）"""
+    counts = [0] * len(transitions)
+    for state, edges in enumerate(transitions):
+        counts[state] = int(finals[state]) + sum(counts[child] for child in edges.values())
+    return counts
+
+
+def save_automaton(output_path: str, syllables: List[str]) -> bool:
+    """生成并保存音节自动机资源"""
+    print(f"正在保存音节自动机到文件: {output_path}")
+
+    try:
+        transitions, finals, start = build_minimal_dfa(syllables)
+        counts = count_accepted(transitions, finals)
+        table = []
+        for edges in transitions:
+            table.extend(edges.get(c, NO_STATE) for c in ALPHABET)
+
+        meta = {
+            'alphabet': ALPHABET,
+            'states': len(transitions),
+            'start': start,
+            'syllables': len(syllables),
+            'max_syllable_length': MAX_SYLLABLE_LENGTH,
+        }
+        file_size = write_container(output_path, [
+            ('META', pack_json(meta)),
+            ('TRNS', pack_array('H', table)),
+            ('FINL', pack_array('B', [int(f) for f in finals])),
+            ('CNTS', pack_array('H', counts)),
+            ('SYLL', pack_string_pool(syllables)),
+        ])
+        print(f"最小DFA: {len(transitions)} 个状态，{len(syllables)} 个音节")
+        print(f"文件保存成功！文件大小: {file_size} 字节")
+        return True
+
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+# ==================== 参考切分器 ====================
+
+class SyllableAutomaton:
+    """基于转移表的音节切分器，切分过程只做整数查表"""
+
+    def __init__(self, path: str = DEFAULT_OUTPUT):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        meta = unpack_json(sections['META'])
+        self.start = meta['start']
+        self.width = len(meta['alphabet'])
+        self.transitions = sections['TRNS'].cast('H')
+        self.finals = sections['FINL']
+        self.counts = sections['CNTS'].cast('H')
+        self.syllables = StringPool(sections['SYLL'])
+        self.syllable_list = [self.syllables[i] for i in range(len(self.syllables))]
+
+    def close(self):
+        self._file.close()
+
+    def _step(self, state: int, char: str) -> int:
+        code = ord(char) - 97
+        if code < 0 or code >= self.width:
+            return NO_STATE
+        return self.transitions[state * self.width + code]
+
+    def matches_at(self, text: str, start: int) -> List[Tuple[int, int]]:
+        """从start起沿自动机行走，返回所有音节结尾 [(结束位置, 音节ID)]，ID沿途累加得到"""
+        result = []
+        state = self.start
+        syllable_id = 0
+        width = self.width
+        for pos in range(start, len(text)):
+            code = ord(text[pos]) - 97
+            if code < 0 or code >= width:
+                break
+            # 跳过字母序更小的兄弟分支和当前终态，累加它们接受的音节数
+            if self.finals[state]:
+                syllable_id += 1
+            base = state * width
+            for smaller in range(code):
+                sibling = self.transitions[base + smaller]
+                if sibling != NO_STATE:
+                    syllable_id += self.counts[sibling]
+            state = self.transitions[base + code]
+            if state == NO_STATE:
+                break
+            if self.finals[state]:
+                result.append((pos + 1, syllable_id))
+        return result
+
+    def syllable_id(self, syllable: str) -> int:
+        """音节ID，非音节返回-1"""
+        for end, sid in self.matches_at(syllable, 0):
+            if end == len(syllable):
+                return sid
+        return -1
+
+    def is_syllable_prefix(self, text: str) -> bool:
+        """text是否为某个音节的前缀（用于识别未输完的末尾音节）"""
+        state = self.start
+        for char in text:
+            state = self._step(state, char)
+            if state == NO_STATE:
+                return False
+        return True
+
+    def segment(self, text: str) -> List[str]:
+        """与PinyinSegmenterOptimized.cutWithDP一致：每个位置优先取最长的结尾音节，失败返回空列表"""
+        n = len(text)
+        prev = [-1] * (n + 1)
+        reachable = [False] * (n + 1)
+        reachable[0] = True
+        longest_end = [[] for _ in range(n + 1)]
+        for start in range(n):
+            if reachable[start]:
+                for end, _ in self.matches_at(text, start):
+                    reachable[end] = True
+                    longest_end[end].append(start)
+        for end in range(1, n + 1):
+            if longest_end[end]:
+                prev[end] = min(longest_end[end])
+        if n == 0 or not reachable[n]:
+            return []
+        result = []
+        pos = n
+        while pos > 0:
+            result.append(text[prev[pos]:pos])
+            pos = prev[pos]
+        return result[::-1]
+
+    def segmentations(self, text: str, max_results: int = 16) -> List[List[int]]:
+        """列出全部切分（音节ID序列），如 xian -> [xian], [xi, an]，按音节数升序"""
+        n = len(text)
+        # 自右向左计算每个位置能否切分到结尾，避免无效分支
+        completes = [False] * (n + 1)
+        completes[n] = True
+        edges = [[] for _ in range(n + 1)]
+        for start in range(n - 1, -1, -1):
+            for end, sid in self.matches_at(text, start):
+                if completes[end]:
+                    completes[start] = True
+                    edges[start].append((end, sid))
+
+        return self._enumerate(edges, n, max_results)
+
+    @staticmethod
+    def _enumerate(edges: List[List[Tuple[int, int]]], n: int, max_results: int) -> List[List[int]]:
+        results: List[List[int]] = []
+
+        def walk(pos: int, path: List[int]):
+            if len(results) >= max_results * 4:
+                return
+            if pos == n:
+                results.append(list(path))
+                return
+            for end, sid in edges[pos]:
+                path.append(sid)
+                walk(end, path)
+                path.pop()
+
+        if n:
+            walk(0, [])
+        results.sort(key=len)
+        return results[:max_results]
+
+
+# ==================== 交叉验证 ====================
+
+def reference_segment(text: str, syllable_set) -> List[str]:
+    """参考实现：基于音节集合的DP，与Kotlin cutWithDP逐行对应"""
+    n = len(text)
+    if n == 0:
+        return []
+    dp = [False] * (n + 1)
+    prev = [-1] * (n + 1)
+    dp[0] = True
+    for i in range(1, n + 1):
+        for length in range(min(i, MAX_SYLLABLE_LENGTH), 0, -1):
+            j = i - length
+            if dp[j] and text[j:i] in syllable_set:
+                dp[i] = True
+                prev[i] = j
+                break
+    if not dp[n]:
+        return []
+    result = []
+    pos = n
+    while pos > 0:
+        result.append(text[prev[pos]:pos])
+        pos = prev[pos]
+    return result[::-1]
+
+
+def reference_segmentations(text: str, syllable_set) -> List[List[str]]:
+    """参考实现：回溯列出全部切分"""
+    results = []
+
+    def backtrack(pos: int, path: List[str]):
+        if pos == len(text):
+            results.append(list(path))
+            return
+        for length in range(1, min(MAX_SYLLABLE_LENGTH, len(text) - pos) + 1):
+            piece = text[pos:pos + length]
+            if piece in syllable_set:
+                path.append(piece)
+                backtrack(pos + length, path)
+                path.pop()
+
+    if text:
+        backtrack(0, [])
+    return results
+
+
+def verify_automaton(file_path: str, syllables: List[str], random_cases: int = 5000) -> bool:
+    """与基于集合的参考切分器交叉验证"""
+    print(f"正在验证音节自动机: {file_path}")
+
+    automaton = SyllableAutomaton(file_path)
+    try:
+        syllable_set = set(syllables)
+        if automaton.syllable_list != syllables:
+            print("错误：音节表与生成时不一致")
+            return False
+
+        for expected_id, syllable in enumerate(syllables):
+            if automaton.syllable_id(syllable) != expected_id:
+                print(f"错误：音节 '{syllable}' 的ID不正确")
+                return False
+
+        cases = list(syllables)
+        cases += [a + b for a in syllables for b in syllables]
+        rng = random.Random(7)
+        for _ in range(random_cases):
+            count = rng.randint(1, 5)
+            cases.append(''.join(rng.choice(syllables) for _ in range(count)))
+            cases.append(''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 8))))
+
+        checked = 0
+        for text in cases:
+            if automaton.segment(text) != reference_segment(text, syllable_set):
+                print(f"错误：'{text}' 最长匹配切分不一致: {automaton.segment(text)}")
+                return False
+            if len(text) <= 12:
+                expected = sorted(reference_segmentations(text, syllable_set))
+                actual = sorted([automaton.syllable_list[i] for i in ids]
+                                for ids in automaton.segmentations(text, max_results=1 << 16))
+                if actual != expected:
+                    print(f"错误：'{text}' 歧义切分不一致")
+                    return False
+            checked += 1
+
+        xian = [[automaton.syllable_list[i] for i in ids] for ids in automaton.segmentations('xian')]
+        print(f"   'xian' -> {xian}")
+        print(f"   'zhongguoren' -> {automaton.segment('zhongguoren')}")
+        print(f"验证成功！共交叉验证 {checked} 个输入")
+        return True
+    finally:
+        automaton.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生成拼音音节切分自动机资源")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    parser.add_argument('--random-cases', type=int, default=5000, help="随机交叉验证用例数")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("神迹输入法 - 拼音音节切分自动机生成工具")
+    print("=" * 60)
+
+    if not save_automaton(args.output, SYLLABLES):
+        print("❌ 保存文件失败")
+        return 1
+
+    if not verify_automaton(args.output, SYLLABLES, args.random_cases):
+        print("❌ 验证失败")
+        return 1
+
+    print("=" * 60)
+    print("✅ 音节切分自动机生成成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 未完成音节补全表生成工具
+用户经常停在音节中间（"zhon"、"xia"、"bei j"），查词典前要先在运行时把最后一段
+未完成的音节对照音节表展开成全部可能的完整音节。本工具预先计算：
+    未完成音节（任意音节的前缀，含本身也是前缀的完整音节，如 xia） -> 可补全成的完整音节ID
+ID与音节切分自动机一致（音节表按字母序的下标，ü 按词典键的规范写法 lü/nüe），每组按音节在词典中的频度降序，
+运行时一次二分查找即得到按常用程度排好的补全列表。
+
+音节频度：所选词典版本3文件中，每个拼音键的候选词频之和计入它包含的每个音节。
+
+资源分段：
+    META  JSON：词典、音节数、未完成音节数
+    SYLL  字符串池，音节表（与音节切分自动机一一对应，ID即下标，ü 为规范写法）
+    SFRQ  f32[音节数]，音节频度占比
+    PPOL  字符串池，未完成音节，按字节序排序
+    POFF  u32[未完成音节数+1]，每个未完成音节在PIDS中的区间
+    PIDS  u16[]，补全成的音节ID，按频度降序
+
+有序索引文件可再附带“最后一个音节未完成的键 -> 合并后的前K个候选”分段（build_indexed_trie.py --completion-top-k），
+未完成输入也只需一次查找。
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from build_merged_trie import TRIE_TYPES
+from pinyin_alias import KEY_SYLLABLES, canonical_key, canonical_query
+from trie_format import (
+    MappedFile, StringPool, iter_v3_entries, pack_array, pack_json, pack_string_pool,
+    read_container, trie_asset_path, unpack_json, write_container,
+)
+
+DEFAULT_OUTPUT = "app/src/main/assets/pinyin/syllable_completion.dat"
+DEFAULT_DICTS = 'chars,base,place,people'
+
+
+def syllable_frequencies(names: Sequence[str]) -> Counter:
+    """每个拼音键的候选词频之和计入它包含的每个音节（规范写法，音节表外的音节不计）"""
+    known = set(KEY_SYLLABLES)
+    counts: Counter = Counter()
+    for name in names:
+        path = trie_asset_path(name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            for key, words in iter_v3_entries(f.read()):
+                weight = sum(max(frequency, 0) for _, frequency in words)
+                for syllable in canonical_key(key).split(' '):
+                    if syllable in known:
+                        counts[syllable] += weight
+    return counts
+
+
+def build_completions(syllables: Sequence[str], counts: Counter) -> Dict[str, List[int]]:
+    """未完成音节 -> 补全成的音节ID（频度降序，同频度按字母序）"""
+    ranked = sorted(range(len(syllables)), key=lambda i: (-counts[syllables[i]], syllables[i]))
+    completions: Dict[str, List[int]] = {}
+    for syllable_id in ranked:
+        syllable = syllables[syllable_id]
+        for length in range(1, len(syllable) + 1):
+            completions.setdefault(syllable[:length], []).append(syllable_id)
+    return completions
+
+
+def save_completion_table(output_path: str, names: Sequence[str], counts: Counter) -> bool:
+    """生成并保存补全表资源"""
+    print(f"正在保存补全表到文件: {output_path}")
+
+    try:
+        completions = build_completions(KEY_SYLLABLES, counts)
+        partials = sorted(completions, key=lambda p: p.encode('utf-8'))
+        offsets, ids = [0], []
+        for partial in partials:
+            ids.extend(completions[partial])
+            offsets.append(len(ids))
+        total = sum(counts[s] for s in KEY_SYLLABLES) or 1
+
+        meta = {
+            'dicts': list(names),
+            'syllables': len(KEY_SYLLABLES),
+            'partials': len(partials),
+        }
+        file_size = write_container(output_path, [
+            ('META', pack_json(meta)),
+            ('SYLL', pack_string_pool(KEY_SYLLABLES)),
+            ('SFRQ', pack_array('f', [counts[s] / total for s in KEY_SYLLABLES])),
+            ('PPOL', pack_string_pool(partials)),
+            ('POFF', pack_array('I', offsets)),
+            ('PIDS', pack_array('H', ids)),
+        ])
+        print(f"{len(partials)} 个未完成音节，{len(ids)} 个补全项，{len(KEY_SYLLABLES)} 个音节")
+        print(f"文件保存成功！文件大小: {file_size} 字节")
+        return True
+
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+class SyllableCompletion:
+    """补全表读取器：未完成音节二分查找，返回按频度排好的完整音节"""
+
+    def __init__(self, path: str = DEFAULT_OUTPUT):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        self.syllables = StringPool(sections['SYLL'])
+        self.shares = sections['SFRQ'].cast('f')
+        self.partials = StringPool(sections['PPOL'])
+        self.offsets = sections['POFF'].cast('I')
+        self.ids = sections['PIDS'].cast('H')
+
+    def close(self):
+        self._file.close()
+
+    def completion_ids(self, partial: str, limit: Optional[int] = None) -> List[int]:
+        """未完成音节（ü 可用任意写法）可补全成的音节ID，频度降序；不是任何音节的前缀时为空"""
+        index = self.partials.find(canonical_query(partial))
+        if index < 0:
+            return []
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return list(self.ids[start:end])
+
+    def complete(self, partial: str, limit: Optional[int] = None) -> List[str]:
+        return [self.syllables[i] for i in self.completion_ids(partial, limit)]
+
+
+def verify_completion_table(file_path: str, counts: Counter) -> bool:
+    """与直接扫描音节表的结果逐个核对"""
+    print(f"正在验证补全表: {file_path}")
+
+    table = SyllableCompletion(file_path)
+    try:
+        if [table.syllables[i] for i in range(len(table.syllables))] != KEY_SYLLABLES:
+            print("错误：音节表与音节切分自动机不一致")
+            return False
+        partials = {syllable[:length] for syllable in KEY_SYLLABLES for length in range(1, len(syllable) + 1)}
+        if len(table.partials) != len(partials):
+            print(f"错误：未完成音节数不一致 {len(table.partials)} != {len(partials)}")
+            return False
+        for partial in partials:
+            expected = sorted((s for s in KEY_SYLLABLES if s.startswith(partial)), key=lambda s: (-counts[s], s))
+            if table.complete(partial) != expected:
+                print(f"错误：'{partial}' 的补全结果不一致")
+                return False
+        if table.complete('zhx') or table.complete('') or table.complete('q') != table.complete('q', 100):
+            print("错误：非音节前缀或截取结果不正确")
+            return False
+        for partial in ['zhon', 'xia', 'j', 'lv']:
+            print(f"   '{partial}' -> {' '.join(table.complete(partial, 8))}")
+        print(f"验证成功！共核对 {len(partials)} 个未完成音节")
+        return True
+    finally:
+        table.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生成未完成音节 -> 完整音节的补全表资源")
+    parser.add_argument('--dicts', default=DEFAULT_DICTS, help="统计音节频度的词典，逗号分隔（不存在的词典跳过）")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 未完成音节补全表生成工具")
+    print("=" * 60)
+
+    available = [name for name in names if os.path.exists(trie_asset_path(name))]
+    if not available:
+        print("❌ 没有可用的词典文件")
+        return 1
+    counts = syllable_frequencies(available)
+    print(f"音节频度来源: {', '.join(available)}，{len(counts)}/{len(KEY_SYLLABLES)} 个音节出现过")
+
+    if not save_completion_table(args.output, available, counts):
+        print("❌ 保存文件失败")
+        return 1
+
+    if not verify_completion_table(args.output, counts):
+        print("❌ 验证失败")
+        return 1
+
+    print("=" * 60)
+    print("✅ 未完成音节补全表生成成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
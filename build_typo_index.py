@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 拼音纠错删除索引构建工具（SymSpell对称删除）
+功能：
+1. 收集基础词典和单字词典的全部拼音键（去空格连写形式）
+2. 对每个键的前缀生成编辑距离1~2的全部删除变体，按删除串哈希分桶为 桶 -> 键ID列表
+3. 查询时对输入做同样的删除，几次哈希查找即可得到候选键，再用加权编辑距离复核排序：
+   zh/z、ch/c、sh/s、ang/an等模糊音、n/l混淆、QWERTY相邻键误触、快速输入的字母颠倒代价减半
+
+不需要走AI纠错路径即可覆盖常见的拼写错误（见 AI候选词优化.md 的“快速纠错”）。
+
+文件分段：
+    META  JSON：来源词典、键数、最大编辑距离、前缀长度、哈希算法、桶位数
+    KPOL  字符串池，按字符串排序的连写拼音键
+    KFRQ  i32[键数]，键的最高词频，用于同距离候选排序
+    DOFF  u32[桶数+1]，每个桶在DKEY中的字节区间；桶号为删除串CRC32的低位
+    DKEY  每个桶内升序键ID的差值varint序列（首个为ID本身）
+
+不存哈希值本身：不同删除串落入同一个桶只会多出几个候选，复核距离时自然被排除。
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from dict_parser import RimeDictParser
+from trie_format import (
+    MappedFile, StringPool, append_varint, dict_source_path, iter_v3_entries,
+    pack_array, pack_json, pack_string_pool, read_container, read_varint,
+    trie_asset_path, unpack_json, write_container,
+)
+from trie_reader import normalize_pinyin
+
+DEFAULT_DICTS = ['chars', 'base']
+DEFAULT_OUTPUT = "app/src/main/assets/trie/typo_index.dat"
+DEFAULT_MAX_DISTANCE = 2
+DEFAULT_PREFIX_LENGTH = 7
+
+QWERTY_ROWS = ['qwertyuiop', 'asdfghjkl', 'zxcvbnm']
+
+# 声母/韵母模糊音：前一个字母后面多打或漏打的字母（zh/z、ch/c、sh/s、ang/an、eng/en、ing/in）
+FUZZY_INSERTIONS = {('z', 'h'), ('c', 'h'), ('s', 'h'), ('n', 'g')}
+# 发音混淆的替换
+FUZZY_SUBSTITUTIONS = {('n', 'l'), ('l', 'n')}
+
+REDUCED_COST = 0.5
+
+
+def _qwerty_neighbors() -> Dict[str, Set[str]]:
+    """键盘相邻键：同一行左右相邻，上下行按错位排列相邻"""
+    position = {ch: (r, c) for r, row in enumerate(QWERTY_ROWS) for c, ch in enumerate(row)}
+    neighbors: Dict[str, Set[str]] = {ch: set() for ch in position}
+    for a, (ra, ca) in position.items():
+        for b, (rb, cb) in position.items():
+            if a == b:
+                continue
+            if ra == rb and abs(ca - cb) == 1:
+                neighbors[a].add(b)
+            elif rb == ra + 1 and cb in (ca - 1, ca):
+                neighbors[a].add(b)
+                neighbors[b].add(a)
+    return neighbors
+
+
+QWERTY_NEIGHBORS = _qwerty_neighbors()
+
+
+def deletion_variants(text: str, max_distance: int) -> Set[str]:
+    """删除0~max_distance个字母得到的全部变体；不超过max_distance个字母的串包含空串，
+    否则长度不超过max_distance的键与查询没有共同的删除串，距离内也查不到"""
+    result = {text}
+    frontier = {text}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for item in frontier:
+            for i in range(len(item)):
+                next_frontier.add(item[:i] + item[i + 1:])
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+
+def deletion_hash(text: str) -> int:
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def typo_distance(source: str, target: str, adjacency: bool = True, weighted: bool = True,
+                  bound: float = float('inf')) -> float:
+    """加权的限制Damerau-Levenshtein距离：模糊音增删、n/l混淆、相邻键替换、相邻字母颠倒代价减半
+
+    weighted=False 时所有操作代价为1（普通编辑距离）。给定bound时只计算对角线附近的带状区域，
+    超过bound时提前结束并返回无穷大；相同前缀直接跳过（保留末尾的重复字母作为模糊音上下文）。
+    """
+    half = REDUCED_COST if weighted else 1.0
+    inf = float('inf')
+
+    def indel_cost(text: str, i: int) -> float:
+        # text[i] 被插入或删除；模糊音字母只在其前一个字母匹配时减半
+        if i > 0 and (text[i - 1], text[i]) in FUZZY_INSERTIONS:
+            return half
+        return 1.0
+
+    def substitution_cost(a: str, b: str) -> float:
+        if a == b:
+            return 0.0
+        if weighted and ((a, b) in FUZZY_SUBSTITUTIONS or (adjacency and b in QWERTY_NEIGHBORS.get(a, ()))):
+            return half
+        return 1.0
+
+    skip = 0
+    limit = min(len(source), len(target))
+    while skip < limit and source[skip] == target[skip]:
+        skip += 1
+    if skip:
+        # 增删的代价取决于前一个字母，相同字母的连续段整体保留，例如 zhangg/zhang 要能删掉 n 后面的 g
+        skip -= 1
+        while skip > 0 and source[skip - 1] == source[skip]:
+            skip -= 1
+    n, m = len(source) - skip, len(target) - skip
+    band = max(n, m) if bound == inf else int(bound / half)
+    if abs(n - m) > band:
+        return inf
+
+    previous2: List[float] = []
+    previous = [0.0] * (m + 1)
+    for j in range(1, m + 1):
+        previous[j] = previous[j - 1] + indel_cost(target, skip + j - 1)
+    previous_min = 0.0
+    for i in range(1, n + 1):
+        si = skip + i - 1
+        current = [previous[0] + indel_cost(source, si) if i <= band else inf] + [inf] * m
+        for j in range(max(1, i - band), min(m, i + band) + 1):
+            tj = skip + j - 1
+            best = min(previous[j] + indel_cost(source, si),
+                       current[j - 1] + indel_cost(target, tj),
+                       previous[j - 1] + substitution_cost(source[si], target[tj]))
+            if (i > 1 and j > 1 and source[si] == target[tj - 1]
+                    and source[si - 1] == target[tj] and source[si] != source[si - 1]):
+                best = min(best, previous2[j - 2] + half)
+            current[j] = best
+        current_min = min(current)
+        # 每个单元只依赖前两行，连续两行都超过上限时结果必然超过上限
+        if current_min > bound and previous_min > bound:
+            return inf
+        previous2, previous, previous_min = previous, current, current_min
+    return previous[m] if previous[m] <= bound else inf
+
+
+def letter_difference(counts: Dict[str, int], text: str) -> int:
+    """两串字母计数之差的总和；每次替换最多改变2，增删改变1，颠倒不变，因此不超过2倍编辑距离"""
+    difference = 0
+    for ch in set(counts).union(text):
+        difference += abs(counts.get(ch, 0) - text.count(ch))
+    return difference
+
+
+# ==================== 构建 ====================
+
+def collect_keys(dict_names: List[str], input_mode: str) -> Tuple[Dict[str, int], List[str]]:
+    """收集 连写拼音键 -> 最高词频，返回键表和实际使用的来源"""
+    keys: Dict[str, int] = {}
+    used = []
+    for name in dict_names:
+        before = len(keys)
+        if input_mode == 'assets':
+            path = trie_asset_path(name)
+            if not os.path.exists(path):
+                print(f"⚠️ 词典不存在，跳过: {name}")
+                continue
+            with MappedFile(path) as f:
+                for key, words in iter_v3_entries(f.buffer):
+                    top = max((frequency for _, frequency in words), default=0)
+                    normalized = normalize_pinyin(key)
+                    if top > keys.get(normalized, -1):
+                        keys[normalized] = top
+        else:
+            path = dict_source_path(name)
+            if not os.path.exists(path):
+                print(f"⚠️ 词典不存在，跳过: {name}")
+                continue
+            with RimeDictParser(path) as parser:
+                for normalized, frequency in parser.iter_entries(fields=('code', 'weight'),
+                                                                 code_transform=normalize_pinyin):
+                    if frequency > keys.get(normalized, -1):
+                        keys[normalized] = frequency
+        used.append(name)
+        print(f"{name}: 新增 {len(keys) - before} 个拼音键，累计 {len(keys)} 个")
+    keys.pop('', None)
+    return keys, used
+
+
+def build_index(keys: List[str], max_distance: int, prefix_length: int) -> Dict:
+    """生成 桶 -> 键ID 的分组数据；共享前缀的键只生成一次删除变体，桶数取不小于删除串数的2的幂"""
+    hashes = array('I')
+    key_ids = array('I')
+    prefix_cache: Dict[str, List[int]] = {}
+    for key_id, key in enumerate(keys):
+        prefix = key[:prefix_length]
+        variant_hashes = prefix_cache.get(prefix)
+        if variant_hashes is None:
+            variant_hashes = prefix_cache[prefix] = [deletion_hash(v) for v in deletion_variants(prefix, max_distance)]
+        hashes.extend(variant_hashes)
+        key_ids.extend([key_id] * len(variant_hashes))
+
+    hash_array = np.frombuffer(hashes, dtype=np.uint32)
+    variants = len(np.unique(hash_array))
+    bucket_bits = max(4, (variants - 1).bit_length())
+    buckets = (hash_array & np.uint32((1 << bucket_bits) - 1)).astype(np.uint64)
+    pairs = np.unique((buckets << np.uint64(32)) | np.frombuffer(key_ids, dtype=np.uint32).astype(np.uint64))
+    pair_buckets = (pairs >> np.uint64(32)).astype(np.int64)
+    pair_ids = (pairs & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+    # 桶内差值编码：桶首存ID本身，其余存与前一个ID的差
+    deltas = np.diff(pair_ids, prepend=0)
+    first_in_bucket = np.ones(len(pairs), dtype=bool)
+    first_in_bucket[1:] = pair_buckets[1:] != pair_buckets[:-1]
+    deltas[first_in_bucket] = pair_ids[first_in_bucket]
+
+    blob = bytearray()
+    offsets = array('I', [0]) * ((1 << bucket_bits) + 1)
+    bounds = np.searchsorted(pair_buckets, np.arange((1 << bucket_bits) + 1))
+    for bucket in range(1 << bucket_bits):
+        for delta in deltas[bounds[bucket]:bounds[bucket + 1]].tolist():
+            append_varint(blob, delta)
+        offsets[bucket + 1] = len(blob)
+    return {
+        'offsets': offsets,
+        'key_ids': bytes(blob),
+        'bucket_bits': bucket_bits,
+        'variants': variants,
+        'pairs': len(pairs),
+        'prefixes': len(prefix_cache),
+    }
+
+
+def save_index(output_path: str, keys: List[str], key_freqs: Dict[str, int], index: Dict,
+               sources: List[str], max_distance: int, prefix_length: int, adjacency: bool) -> bool:
+    """保存删除索引"""
+    print(f"正在保存纠错删除索引到文件: {output_path}")
+
+    try:
+        meta = {
+            'sources': sources,
+            'keys': len(keys),
+            'variants': index['variants'],
+            'pairs': index['pairs'],
+            'bucket_bits': index['bucket_bits'],
+            'max_distance': max_distance,
+            'prefix_length': prefix_length,
+            'adjacency': adjacency,
+            'hash': 'crc32',
+        }
+        file_size = write_container(output_path, [
+            ('META', pack_json(meta)),
+            ('KPOL', pack_string_pool(keys)),
+            ('KFRQ', pack_array('i', [key_freqs[key] for key in keys])),
+            ('DOFF', pack_array('I', index['offsets'])),
+            ('DKEY', index['key_ids']),
+        ])
+        print(f"拼音键: {len(keys)}，删除串: {index['variants']}，桶: {1 << index['bucket_bits']}，"
+              f"键ID条目: {index['pairs']}（{len(index['key_ids'])} 字节）")
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+        return True
+
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return False
+
+
+# ==================== 查询 ====================
+
+class TypoIndex:
+    """纠错删除索引读取器"""
+
+    def __init__(self, path: str = DEFAULT_OUTPUT):
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        self.keys = StringPool(sections['KPOL'])
+        self.key_freqs = sections['KFRQ'].cast('i')
+        self.offsets = sections['DOFF'].cast('I')
+        self.key_ids = sections['DKEY']
+        self.bucket_mask = (1 << self.meta['bucket_bits']) - 1
+        self.max_distance = self.meta['max_distance']
+        self.prefix_length = self.meta['prefix_length']
+        self.adjacency = self.meta['adjacency']
+
+    def close(self):
+        self._file.close()
+
+    def candidate_ids(self, query: str) -> Set[int]:
+        """对查询前缀做删除变体，逐个读取所在桶，返回候选键ID（未复核距离）"""
+        ids: Set[int] = set()
+        for variant in deletion_variants(query[:self.prefix_length], self.max_distance):
+            bucket = deletion_hash(variant) & self.bucket_mask
+            pos, end = self.offsets[bucket], self.offsets[bucket + 1]
+            key_id = 0
+            while pos < end:
+                delta, pos = read_varint(self.key_ids, pos)
+                key_id += delta
+                ids.add(key_id)
+        return ids
+
+    def suggest(self, pinyin: str, limit: int = 10, max_distance: Optional[float] = None) -> List[Tuple[str, float]]:
+        """返回 [(连写拼音键, 加权距离)]，按加权距离升序、同距离按键的最高词频降序
+
+        候选为普通编辑距离不超过索引最大距离的键（删除索引能保证的范围），加权距离再以max_distance过滤。
+        """
+        query = normalize_pinyin(pinyin)
+        if not query:
+            return []
+        bound = self.max_distance if max_distance is None else max_distance
+        counts = {ch: query.count(ch) for ch in set(query)}
+        scored = []
+        for key_id in self.candidate_ids(query):
+            key = self.keys[key_id]
+            # 先用长度差和字母计数差排除，再算普通编辑距离，最后才算加权距离
+            if abs(len(key) - len(query)) > self.max_distance:
+                continue
+            if letter_difference(counts, key) > 2 * self.max_distance:
+                continue
+            if typo_distance(query, key, weighted=False, bound=self.max_distance) > self.max_distance:
+                continue
+            distance = typo_distance(query, key, self.adjacency, bound=bound)
+            if distance <= bound:
+                scored.append((distance, -self.key_freqs[key_id], key))
+        scored.sort()
+        return [(key, distance) for distance, _, key in scored[:limit]]
+
+
+def make_typo(key: str, rng: random.Random) -> str:
+    """模拟常见输入错误：漏打/多打模糊音字母、相邻键误触、字母颠倒、n/l混淆"""
+    kinds = []
+    for i in range(1, len(key)):
+        if (key[i - 1], key[i]) in FUZZY_INSERTIONS:
+            kinds.append(('drop', i))
+    for i, ch in enumerate(key):
+        if ch in QWERTY_NEIGHBORS:
+            kinds.append(('near', i))
+        if ch in 'nl':
+            kinds.append(('nl', i))
+    for i in range(len(key) - 1):
+        if key[i] != key[i + 1]:
+            kinds.append(('swap', i))
+    if not kinds:
+        return key
+    kind, i = rng.choice(kinds)
+    if kind == 'drop':
+        return key[:i] + key[i + 1:]
+    if kind == 'near':
+        return key[:i] + rng.choice(sorted(QWERTY_NEIGHBORS[key[i]])) + key[i + 1:]
+    if kind == 'nl':
+        return key[:i] + ('l' if key[i] == 'n' else 'n') + key[i + 1:]
+    return key[:i] + key[i + 1] + key[i] + key[i + 2:]
+
+
+def verify_typo_index(file_path: str, keys: List[str], samples: int = 1000, brute_force_keys: int = 3000) -> bool:
+    """核对：每个键都能查到自身；抽样制造错误后原键出现在候选中；抽样与暴力计算结果对比"""
+    print(f"\n正在验证纠错删除索引: {file_path}")
+
+    try:
+        index = TypoIndex(file_path)
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+
+    try:
+        rng = random.Random(7)
+        missing_self = sum(1 for key in rng.sample(keys, min(samples, len(keys)))
+                           if (key, 0.0) not in index.suggest(key, limit=len(keys)))
+
+        sample = [key for key in rng.sample(keys, min(samples, len(keys))) if len(key) >= 2]
+        found = top5 = probes = 0
+        start = time.perf_counter()
+        for key in sample:
+            typo = make_typo(key, rng)
+            if typo == key:
+                continue
+            probes += 1
+            suggestions = [k for k, _ in index.suggest(typo, limit=50)]
+            if key in suggestions:
+                found += 1
+                if key in suggestions[:5]:
+                    top5 += 1
+        query_ms = (time.perf_counter() - start) * 1000 / max(probes, 1)
+
+        # 暴力对照：在部分键上直接计算普通编辑距离，删除索引应召回距离内的全部键
+        subset = set(rng.sample(keys, min(brute_force_keys, len(keys))))
+        missed = compared = 0
+        for key in sample[:100]:
+            typo = make_typo(key, rng)
+            expected = {k for k in subset
+                        if typo_distance(typo, k, weighted=False, bound=index.max_distance) <= index.max_distance}
+            got = {k for k, _ in index.suggest(typo, limit=len(keys))}
+            compared += len(expected)
+            missed += len(expected - got)
+
+        recall = found / max(probes, 1)
+        print(f"  自身查找失败: {missing_self}")
+        print(f"  模拟错误 {probes} 个：召回原键 {recall:.1%}，前5名 {top5 / max(probes, 1):.1%}")
+        print(f"  暴力对照: {compared} 个候选，索引遗漏 {missed} 个")
+        print(f"  单次纠错查询: {query_ms:.2f} ms")
+
+        ok = missing_self == 0 and recall >= 0.9 and missed == 0
+        print("✅ 纠错删除索引验证通过" if ok else "❌ 纠错删除索引验证失败")
+        return ok
+    finally:
+        index.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="构建SymSpell风格的拼音纠错删除索引")
+    parser.add_argument('--dicts', default=','.join(DEFAULT_DICTS), help="来源词典，逗号分隔")
+    parser.add_argument('--input', choices=['assets', 'source'], default='assets', help="读取预编译文件或词典源文件")
+    parser.add_argument('--max-distance', type=int, choices=[1, 2], default=DEFAULT_MAX_DISTANCE, help="最大编辑距离")
+    parser.add_argument('--prefix-length', type=int, default=DEFAULT_PREFIX_LENGTH, help="生成删除变体的键前缀长度")
+    parser.add_argument('--no-adjacency', action='store_true', help="复核距离时不按QWERTY相邻键减半替换代价")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    parser.add_argument('--query', help="构建后查询这些错误拼音的纠错候选，逗号分隔")
+    args = parser.parse_args()
+
+    dict_names = [d for d in args.dicts.split(',') if d]
+
+    print("=" * 60)
+    print("神迹输入法 - 拼音纠错删除索引构建工具")
+    print("=" * 60)
+    print(f"来源词典: {', '.join(dict_names)}")
+    print(f"最大编辑距离: {args.max_distance}，前缀长度: {args.prefix_length}")
+    print(f"输出文件: {args.output}")
+    print("=" * 60)
+
+    key_freqs, used = collect_keys(dict_names, args.input)
+    if not key_freqs:
+        print("❌ 没有可用的拼音键")
+        return 1
+
+    keys = sorted(key_freqs)
+    start = time.perf_counter()
+    index = build_index(keys, args.max_distance, args.prefix_length)
+    print(f"删除变体生成完成：{index['prefixes']} 个不同前缀，耗时 {time.perf_counter() - start:.1f} 秒")
+
+    if not save_index(args.output, keys, key_freqs, index, used,
+                      args.max_distance, args.prefix_length, not args.no_adjacency):
+        print("❌ 保存文件失败")
+        return 1
+
+    if not verify_typo_index(args.output, keys):
+        print("❌ 验证文件失败")
+        return 1
+
+    if args.query:
+        reader = TypoIndex(args.output)
+        try:
+            for typo in args.query.split(','):
+                found = reader.suggest(typo, limit=8)
+                print(f"  {typo}: " + ('，'.join(f"{k}({d:g})" for k, d in found) if found else "无候选"))
+        finally:
+            reader.close()
+
+    print("=" * 60)
+    print("✅ 纠错删除索引构建成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,17 +8,27 @@
 import os
 import sys
 import struct
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from cap_policy import CoveragePolicy, coverage_cap, parse_policy
+from dict_parser import RimeDictParser
+from pinyin_alias import canonical_key
+
+try:
+    from columnar_build import ColumnarTable, write_table_v3
+    from parse_cache import load_parsed_columns
+except ImportError:  # 未安装numpy时使用逐词条字典构建，也不使用解析缓存
+    ColumnarTable = load_parsed_columns = None
 
 def remove_tone_marks(pinyin: str) -> str:
-    """去除拼音中的声调符号"""
+    """去除拼音中的声调符号，ü 的各种写法统一为规范写法（见 pinyin_alias）"""
     tone_map = {
         'ā': 'a', 'á': 'a', 'ǎ': 'a', 'à': 'a',
         'ē': 'e', 'é': 'e', 'ě': 'e', 'è': 'e',
         'ī': 'i', 'í': 'i', 'ǐ': 'i', 'ì': 'i',
         'ō': 'o', 'ó': 'o', 'ǒ': 'o', 'ò': 'o',
         'ū': 'u', 'ú': 'u', 'ǔ': 'u', 'ù': 'u',
-        'ǖ': 'ü', 'ǘ': 'ü', 'ǚ': 'ü', 'ǜ': 'ü', 'ü': 'v',
+        'ǖ': 'ü', 'ǘ': 'ü', 'ǚ': 'ü', 'ǜ': 'ü',
         'ń': 'n', 'ň': 'n', 'ǹ': 'n'
     }
     
@@ -26,7 +36,7 @@ def remove_tone_marks(pinyin: str) -> str:
     for char in pinyin:
         result += tone_map.get(char, char)
     
-    return result
+    return canonical_key(result)
 
 def parse_dict_file(file_path: str, percentage: float = 0.3) -> List[Tuple[str, str, int]]:
     """解析词典文件并筛选指定比例的高频词条"""
@@ -35,31 +45,17 @@ def parse_dict_file(file_path: str, percentage: float = 0.3) -> List[Tuple[str,
     print(f"正在解析词典文件: {file_path}")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            line_count = 0
-            for line in f:
-                line_count += 1
-                if line_count % 25000 == 0:
-                    print(f"已处理 {line_count} 行...")
-                
-                line = line.strip()
-                if not line:
-                    continue
-                
-                parts = line.split('\t')
-                if len(parts) >= 3:
-                    word = parts[0].strip()
-                    pinyin = parts[1].strip()
-                    
-                    if not pinyin or len(pinyin.strip()) == 0:
-                        continue
-                    
-                    try:
-                        frequency = int(parts[2].strip())
-                        pinyin_no_tone = remove_tone_marks(pinyin)
-                        entries.append((word, pinyin_no_tone, frequency))
-                    except ValueError:
+        if load_parsed_columns is not None:
+            # 源文件未变时直接读取上次解析的列
+            entries = list(load_parsed_columns(file_path, remove_tone_marks).iter_entries())
+        else:
+            with RimeDictParser(file_path) as parser:
+                for word, pinyin, frequency in parser.iter_entries(code_transform=remove_tone_marks):
+                    if not pinyin:
                         continue
+                    entries.append((word, pinyin, frequency))
+                    if len(entries) % 25000 == 0:
+                        print(f"已处理 {len(entries)} 个词条...")
     
     except Exception as e:
         print(f"错误：解析文件失败 - {e}")
@@ -79,8 +75,26 @@ def parse_dict_file(file_path: str, percentage: float = 0.3) -> List[Tuple[str,
     
     return filtered_entries
 
-def build_trie_data(entries: List[Tuple[str, str, int]], max_words_per_pinyin: int = 40) -> Dict:
-    """构建Trie数据结构"""
+def parse_dict_table(file_path: str, percentage: float = 0.3) -> Optional['ColumnarTable']:
+    """列式引擎的解析与筛选：读取（或生成）解析缓存，在数组上筛选高频词条，词条与 parse_dict_file 相同"""
+    print(f"正在解析词典文件: {file_path}")
+    try:
+        columns = load_parsed_columns(file_path, remove_tone_marks)
+    except Exception as e:
+        print(f"错误：解析文件失败 - {e}")
+        return None
+    print(f"解析完成，共获得 {len(columns)} 个词条")
+    
+    print(f"正在筛选词频最高的 {percentage*100}% 词语...")
+    selection = columns.top_fraction(percentage)
+    print(f"筛选完成，从 {len(columns)} 个词条中选择了 {len(selection)} 个高频词条")
+    if len(selection):
+        print(f"词频范围：{columns.frequencies[selection[-1]]} - {columns.frequencies[selection[0]]}")
+    return ColumnarTable.from_columns(columns, selection)
+
+def build_trie_data(entries: List[Tuple[str, str, int]], max_words_per_pinyin: int = 40,
+                    policy: Optional[CoveragePolicy] = None) -> Dict:
+    """构建Trie数据结构；给出覆盖率策略时每个拼音再按词频覆盖率截断（最多仍为max_words_per_pinyin个）"""
     print("正在构建Trie数据...")
     
     trie_data = {}
@@ -105,10 +119,15 @@ def build_trie_data(entries: List[Tuple[str, str, int]], max_words_per_pinyin: i
     total_words = 0
     for pinyin in trie_data:
         trie_data[pinyin].sort(key=lambda x: x['frequency'], reverse=True)
-        trie_data[pinyin] = trie_data[pinyin][:max_words_per_pinyin]
+        limit = max_words_per_pinyin
+        if policy is not None:
+            limit = min(limit, coverage_cap([item['frequency'] for item in trie_data[pinyin]], policy))
+        trie_data[pinyin] = trie_data[pinyin][:limit]
         total_words += len(trie_data[pinyin])
     
     print(f"Trie构建完成！包含 {len(trie_data)} 个拼音条目，总词数: {total_words}")
+    if policy is not None:
+        print(f"按{policy.describe()}截断：保留 {total_words} 个，删除 {len(entries) - total_words} 个")
     return trie_data
 
 def save_trie_data_file(trie_data: Dict, output_path: str) -> bool:
@@ -151,7 +170,8 @@ def save_trie_data_file(trie_data: Dict, output_path: str) -> bool:
         print(f"错误：保存文件失败 - {e}")
         return False
 
-def build_dict_trie(dict_name: str, percentage: float = 0.3, max_words: int = 40):
+def build_dict_trie(dict_name: str, percentage: float = 0.3, max_words: int = 40,
+                    policy: Optional[CoveragePolicy] = None):
     """构建指定词典的Trie文件"""
     input_path = f"app/src/main/assets/cn_dicts/{dict_name}.dict.yaml"
     output_path = f"app/src/main/assets/trie/{dict_name}_trie.dat"
@@ -162,6 +182,8 @@ def build_dict_trie(dict_name: str, percentage: float = 0.3, max_words: int = 40
     print(f"输入文件: {input_path}")
     print(f"输出文件: {output_path}")
     print(f"策略: 保留{percentage*100}%高频词，每个拼音最多{max_words}个词")
+    if policy is not None:
+        print(f"自适应截断: {policy.describe()}")
     print("=" * 60)
     
     # 检查输入文件是否存在
@@ -169,22 +191,39 @@ def build_dict_trie(dict_name: str, percentage: float = 0.3, max_words: int = 40
         print(f"❌ 输入文件不存在: {input_path}")
         return False
     
-    # 解析并筛选词典文件
-    entries = parse_dict_file(input_path, percentage)
-    if not entries:
-        print("❌ 解析词典文件失败")
-        return False
-    
-    # 构建Trie数据
-    trie_data = build_trie_data(entries, max_words)
-    if not trie_data:
-        print("❌ 构建Trie数据失败")
-        return False
-    
-    # 保存文件
-    if not save_trie_data_file(trie_data, output_path):
-        print("❌ 保存文件失败")
-        return False
+    if ColumnarTable is not None:
+        # 列式引擎：解析结果来自缓存，筛选、分组、排序、截断和写出都在数组上完成
+        table = parse_dict_table(input_path, percentage)
+        if table is None or not len(table):
+            print("❌ 解析词典文件失败")
+            return False
+        print("正在使用列式引擎构建并保存Trie数据...")
+        try:
+            key_count, word_count, file_size = write_table_v3(table, output_path, max_words, policy)
+        except Exception as e:
+            print(f"❌ 列式构建失败 - {e}")
+            return False
+        print(f"Trie构建完成！包含 {key_count} 个拼音条目，总词数: {word_count}")
+        if policy is not None:
+            print(f"按{policy.describe()}截断：保留 {word_count} 个，删除 {len(table) - word_count} 个")
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+    else:
+        # 解析并筛选词典文件
+        entries = parse_dict_file(input_path, percentage)
+        if not entries:
+            print("❌ 解析词典文件失败")
+            return False
+        
+        # 构建Trie数据
+        trie_data = build_trie_data(entries, max_words, policy)
+        if not trie_data:
+            print("❌ 构建Trie数据失败")
+            return False
+        
+        # 保存文件
+        if not save_trie_data_file(trie_data, output_path):
+            print("❌ 保存文件失败")
+            return False
     
     print("=" * 60)
     print(f"✅ {dict_name}词典Trie文件构建成功！")
@@ -196,16 +235,23 @@ def build_dict_trie(dict_name: str, percentage: float = 0.3, max_words: int = 40
 def main():
     """主函数"""
     if len(sys.argv) < 2:
-        print("用法: python build_universal_trie.py <词典名称> [筛选比例] [每拼音最大词数]")
+        print("用法: python build_universal_trie.py <词典名称> [筛选比例] [每拼音最大词数] [词频覆盖率] [每拼音最少词数]")
         print("示例: python build_universal_trie.py correlation 0.3 40")
+        print("示例: python build_universal_trie.py place 1.0 40 0.95 5")
         print("可用词典: correlation, associational, place, people, poetry, corrections, compatible")
         return 1
     
     dict_name = sys.argv[1]
     percentage = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
     max_words = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+    try:
+        policy = parse_policy(sys.argv[4] if len(sys.argv) > 4 else None,
+                              sys.argv[5] if len(sys.argv) > 5 else None)
+    except ValueError as e:
+        print(f"❌ 截断策略无效 - {e}")
+        return 1
     
-    success = build_dict_trie(dict_name, percentage, max_words)
+    success = build_dict_trie(dict_name, percentage, max_words, policy)
     return 0 if success else 1
 
 if __name__ == "__main__":
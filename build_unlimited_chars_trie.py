@@ -3,17 +3,29 @@
 
 import struct
 import os
-from typing import List, Tuple, Dict
+import sys
+from typing import List, Optional, Tuple, Dict
+
+from cap_policy import CoveragePolicy, coverage_cap, parse_policy
+from dict_parser import RimeDictParser
+from pinyin_alias import canonical_key
+
+try:
+    import numpy as np
+    from columnar_build import ColumnarTable, write_table_v3
+    from parse_cache import load_parsed_columns
+except ImportError:  # 未安装numpy时使用逐词条字典构建，也不使用解析缓存
+    ColumnarTable = None
 
 def remove_tone_marks(pinyin: str) -> str:
-    """去除拼音中的声调符号"""
+    """去除拼音中的声调符号，ü 的各种写法统一为规范写法（见 pinyin_alias）"""
     tone_map = {
         'ā': 'a', 'á': 'a', 'ǎ': 'a', 'à': 'a',
         'ē': 'e', 'é': 'e', 'ě': 'e', 'è': 'e',
         'ī': 'i', 'í': 'i', 'ǐ': 'i', 'ì': 'i',
         'ō': 'o', 'ó': 'o', 'ǒ': 'o', 'ò': 'o',
         'ū': 'u', 'ú': 'u', 'ǔ': 'u', 'ù': 'u',
-        'ǖ': 'ü', 'ǘ': 'ü', 'ǚ': 'ü', 'ǜ': 'ü', 'ü': 'v',
+        'ǖ': 'ü', 'ǘ': 'ü', 'ǚ': 'ü', 'ǜ': 'ü',
         'ń': 'n', 'ň': 'n', 'ǹ': 'n'
     }
     
@@ -21,7 +33,7 @@ def remove_tone_marks(pinyin: str) -> str:
     for char in pinyin:
         result += tone_map.get(char, char)
     
-    return result
+    return canonical_key(result)
 
 def parse_chars_dict_file(file_path: str) -> List[Tuple[str, str, int]]:
     """解析chars词典文件，返回(词语, 拼音, 词频)的列表"""
@@ -31,39 +43,16 @@ def parse_chars_dict_file(file_path: str) -> List[Tuple[str, str, int]]:
     print(f"正在解析chars词典文件: {file_path}")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            line_count = 0
-            for line in f:
-                line_count += 1
-                if line_count % 50000 == 0:
-                    print(f"已处理 {line_count} 行...")
-                
-                line = line.strip()
-                if not line:
+        with RimeDictParser(file_path) as parser:
+            for word, pinyin, frequency in parser.iter_entries(code_transform=remove_tone_marks):
+                # 过滤掉拼音为"无"的词条以及空拼音
+                if pinyin == "无" or not pinyin:
+                    filtered_count += 1
                     continue
-                
-                parts = line.split('\t')
-                if len(parts) >= 3:
-                    word = parts[0].strip()
-                    pinyin = parts[1].strip()
-                    
-                    # 过滤掉拼音为"无"的词条
-                    if pinyin == "无":
-                        filtered_count += 1
-                        continue
-                    
-                    # 过滤掉空拼音或无效拼音
-                    if not pinyin or len(pinyin.strip()) == 0:
-                        filtered_count += 1
-                        continue
-                    
-                    try:
-                        frequency = int(parts[2].strip())
-                        pinyin_no_tone = remove_tone_marks(pinyin)
-                        entries.append((word, pinyin_no_tone, frequency))
-                    except ValueError:
-                        filtered_count += 1
-                        continue
+                entries.append((word, pinyin, frequency))
+                if len(entries) % 50000 == 0:
+                    print(f"已处理 {len(entries)} 个词条...")
+            filtered_count += parser.skipped
     
     except Exception as e:
         print(f"错误：解析文件失败 - {e}")
@@ -73,8 +62,23 @@ def parse_chars_dict_file(file_path: str) -> List[Tuple[str, str, int]]:
     print(f"过滤掉 {filtered_count} 个无效词条（拼音为'无'或空）")
     return entries
 
-def build_unlimited_trie_data(entries: List[Tuple[str, str, int]]) -> Dict:
-    """构建无限制的Trie数据结构（不限制每个拼音的词数）"""
+def parse_chars_dict_table(file_path: str) -> Optional['ColumnarTable']:
+    """列式引擎的解析：读取（或生成）解析缓存，在数组上过滤拼音为"无"的词条，词条与 parse_chars_dict_file 相同"""
+    print(f"正在解析chars词典文件: {file_path}")
+    try:
+        columns = load_parsed_columns(file_path, remove_tone_marks)
+    except Exception as e:
+        print(f"错误：解析文件失败 - {e}")
+        return None
+    invalid = [key_id for key_id, key in enumerate(columns.keys) if key == "无"]
+    selection = np.flatnonzero(~np.isin(columns.key_ids, invalid))
+    filtered_count = len(columns) - len(selection) + columns.meta['empty'] + columns.meta['skipped']
+    print(f"解析完成，共获得 {len(selection)} 个有效词条")
+    print(f"过滤掉 {filtered_count} 个无效词条（拼音为'无'或空）")
+    return ColumnarTable.from_columns(columns, selection)
+
+def build_unlimited_trie_data(entries: List[Tuple[str, str, int]], policy: Optional[CoveragePolicy] = None) -> Dict:
+    """构建无限制的Trie数据结构（不限制每个拼音的词数）；给出覆盖率策略时按词频覆盖率自适应截断"""
     print("正在构建无限制Trie数据...")
     
     trie_data = {}
@@ -99,9 +103,13 @@ def build_unlimited_trie_data(entries: List[Tuple[str, str, int]]) -> Dict:
     total_words = 0
     for pinyin in trie_data:
         trie_data[pinyin].sort(key=lambda x: x['frequency'], reverse=True)
+        if policy is not None:
+            trie_data[pinyin] = trie_data[pinyin][:coverage_cap([item['frequency'] for item in trie_data[pinyin]], policy)]
         total_words += len(trie_data[pinyin])
     
     print(f"无限制Trie构建完成！包含 {len(trie_data)} 个拼音条目，总词数: {total_words}")
+    if policy is not None:
+        print(f"按{policy.describe()}截断：保留 {total_words} 个，删除 {len(entries) - total_words} 个")
     return trie_data
 
 def save_trie_data_file(trie_data: Dict, output_path: str) -> bool:
@@ -223,24 +231,49 @@ def main():
     print("=" * 60)
     print(f"输入文件: {input_path}")
     print(f"输出文件: {output_path}")
-    print("=" * 60)
-    
-    # 解析词典文件
-    entries = parse_chars_dict_file(input_path)
-    if not entries:
-        print("❌ 解析词典文件失败")
-        return 1
-    
-    # 构建Trie数据
-    trie_data = build_unlimited_trie_data(entries)
-    if not trie_data:
-        print("❌ 构建Trie数据失败")
+    try:
+        # 可选参数：[词频覆盖率] [每拼音最少词数] [每拼音最多词数]，不给出时不截断
+        policy = parse_policy(*(sys.argv[1:4]))
+    except ValueError as e:
+        print(f"❌ 截断策略无效 - {e}")
         return 1
+    if policy is not None:
+        print(f"自适应截断: {policy.describe()}")
+    print("=" * 60)
     
-    # 保存文件
-    if not save_trie_data_file(trie_data, output_path):
-        print("❌ 保存文件失败")
-        return 1
+    if ColumnarTable is not None:
+        # 列式引擎：解析结果来自缓存，分组、排序和写出都在数组上完成（不限制每个拼音的词数）
+        table = parse_chars_dict_table(input_path)
+        if table is None or not len(table):
+            print("❌ 解析词典文件失败")
+            return 1
+        print("正在使用列式引擎构建并保存Trie数据...")
+        try:
+            key_count, word_count, file_size = write_table_v3(table, output_path, policy=policy)
+        except Exception as e:
+            print(f"❌ 列式构建失败 - {e}")
+            return 1
+        print(f"无限制Trie构建完成！包含 {key_count} 个拼音条目，总词数: {word_count}")
+        if policy is not None:
+            print(f"按{policy.describe()}截断：保留 {word_count} 个，删除 {len(table) - word_count} 个")
+        print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024/1024:.2f} MB)")
+    else:
+        # 解析词典文件
+        entries = parse_chars_dict_file(input_path)
+        if not entries:
+            print("❌ 解析词典文件失败")
+            return 1
+        
+        # 构建Trie数据
+        trie_data = build_unlimited_trie_data(entries, policy)
+        if not trie_data:
+            print("❌ 构建Trie数据失败")
+            return 1
+        
+        # 保存文件
+        if not save_trie_data_file(trie_data, output_path):
+            print("❌ 保存文件失败")
+            return 1
     
     # 验证文件
     if not verify_trie_data_file(output_path):
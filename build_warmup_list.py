@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 快速预热查询表构建工具
+Trie状态良好时TrieManager只执行"快速预热"，但预热什么一直没有依据。
+本工具为每个词典（TrieType）选出预期查询次数最多的前N个查询串（拼音前缀或完整拼音），
+预先计算它们的第一页候选，写成一个小的二进制资源：
+    - 预热时只触碰这些查询实际用到的版本3词条（附带词条偏移，可按页预读）
+    - 完整加载结束前，首次按键的结果可直接从本文件返回
+
+预期查询次数的来源：
+    model    词频模型（默认）：每个拼音键按其候选词频总量抽样，逐键输入时经过它的每个前缀，
+             前缀的预期次数 = 以它开头的全部拼音键的权重之和（与 simulate_keystrokes.py 生成会话的抽样一致）
+    session  打字日志：simulate_keystrokes.py 的会话文件，逐键展开后统计每个输入缓冲区（规范化后）出现的次数
+
+查询语义与 trie_reader 的 search_prefix 一致（去空格连写拼音的前缀查询）。
+
+文件分段（通用容器格式）：
+    META  JSON：来源、每页候选数、各词典的查询区间 [start, end) 和词条偏移区间
+    WQRY  字符串池，查询串；每个词典一段，段内按预期次数降序（即预热顺序）
+    WQWT  f32[查询数]，查询在本词典预期查询总量中的占比
+    WSRT  u32[查询数]，每个词典段内按查询串字节序排序的下标，用于二分查找
+    WRIX  u32[查询数+1]，每个查询的第一页在RWRD/RFRQ中的区间
+    WPOL  字符串池，结果中出现的词语（按UTF-8字节排序）
+    RWRD  u32[]，词语ID
+    RFRQ  i32[]，词频
+    WOFS  u32[]，第一页候选来源词条在版本3文件中的字节偏移，每个词典一段，段内升序
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from build_merged_trie import TRIE_TYPES
+from simulate_keystrokes import key_weights, keystroke_buffers, load_session
+from trie_format import (
+    MappedFile, StringPool, lower_bound, pack_array, pack_json, pack_string_pool,
+    read_container, trie_asset_path, unpack_json, write_container,
+)
+from trie_reader import V3MappedReader, normalize_pinyin
+
+DEFAULT_TOP_N = 200
+DEFAULT_PAGE_SIZE = 10
+DEFAULT_OUTPUT = "app/src/main/assets/trie/warmup.dat"
+
+WordList = List[Tuple[str, int]]
+
+
+# ==================== 预期查询次数 ====================
+
+def model_query_weights(name: str) -> Counter:
+    """词频模型：每个前缀的预期次数为以它开头的拼音键权重之和"""
+    keys, weights = key_weights([name])
+    counts: Counter = Counter()
+    for key, weight in zip(keys, weights):
+        normalized = normalize_pinyin(key)
+        for length in range(1, len(normalized) + 1):
+            counts[normalized[:length]] += weight
+    return counts
+
+
+def session_query_weights(session: List[str]) -> Counter:
+    """打字日志：每次按键后的输入缓冲区计一次查询；按规范形式计数（lv 与 lü 是同一个查询），
+    与 WarmupList.first_page 查表时的规范化一致"""
+    counts: Counter = Counter()
+    for line in session:
+        counts.update(normalized for normalized in map(normalize_pinyin, keystroke_buffers(line)) if normalized)
+    return counts
+
+
+# ==================== 选取与预计算 ====================
+
+def contributing_offsets(reader: V3MappedReader, query: str, page: WordList) -> List[int]:
+    """第一页候选实际来自的词条偏移：键区间内候选与第一页有交集的拼音键"""
+    wanted = set(page)
+    start, end = reader.key_range(query)
+    return [reader.entry_offset(i) for i in range(start, end)
+            if wanted.intersection(reader.candidates(i, len(page)))]
+
+
+def select_queries(reader: V3MappedReader, counts: Counter, top_n: int, page_size: int) -> List[Tuple[str, float, WordList]]:
+    """按预期次数降序取前top_n个有结果的查询，返回 (查询串, 占比, 第一页)"""
+    total = sum(counts.values())
+    selected = []
+    for query, count in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
+        page = reader.search_prefix(query, page_size)
+        if page:
+            selected.append((query, count / max(total, 1), page))
+            if len(selected) >= top_n:
+                break
+    return selected
+
+
+def build_sections(plans: List[Dict], source: str, page_size: int) -> List[Tuple[str, bytes]]:
+    """plans: 每个词典 {'name', 'queries': [(查询串, 占比, 第一页)], 'offsets': [词条偏移]}"""
+    pool = sorted({word for plan in plans for _, _, page in plan['queries'] for word, _ in page},
+                  key=lambda w: w.encode('utf-8'))
+    word_ids = {word: i for i, word in enumerate(pool)}
+
+    queries, shares, order, result_index = [], [], [], [0]
+    result_words, result_freqs, entry_offsets = [], [], []
+    dicts = []
+    for plan in plans:
+        start = len(queries)
+        for query, share, page in plan['queries']:
+            queries.append(query)
+            shares.append(share)
+            for word, frequency in page:
+                result_words.append(word_ids[word])
+                result_freqs.append(frequency)
+            result_index.append(len(result_words))
+        order += sorted(range(start, len(queries)), key=lambda i: queries[i].encode('utf-8'))
+        offsets_start = len(entry_offsets)
+        entry_offsets += plan['offsets']
+        dicts.append({
+            'name': plan['name'],
+            'start': start,
+            'end': len(queries),
+            'offsets_start': offsets_start,
+            'offsets_end': len(entry_offsets),
+            'covered': round(sum(share for _, share, _ in plan['queries']), 6),
+        })
+
+    meta = {'format': 'warmup', 'source': source, 'page_size': page_size, 'dicts': dicts}
+    return [
+        ('META', pack_json(meta)),
+        ('WQRY', pack_string_pool(queries)),
+        ('WQWT', pack_array('f', shares)),
+        ('WSRT', pack_array('I', order)),
+        ('WRIX', pack_array('I', result_index)),
+        ('WPOL', pack_string_pool(pool)),
+        ('RWRD', pack_array('I', result_words)),
+        ('RFRQ', pack_array('i', result_freqs)),
+        ('WOFS', pack_array('I', entry_offsets)),
+    ]
+
+
+# ==================== 读取 ====================
+
+class WarmupList:
+    """预热查询表读取器：内存映射，按词典给出预热顺序和第一页候选"""
+
+    def __init__(self, path: str):
+        start = time.perf_counter()
+        self._file = MappedFile(path)
+        sections = read_container(self._file.buffer)
+        self.meta = unpack_json(sections['META'])
+        self.dicts = {info['name']: info for info in self.meta['dicts']}
+        self.queries = StringPool(sections['WQRY'])
+        self.shares = sections['WQWT'].cast('f')
+        self.order = sections['WSRT'].cast('I')
+        self.result_index = sections['WRIX'].cast('I')
+        self.pool = StringPool(sections['WPOL'])
+        self.result_words = sections['RWRD'].cast('I')
+        self.result_freqs = sections['RFRQ'].cast('i')
+        self.entry_offsets = sections['WOFS'].cast('I')
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def close(self):
+        self._file.close()
+
+    def warm_queries(self, name: str) -> List[str]:
+        """按预热顺序（预期次数降序）返回词典的查询串"""
+        info = self.dicts.get(name)
+        return [self.queries[i] for i in range(info['start'], info['end'])] if info else []
+
+    def warm_offsets(self, name: str) -> List[int]:
+        """预热需要触碰的版本3词条偏移（升序）"""
+        info = self.dicts.get(name)
+        return list(self.entry_offsets[info['offsets_start']:info['offsets_end']]) if info else []
+
+    def first_page(self, name: str, query: str) -> Optional[WordList]:
+        """预计算的第一页候选；不在预热表中时返回None，需走完整查询"""
+        info = self.dicts.get(name)
+        if info is None:
+            return None
+        target = normalize_pinyin(query).encode('utf-8')
+        start, end = info['start'], info['end']
+        pos = start + lower_bound(end - start, lambda i: self.queries.raw(self.order[start + i]) < target)
+        if pos >= end or self.queries.raw(self.order[pos]) != target:
+            return None
+        index = self.order[pos]
+        return [(self.pool[self.result_words[r]], self.result_freqs[r])
+                for r in range(self.result_index[index], self.result_index[index + 1])]
+
+
+# ==================== 验证 ====================
+
+def verify_warmup_file(file_path: str) -> bool:
+    """逐条核对第一页与版本3文件的前缀查询一致，并统计覆盖的预期查询量和需要触碰的页数"""
+    print(f"\n正在验证预热查询表: {file_path}")
+    try:
+        warmup = WarmupList(file_path)
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+
+    try:
+        page_size = warmup.meta['page_size']
+        for name, info in warmup.dicts.items():
+            reader = V3MappedReader(trie_asset_path(name))
+            try:
+                queries = warmup.warm_queries(name)
+                for query in queries:
+                    if warmup.first_page(name, query) != reader.search_prefix(query, page_size):
+                        print(f"错误：{name} 查询 '{query}' 的第一页与词典文件不一致")
+                        return False
+                if warmup.first_page(name, 'zzzzzzzz') is not None:
+                    print(f"错误：{name} 不在表中的查询返回了结果")
+                    return False
+
+                start = time.perf_counter()
+                for query in queries:
+                    warmup.first_page(name, query)
+                served_us = (time.perf_counter() - start) * 1e6 / max(len(queries), 1)
+                pages = len({offset // 4096 for offset in warmup.warm_offsets(name)})
+                print(f"  {name}: {len(queries)} 个查询，覆盖预期查询量 {info['covered']:.1%}，"
+                      f"触碰词条 {info['offsets_end'] - info['offsets_start']} 个（{pages} 个4KB页）；"
+                      f"查表 {served_us:.1f} us，版本3文件建立索引 {reader.load_ms:.1f} ms")
+            finally:
+                reader.close()
+        print(f"验证成功！预热表打开耗时 {warmup.load_ms:.2f} ms")
+        return True
+    finally:
+        warmup.close()
+
+
+# ==================== 命令行 ====================
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生成快速预热用的高频查询表及其第一页候选")
+    parser.add_argument('--dicts', default=','.join(TRIE_TYPES), help="词典，逗号分隔（不存在的词典跳过）")
+    parser.add_argument('--session', help="打字日志（simulate_keystrokes.py 会话文件），不指定时使用词频模型")
+    parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N, help="每个词典的查询数")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help="第一页候选数")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="输出文件路径")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+    if args.top_n < 1 or args.page_size < 1:
+        print("❌ --top-n 和 --page-size 至少为1")
+        return 1
+
+    session_counts = None
+    source = 'model'
+    if args.session:
+        session = load_session(args.session)
+        if not session:
+            print(f"❌ 会话文件为空: {args.session}")
+            return 1
+        session_counts = session_query_weights(session)
+        source = f"session:{os.path.basename(args.session)}"
+
+    print("=" * 60)
+    print("神迹输入法 - 快速预热查询表构建工具")
+    print("=" * 60)
+    print(f"词典: {', '.join(names)}")
+    print(f"查询来源: {source}，每个词典前 {args.top_n} 个查询，每页 {args.page_size} 个候选")
+    print("=" * 60)
+
+    plans = []
+    for name in names:
+        path = trie_asset_path(name)
+        if not os.path.exists(path):
+            print(f"⚠️ 词典不存在，跳过: {name}")
+            continue
+        counts = session_counts if session_counts is not None else model_query_weights(name)
+        reader = V3MappedReader(path)
+        try:
+            queries = select_queries(reader, counts, args.top_n, args.page_size)
+            offsets = sorted({offset for query, _, page in queries
+                              for offset in contributing_offsets(reader, query, page)})
+        finally:
+            reader.close()
+        covered = sum(share for _, share, _ in queries)
+        print(f"{name}: 选出 {len(queries)} 个查询，覆盖预期查询量 {covered:.1%}，"
+              f"前5个: {', '.join(q for q, _, _ in queries[:5])}")
+        plans.append({'name': name, 'queries': queries, 'offsets': offsets})
+
+    if not plans:
+        print("❌ 没有可用的词典文件")
+        return 1
+
+    print(f"\n正在保存预热查询表到文件: {args.output}")
+    try:
+        file_size = write_container(args.output, build_sections(plans, source, args.page_size))
+    except Exception as e:
+        print(f"错误：保存文件失败 - {e}")
+        return 1
+    print(f"文件保存成功！文件大小: {file_size} 字节 ({file_size/1024:.1f} KB)")
+
+    if not verify_warmup_file(args.output):
+        print("❌ 预热查询表验证失败")
+        return 1
+
+    print("=" * 60)
+    print("✅ 预热查询表构建成功！")
+    print(f"📁 输出文件: {args.output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
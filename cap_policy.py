@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 按词频覆盖率的每拼音自适应截断
+固定的每拼音最大词数对 yi、ji、xi 这类有数百个单字的拼音太宽松，对只有几个词的拼音又没有意义。
+覆盖率策略：每个拼音按词频降序，保留累计词频首次达到该拼音总词频 coverage 比例的最短前缀，
+再限制在 [floor, ceiling] 之间。长尾几乎不占词频的大拼音被截短，小拼音全部保留。
+
+列式引擎（columnar_build.py）中的向量化实现与这里的逐拼音计算结果一致。
+"""
+
+from typing import NamedTuple, Optional, Sequence
+
+DEFAULT_COVERAGE = 0.95
+DEFAULT_FLOOR = 5
+
+
+class CoveragePolicy(NamedTuple):
+    coverage: float = DEFAULT_COVERAGE
+    floor: int = DEFAULT_FLOOR
+    ceiling: Optional[int] = None
+
+    def describe(self) -> str:
+        ceiling = '不限' if self.ceiling is None else str(self.ceiling)
+        return f"词频覆盖率{self.coverage:.0%}，下限{self.floor}，上限{ceiling}"
+
+
+def coverage_cap(frequencies: Sequence[int], policy: CoveragePolicy) -> int:
+    """按词频降序的候选应保留的个数；负词频按0计入总量"""
+    target = policy.coverage * sum(max(f, 0) for f in frequencies)
+    keep = 0
+    cumulative = 0
+    for frequency in frequencies:
+        if cumulative >= target:
+            break
+        cumulative += max(frequency, 0)
+        keep += 1
+    keep = max(keep, min(policy.floor, len(frequencies)))
+    if policy.ceiling is not None:
+        keep = min(keep, policy.ceiling)
+    return keep
+
+
+def parse_policy(coverage: Optional[str] = None, floor: Optional[str] = None,
+                 ceiling: Optional[str] = None) -> Optional[CoveragePolicy]:
+    """从命令行参数解析策略，未给出覆盖率时返回None（保持原有的截断方式）"""
+    if coverage is None:
+        return None
+    policy = CoveragePolicy(
+        coverage=float(coverage),
+        floor=int(floor) if floor is not None else DEFAULT_FLOOR,
+        ceiling=int(ceiling) if ceiling not in (None, '', '0') else None,
+    )
+    if not 0 < policy.coverage <= 1:
+        raise ValueError("覆盖率应在 (0, 1] 之间")
+    if policy.floor < 0 or (policy.ceiling is not None and policy.ceiling < max(policy.floor, 1)):
+        raise ValueError("下限不能为负，上限不能小于下限")
+    return policy
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 列式构建引擎（NumPy）
+替代“每个词条一个 {'word','frequency'} 字典 + 每个拼音单独排序”的构建方式：
+1. 拼音键驻留为整数id（按首次出现顺序编号，与原先dict插入顺序一致）
+2. 词频存为int32数组，词语存为一个UTF-8字节缓冲区加偏移数组
+3. 用lexsort按 (键, -词频) 稳定排序，按段计算名次完成每键top-K截断
+4. 直接从数组分块写出版本3文件，结果与原先逐字典构建的文件逐字节一致
+
+用法:
+    table = ColumnarTable.from_entries(entries)
+    order, counts = table.group_top_k(max_per_key=40)
+    table.write_v3(output_path, order, counts)
+"""
+
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from cap_policy import CoveragePolicy
+
+# 分块写出时每块的目标字节数
+WRITE_CHUNK_BYTES = 1024 * 1024
+
+
+def clean_pinyin(pinyin: str) -> str:
+    """与各构建工具一致：转小写并合并多余空格"""
+    return ' '.join(pinyin.lower().split())
+
+
+def exclusive_cumsum(values: np.ndarray) -> np.ndarray:
+    result = np.zeros(len(values), dtype=np.int64)
+    if len(values) > 1:
+        np.cumsum(values[:-1], out=result[1:])
+    return result
+
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """把字符串列表编码为一个UTF-8缓冲区，返回 (uint8缓冲区, 长度为n+1的起始偏移)
+
+    一次性以换行连接后编码，再用换行位置切分（词典字段按行解析，不含换行）。
+    """
+    if not strings:
+        return np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64)
+    joined = np.frombuffer(('\n'.join(strings) + '\n').encode('utf-8'), dtype=np.uint8)
+    ends = np.flatnonzero(joined == 0x0A)
+    if len(ends) != len(strings):
+        raise ValueError("字符串中包含换行符，无法打包")
+    offsets = np.empty(len(strings) + 1, dtype=np.int64)
+    offsets[0] = 0
+    offsets[1:] = ends + 1
+    return joined, offsets
+
+
+def scatter_bytes(out: np.ndarray, dst_starts: np.ndarray, src: np.ndarray,
+                  src_starts: np.ndarray, lengths: np.ndarray):
+    """把 src[src_starts[i]:+lengths[i]] 复制到 out[dst_starts[i]:]（向量化，无逐项循环）"""
+    total = int(lengths.sum())
+    if total == 0:
+        return
+    within = np.arange(total, dtype=np.int64) - np.repeat(exclusive_cumsum(lengths), lengths)
+    out[np.repeat(dst_starts, lengths) + within] = src[np.repeat(src_starts, lengths) + within]
+
+
+def scatter_int32(out: np.ndarray, positions: np.ndarray, values: np.ndarray):
+    """在任意（非对齐）位置写入小端int32"""
+    if len(positions) == 0:
+        return
+    raw = np.ascontiguousarray(values, dtype='<i4').view(np.uint8).reshape(-1, 4)
+    out[positions[:, None] + np.arange(4)] = raw
+
+
+class ColumnarTable:
+    """列式词条表"""
+
+    def __init__(self, keys: List[str], key_ids: np.ndarray, frequencies: np.ndarray,
+                 word_buffer: np.ndarray, word_offsets: np.ndarray):
+        self.keys = keys
+        self.key_ids = key_ids
+        self.frequencies = frequencies
+        self.word_buffer = word_buffer
+        self.word_offsets = word_offsets
+        self.key_buffer, self.key_offsets = pack_strings(keys)
+
+    def __len__(self) -> int:
+        return len(self.key_ids)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[str, str, int]]) -> 'ColumnarTable':
+        """从 (词语, 拼音, 词频) 序列构建；拼音按原始字符串缓存清理结果，每个不同拼音只清理一次"""
+        raw_ids: Dict[str, int] = {}
+        clean_ids: Dict[str, int] = {}
+        keys: List[str] = []
+        words: List[str] = []
+        key_ids = array('i')
+        frequencies = array('q')
+
+        for word, pinyin, frequency in entries:
+            key_id = raw_ids.get(pinyin)
+            if key_id is None:
+                key = clean_pinyin(pinyin)
+                key_id = clean_ids.get(key)
+                if key_id is None:
+                    key_id = clean_ids[key] = len(keys)
+                    keys.append(key)
+                raw_ids[pinyin] = key_id
+            key_ids.append(key_id)
+            words.append(word)
+            frequencies.append(frequency)
+
+        freq_array = np.frombuffer(frequencies, dtype=np.int64)
+        if len(freq_array) and (freq_array.min() < -2 ** 31 or freq_array.max() >= 2 ** 31):
+            raise ValueError("词频超出int32范围")
+        word_buffer, word_offsets = pack_strings(words)
+        return cls(keys, np.frombuffer(key_ids, dtype=np.int32).copy(), freq_array.astype(np.int32),
+                   word_buffer, word_offsets)
+
+    @classmethod
+    def from_columns(cls, columns, selection: np.ndarray) -> 'ColumnarTable':
+        """从解析缓存的列（parse_cache.ParsedColumns）构建，selection为保留词条的下标，按构建顺序排列
+
+        与把同样的词条按同样顺序交给 from_entries 的结果一致：原始拼音清理后可能合并，
+        键id按清理后的拼音在selection中首次出现的顺序编号。
+        """
+        clean_ids: Dict[str, int] = {}
+        cleaned: List[str] = []
+        raw_to_clean = np.empty(len(columns.keys), dtype=np.int64)
+        for raw_id, raw in enumerate(columns.keys):
+            key = clean_pinyin(raw)
+            key_id = clean_ids.get(key)
+            if key_id is None:
+                key_id = clean_ids[key] = len(cleaned)
+                cleaned.append(key)
+            raw_to_clean[raw_id] = key_id
+
+        entry_keys = raw_to_clean[np.asarray(columns.key_ids)[selection]]
+        unique, first = np.unique(entry_keys, return_index=True)
+        by_first = unique[np.argsort(first)]
+        remap = np.zeros(len(cleaned), dtype=np.int32)
+        remap[by_first] = np.arange(len(by_first), dtype=np.int32)
+
+        frequencies = np.asarray(columns.frequencies)[selection]
+        if len(frequencies) and (frequencies.min() < -2 ** 31 or frequencies.max() >= 2 ** 31):
+            raise ValueError("词频超出int32范围")
+
+        # 词语连同结尾的换行一起复制，保持 pack_strings 的布局
+        offsets = np.asarray(columns.word_offsets)
+        lengths = np.diff(offsets)[selection]
+        word_offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        word_buffer = np.empty(int(word_offsets[-1]), dtype=np.uint8)
+        scatter_bytes(word_buffer, word_offsets[:-1], np.asarray(columns.word_buffer), offsets[:-1][selection], lengths)
+        return cls([cleaned[i] for i in by_first.tolist()], remap[entry_keys], frequencies.astype(np.int32),
+                   word_buffer, word_offsets)
+
+    def word(self, index: int) -> str:
+        return bytes(self.word_buffer[self.word_offsets[index]:self.word_offsets[index + 1] - 1]).decode('utf-8')
+
+    def group_top_k(self, max_per_key: Optional[int] = None,
+                    policy: Optional[CoveragePolicy] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """按 (键id, -词频) 稳定排序并做每键top-K，可再按词频覆盖率自适应截断
+
+        返回 (保留词条的下标数组，按键id、词频降序、原始顺序排列；每个键保留的词条数)。
+        """
+        order = np.lexsort((-self.frequencies.astype(np.int64), self.key_ids))
+        sorted_keys = self.key_ids[order]
+        counts = np.bincount(sorted_keys, minlength=len(self.keys)).astype(np.int64)
+        if max_per_key is None and policy is None:
+            return order, counts
+
+        # 段内名次 = 位置 - 段起点
+        rank = np.arange(len(order), dtype=np.int64) - exclusive_cumsum(counts)[sorted_keys]
+        keep = np.ones(len(order), dtype=bool)
+        if max_per_key is not None:
+            keep &= rank < max_per_key
+        if policy is not None:
+            # 与 cap_policy.coverage_cap 相同：保留“之前的累计词频尚未达到目标”的词条，再套用上下限
+            mass = np.maximum(self.frequencies[order].astype(np.int64), 0)
+            running = np.cumsum(mass)
+            first = (exclusive_cumsum(counts))[sorted_keys]
+            last = first + counts[sorted_keys] - 1
+            base = running[first] - mass[first]
+            before = running - mass - base
+            totals = running[last] - base
+            covered = (before < policy.coverage * totals) | (rank < policy.floor)
+            if policy.ceiling is not None:
+                covered &= rank < policy.ceiling
+            keep &= covered
+        order = order[keep]
+        counts = np.bincount(sorted_keys[keep], minlength=len(self.keys)).astype(np.int64)
+        return order, counts
+
+    def write_v3(self, output_path: str, order: np.ndarray, counts: np.ndarray) -> int:
+        """直接从数组写出版本3文件，按键分块组装，返回文件大小"""
+        key_lengths = np.diff(self.key_offsets) - 1
+        word_lengths = (np.diff(self.word_offsets) - 1)[order]
+        word_starts = self.word_offsets[:-1][order]
+        frequencies = self.frequencies[order]
+        entry_keys = self.key_ids[order]
+
+        # 每个键的记录：键长度 + 键 + 词数；每个词的记录：词长度 + 词 + 词频
+        word_sizes = word_lengths + 8
+        key_word_bytes = np.bincount(entry_keys, weights=word_sizes, minlength=len(self.keys)).astype(np.int64)
+        key_sizes = key_lengths + 8 + key_word_bytes
+        key_starts = 8 + exclusive_cumsum(key_sizes)
+        entry_starts_in_key = exclusive_cumsum(word_sizes) - exclusive_cumsum(key_word_bytes)[entry_keys]
+        entry_starts = key_starts[entry_keys] + key_lengths[entry_keys] + 8 + entry_starts_in_key
+        del word_sizes, entry_starts_in_key, entry_keys
+        entry_bounds = np.concatenate(([0], np.cumsum(counts)))
+
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'wb') as f:
+            header = np.array([3, len(self.keys)], dtype='<i4')
+            f.write(header.tobytes())
+
+            first = 0
+            while first < len(self.keys):
+                # 以目标字节数确定本块包含的键 [first, last)
+                limit = key_starts[first] + WRITE_CHUNK_BYTES
+                last = max(first + 1, int(np.searchsorted(key_starts, limit, side='right')) - 1)
+                last = min(last, len(self.keys))
+                base = key_starts[first]
+                size = int(key_starts[last - 1] + key_sizes[last - 1] - base)
+                out = np.empty(size, dtype=np.uint8)
+
+                rel = key_starts[first:last] - base
+                scatter_int32(out, rel, key_lengths[first:last])
+                scatter_bytes(out, rel + 4, self.key_buffer, self.key_offsets[first:last], key_lengths[first:last])
+                scatter_int32(out, rel + 4 + key_lengths[first:last], counts[first:last])
+
+                e0, e1 = entry_bounds[first], entry_bounds[last]
+                erel = entry_starts[e0:e1] - base
+                scatter_int32(out, erel, word_lengths[e0:e1])
+                scatter_bytes(out, erel + 4, self.word_buffer, word_starts[e0:e1], word_lengths[e0:e1])
+                scatter_int32(out, erel + 4 + word_lengths[e0:e1], frequencies[e0:e1])
+
+                f.write(out.tobytes())
+                first = last
+        return os.path.getsize(output_path)
+
+
+def write_table_v3(table: ColumnarTable, output_path: str,
+                   max_per_key: Optional[int] = None,
+                   policy: Optional[CoveragePolicy] = None) -> Tuple[int, int, int]:
+    """截断并写出版本3文件，返回 (拼音条目数, 总词数, 文件大小)"""
+    order, counts = table.group_top_k(max_per_key, policy)
+    size = table.write_v3(output_path, order, counts)
+    return len(table.keys), len(order), size
+
+
+def build_v3_file(entries: Iterable[Tuple[str, str, int]], output_path: str,
+                  max_per_key: Optional[int] = None,
+                  policy: Optional[CoveragePolicy] = None) -> Tuple[int, int, int]:
+    """列式构建并写出版本3文件，返回 (拼音条目数, 总词数, 文件大小)"""
+    return write_table_v3(ColumnarTable.from_entries(entries), output_path, max_per_key, policy)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - Rime词典(.dict.yaml)字节级解析器
+1. 内存映射源文件，按块切分行，不逐行解码
+2. 正确跳过YAML头部（--- 到 ...），读取 columns、use_preset_vocabulary 等声明（columns 可为块列表或 [a, b] 行内列表）
+3. 按头部声明的列顺序定位字段，未声明时使用Rime默认的 text/code/weight
+4. 只解码需要保留的字段，拼音转换按原始字节缓存，同一拼音只处理一次
+
+用法:
+    parser = RimeDictParser(path)
+    for word, pinyin, weight in parser.iter_entries(code_transform=remove_tone_marks):
+        ...
+    for batch in parser.iter_batches(batch_size=65536):
+        batch['text'], batch['code'], batch['weight']
+
+    python3 dict_parser.py    # 用内置样例检查头部与列顺序的解析
+"""
+
+import mmap
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_COLUMNS = ['text', 'code', 'weight']
+DEFAULT_FIELDS = ('text', 'code', 'weight')
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def parse_flow_list(value: str) -> List[str]:
+    """解析行内列表 [a, b, c]，去掉各项的引号"""
+    items = [item.strip().strip('"\'') for item in value[1:-1].split(',')]
+    return [item for item in items if item]
+
+
+def strip_comment(line: str) -> str:
+    """去掉行尾注释：只有位于行首或空白之后、且不在引号内的 # 才开始注释；
+    引号只在值的开头（行首、空白、冒号、[ 或逗号之后）才算作引号，it's 这类值中的撇号不影响注释判断"""
+    quote = None
+    for i, char in enumerate(line):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'' and (i == 0 or line[i - 1] in ' \t:[,'):
+            quote = char
+        elif char == '#' and (i == 0 or line[i - 1].isspace()):
+            return line[:i]
+    return line
+
+
+def parse_header(lines: List[str]) -> Dict:
+    """解析Rime YAML头部中与解析相关的声明（只处理扁平键、块列表和行内列表）"""
+    header: Dict = {}
+    current_list: Optional[str] = None
+    for line in lines:
+        stripped = strip_comment(line).rstrip()
+        if not stripped:
+            continue
+        if current_list and stripped.lstrip().startswith('- '):
+            header[current_list].append(stripped.lstrip()[2:].strip().strip('"\''))
+            continue
+        current_list = None
+        if ':' not in stripped or stripped.startswith(' '):
+            continue
+        key, value = stripped.split(':', 1)
+        key, value = key.strip(), value.strip()
+        if value.startswith('[') and value.endswith(']'):
+            header[key] = parse_flow_list(value)
+        elif value:
+            header[key] = value.strip('"\'')
+        else:
+            header[key] = []
+            current_list = key
+
+    if 'use_preset_vocabulary' in header:
+        header['use_preset_vocabulary'] = str(header['use_preset_vocabulary']).lower() == 'true'
+    return header
+
+
+class RimeDictParser:
+    """Rime词典字节级解析器"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        size = self._file.seek(0, 2)
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.header, self.body_offset = self._read_header()
+        columns = self.header.get('columns') or DEFAULT_COLUMNS
+        self.columns: List[str] = [columns] if isinstance(columns, str) else list(columns)
+        self.lines = 0
+        self.skipped = 0
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_header(self) -> Tuple[Dict, int]:
+        """定位YAML头部；没有 --- 开头的头部时从文件开头解析词条"""
+        buf = self._buffer
+        pos = 0
+        header_lines: List[str] = []
+        in_header = False
+        while pos < len(buf):
+            end = buf.find(b'\n', pos)
+            if end < 0:
+                end = len(buf)
+            line = buf[pos:end].rstrip(b'\r')
+            next_pos = end + 1
+            if not in_header:
+                if line.strip() == b'---':
+                    in_header = True
+                elif line and not line.startswith(b'#'):
+                    # 第一行有效内容不是头部标记，说明没有头部
+                    return {}, pos
+            else:
+                if line.strip() == b'...':
+                    return parse_header(header_lines), next_pos
+                header_lines.append(line.decode('utf-8', 'replace'))
+            pos = next_pos
+        # 头部未闭合：按Rime的处理视为没有词条
+        return parse_header(header_lines), len(buf)
+
+    def _iter_lines(self) -> Iterator[bytes]:
+        """按块读取正文并切分为行，跳过空行和注释"""
+        buf = self._buffer
+        pos = self.body_offset
+        total = len(buf)
+        while pos < total:
+            end = min(pos + CHUNK_SIZE, total)
+            if end < total:
+                newline = buf.rfind(b'\n', pos, end)
+                end = newline + 1 if newline >= pos else buf.find(b'\n', end) + 1 or total
+            for line in buf[pos:end].split(b'\n'):
+                self.lines += 1
+                if not line or line[0] == 0x23 or line.isspace():  # 空行、'#'注释
+                    continue
+                yield line
+            pos = end
+
+    def field_indexes(self, fields: Sequence[str]) -> List[int]:
+        missing = [f for f in fields if f not in self.columns]
+        if missing:
+            raise ValueError(f"词典未声明列: {', '.join(missing)}（已声明: {', '.join(self.columns)}）")
+        return [self.columns.index(f) for f in fields]
+
+    def iter_entries(self, fields: Sequence[str] = DEFAULT_FIELDS,
+                     code_transform: Optional[Callable[[str], str]] = None) -> Iterator[tuple]:
+        """逐条产出所需字段组成的元组；weight解析为整数，缺列或词频无效的行计入skipped"""
+        indexes = self.field_indexes(fields)
+        width = max(indexes) + 1
+        kinds = [f if f in ('code', 'weight') else 'text' for f in fields]
+        code_cache: Dict[bytes, str] = {}
+
+        for line in self._iter_lines():
+            parts = line.split(b'\t')
+            if len(parts) < width:
+                self.skipped += 1
+                continue
+            values = []
+            try:
+                for index, kind in zip(indexes, kinds):
+                    raw = parts[index].strip()
+                    if kind == 'weight':
+                        values.append(int(raw))
+                    elif kind == 'code':
+                        value = code_cache.get(raw)
+                        if value is None:
+                            value = raw.decode('utf-8')
+                            if code_transform is not None:
+                                value = code_transform(value)
+                            code_cache[raw] = value
+                        values.append(value)
+                    else:
+                        values.append(raw.decode('utf-8'))
+            except (ValueError, UnicodeDecodeError):
+                self.skipped += 1
+                continue
+            yield tuple(values)
+
+    def iter_batches(self, fields: Sequence[str] = DEFAULT_FIELDS, batch_size: int = 65536,
+                     code_transform: Optional[Callable[[str], str]] = None) -> Iterator[Dict[str, list]]:
+        """按列批量产出 {字段: 列表}"""
+        batch: Dict[str, list] = {f: [] for f in fields}
+        columns = [batch[f] for f in fields]
+        for entry in self.iter_entries(fields, code_transform):
+            for column, value in zip(columns, entry):
+                column.append(value)
+            if len(columns[0]) >= batch_size:
+                yield batch
+                batch = {f: [] for f in fields}
+                columns = [batch[f] for f in fields]
+        if columns and columns[0]:
+            yield batch
+
+
+# ==================== 自检 ====================
+
+# (说明, 头部, 正文行)：正文均为 北京/bei jing/100 与 中/zhong/90 两条词条
+PARSER_FIXTURES = [
+    ('无头部', None, ['北京\tbei jing\t100', '中\tzhong\t90']),
+    ('默认列', ['name: fixture', 'version: "1.0"'], ['北京\tbei jing\t100', '中\tzhong\t90']),
+    ('块列表', ['name: fixture', 'columns:', '  - text', '  - code', '  - weight'],
+     ['北京\tbei jing\t100', '中\tzhong\t90']),
+    ('行内列表', ['name: fixture', 'columns: [text, code, weight]  # Rime 行内写法'],
+     ['北京\tbei jing\t100', '中\tzhong\t90']),
+    ('行内列表换序', ['columns: ["weight", \'text\', code]', 'use_preset_vocabulary: true'],
+     ['100\t北京\tbei jing', '90\t中\tzhong']),
+    ('引号内的#', ['name: "fixture#1"  # 注释', 'version: \'1.0#beta\'', 'sort: by#weight', "author: it's me  # 注释", 'columns: [text, code, weight] #注释'],
+     ['北京\tbei jing\t100', '中\tzhong\t90']),
+]
+# 需要额外核对的头部声明
+FIXTURE_HEADERS = {'引号内的#': {'name': 'fixture#1', 'version': '1.0#beta', 'sort': 'by#weight', 'author': "it's me"}}
+FIXTURE_ENTRIES = [('北京', 'bei jing', 100), ('中', 'zhong', 90)]
+
+
+def verify_parser() -> bool:
+    """用内置样例检查头部声明与按列解析的结果"""
+    ok = True
+    for label, header, body in PARSER_FIXTURES:
+        lines = (['---'] + header + ['...'] if header is not None else []) + body
+        fd, path = tempfile.mkstemp(suffix='.dict.yaml')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            with RimeDictParser(path) as parser:
+                entries = list(parser.iter_entries())
+                columns = parser.columns
+                header_values = parser.header
+        except ValueError as e:
+            entries, columns, header_values = [], str(e), {}
+        finally:
+            os.remove(path)
+        expected_header = FIXTURE_HEADERS.get(label, {})
+        passed = entries == FIXTURE_ENTRIES and all(header_values.get(k) == v for k, v in expected_header.items())
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {label}: 列 {columns}，{len(entries)} 个词条")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_parser() else 1)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 用户词典合并工具
+把设备上导出的用户词典（用户新词与调整后的词频）合并进预编译的版本3 .dat文件，
+生成个性化词典文件，用于备份恢复时重新生成资源，无需从源文件完整重建。
+
+用户词典格式与Rime词典一致（可带YAML头部）：每行 词语<TAB>拼音<TAB>词频，
+拼音可带声调或空格分隔；词频为负数表示删除该拼音下的这个词。
+
+合并方式：
+1. 用户词条按连写规范形式（trie_reader.normalize_pinyin：去空格、转小写、ü 写法归一，与应用内
+   PinyinTrie的节点一致）分组，lixiao 与 li xiao、lve 与 lüe 属于同一组（数量小，常驻内存）
+2. 扫描一遍基础文件的键，记下每个涉及用户词条的连写形式对应的全部记录
+3. 顺序写出：未涉及的拼音记录按原始字节整段复制，不解码；涉及的连写形式把基础文件中该形式的
+   全部记录（应用里同一节点上的候选）与用户词条合并，按词频降序（同词频保持原顺序）重新排序并
+   应用每拼音上限，写在第一条记录的位置并沿用其拼音写法，其余记录并入后不再单独写出
+4. 基础文件中没有的连写形式按排序追加在末尾，拼音写法取用户词典中的第一种写法
+
+用法:
+    python merge_user_dict.py app/src/main/assets/trie/base_trie.dat user_export.txt
+    python merge_user_dict.py chars_trie.dat user.txt --output chars_user.dat --mode max
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from build_universal_trie import remove_tone_marks
+from dict_parser import RimeDictParser
+from trie_format import V3_VERSION, iter_v3_entries
+from trie_reader import normalize_pinyin
+
+# 与各构建工具一致的每拼音上限：chars不限，base为TrieNode.MAX_WORDS_PER_NODE，其余为build_universal_trie默认值
+DICT_CAPS = {'chars': 0, 'base': 50}
+DEFAULT_CAP = 40
+MODES = ('replace', 'max', 'add')
+
+WordList = List[Tuple[str, int]]
+
+
+def clean_key(pinyin: str) -> str:
+    return ' '.join(remove_tone_marks(pinyin).lower().split())
+
+
+def default_cap(base_path: str) -> int:
+    name = os.path.basename(base_path)
+    if name.endswith('_trie.dat'):
+        return DICT_CAPS.get(name[:-len('_trie.dat')], DEFAULT_CAP)
+    return DEFAULT_CAP
+
+
+def load_user_entries(user_path: str) -> Dict[str, List[Tuple[str, int]]]:
+    """读取用户词典，返回 拼音 -> [(词语, 词频)]，同一拼音下重复的词以最后一条为准"""
+    grouped: Dict[str, Dict[str, int]] = {}
+    with RimeDictParser(user_path) as parser:
+        for word, pinyin, frequency in parser.iter_entries(code_transform=clean_key):
+            if word and pinyin:
+                grouped.setdefault(pinyin, {})[word] = frequency
+    return {key: list(words.items()) for key, words in grouped.items()}
+
+
+def group_user_entries(user: Dict[str, WordList]) -> Dict[str, Tuple[str, WordList]]:
+    """用户词条按连写规范形式分组：{连写形式: (追加新键时使用的拼音写法, 词条)}；
+    同一连写形式的多种写法合并，同一词语以最后一条为准"""
+    groups: Dict[str, Tuple[str, Dict[str, int]]] = {}
+    for key, words in user.items():
+        normalized = normalize_pinyin(key)
+        if not normalized:
+            continue
+        merged = groups.setdefault(normalized, (key, {}))[1]
+        for word, frequency in words:
+            merged.pop(word, None)
+            merged[word] = frequency
+    return {normalized: (key, list(words.items())) for normalized, (key, words) in groups.items()}
+
+
+def merge_words(base_words: WordList, user_words: WordList, mode: str, cap: int) -> WordList:
+    """合并一个拼音下的词语：用户词频按mode作用于已有词，负词频删除，新词追加后按词频稳定排序"""
+    merged: Dict[str, int] = {}
+    for word, frequency in base_words:
+        # 基础文件中同一拼音可能有重复词（多音来源），保留最高词频
+        if frequency > merged.get(word, frequency - 1):
+            merged[word] = frequency
+    for word, frequency in user_words:
+        if frequency < 0:
+            merged.pop(word, None)
+        elif word not in merged or mode == 'replace':
+            merged[word] = frequency
+        elif mode == 'max':
+            merged[word] = max(merged[word], frequency)
+        else:
+            merged[word] += frequency
+    result = sorted(merged.items(), key=lambda x: x[1], reverse=True)
+    return result[:cap] if cap > 0 else result
+
+
+def encode_record(key: str, words: WordList) -> bytes:
+    parts = []
+    key_bytes = key.encode('utf-8')
+    parts.append(struct.pack('<i', len(key_bytes)))
+    parts.append(key_bytes)
+    parts.append(struct.pack('<i', len(words)))
+    for word, frequency in words:
+        word_bytes = word.encode('utf-8')
+        parts.append(struct.pack('<i', len(word_bytes)))
+        parts.append(word_bytes)
+        parts.append(struct.pack('<i', frequency))
+    return b''.join(parts)
+
+
+def merge_record(data: bytes, words_starts: List[int], key_bytes: bytes, user_words: List[Tuple[bytes, int]],
+                 mode: str, cap: int) -> Optional[bytes]:
+    """在字节层面把同一连写形式的若干拼音记录与用户词条合并为一条记录（键为key_bytes），
+    与merge_words对这些记录的词语依次拼接后的结果一致；词频未变的词直接复用原始词记录"""
+    unpack_int = struct.Struct('<i').unpack_from
+    pack_int = struct.Struct('<i').pack
+    # 词语字节 -> [词频, 原始词记录（词频改变后置为None）]
+    merged: Dict[bytes, list] = {}
+    for words_start in words_starts:
+        word_count = unpack_int(data, words_start)[0]
+        pos = words_start + 4
+        for _ in range(word_count):
+            word_len = unpack_int(data, pos)[0]
+            end = pos + 8 + word_len
+            word = data[pos + 4:pos + 4 + word_len]
+            frequency = unpack_int(data, end - 4)[0]
+            current = merged.get(word)
+            if current is None or frequency > current[0]:
+                merged[word] = [frequency, data[pos:end]]
+            pos = end
+
+    for word, frequency in user_words:
+        current = merged.get(word)
+        if frequency < 0:
+            merged.pop(word, None)
+        elif current is None:
+            merged[word] = [frequency, None]
+        elif mode == 'replace' or (mode == 'max' and frequency > current[0]) or mode == 'add':
+            new_frequency = current[0] + frequency if mode == 'add' else frequency
+            if new_frequency != current[0]:
+                merged[word] = [new_frequency, None]
+
+    if not merged:
+        return None
+    items = sorted(merged.items(), key=lambda x: x[1][0], reverse=True)
+    if cap > 0:
+        items = items[:cap]
+    parts = [pack_int(len(key_bytes)), key_bytes, pack_int(len(items))]
+    for word, (frequency, raw) in items:
+        if raw is None:
+            raw = pack_int(len(word)) + word + pack_int(frequency)
+        parts.append(raw)
+    return b''.join(parts)
+
+
+def merge_file(base_path: str, user: Dict[str, WordList], output_path: str,
+               mode: str = 'replace', cap: Optional[int] = None) -> Dict:
+    """扫描基础文件的键后顺序写出合并结果，返回统计信息"""
+    cap = default_cap(base_path) if cap is None else cap
+    with open(base_path, 'rb') as f:
+        data = f.read()
+    view = memoryview(data)
+    version, count = struct.unpack_from('<ii', view, 0)
+    if version != V3_VERSION:
+        raise ValueError(f"不支持的版本号 {version}，期望版本3")
+
+    unpack_int = struct.Struct('<i').unpack_from
+    groups = group_user_entries(user)
+    # 第一遍：每条记录的 (起点, 键字节, 词表起点, 终点)，以及涉及用户词条的连写形式 -> 记录序号
+    records = []
+    matches: Dict[str, List[int]] = {}
+    pos = 8
+    for index in range(count):
+        record_start = pos
+        key_len = unpack_int(view, pos)[0]
+        key_bytes = data[pos + 4:pos + 4 + key_len]
+        pos += 4 + key_len
+        words_start = pos
+        word_count = unpack_int(view, pos)[0]
+        pos += 4
+        for _ in range(word_count):
+            pos += 8 + unpack_int(view, pos)[0]
+        records.append((record_start, key_bytes, words_start, pos))
+        normalized = normalize_pinyin(key_bytes.decode('utf-8'))
+        if normalized in groups:
+            matches.setdefault(normalized, []).append(index)
+
+    first_records = {indexes[0]: normalized for normalized, indexes in matches.items()}
+    folded = {index for indexes in matches.values() for index in indexes[1:]}
+    chunks = []
+    run_start = 8
+    touched = removed_keys = 0
+    for index, (record_start, key_bytes, words_start, end) in enumerate(records):
+        if index not in first_records and index not in folded:
+            continue
+        # 涉及用户词条的记录：先写出之前连续未改动的记录，再写合并后的记录（并入的记录不再写出）
+        chunks.append(view[run_start:record_start])
+        run_start = end
+        if index in folded:
+            continue
+        normalized = first_records[index]
+        # 用户词条编码为字节，合并时只比较字节不解码基础文件
+        user_words = [(word.encode('utf-8'), frequency) for word, frequency in groups[normalized][1]]
+        starts = [records[i][2] for i in matches[normalized]]
+        record = merge_record(data, starts, key_bytes, user_words, mode, cap)
+        touched += 1
+        if record is not None:
+            chunks.append(record)
+        else:
+            removed_keys += 1
+    chunks.append(view[run_start:pos])
+
+    # 基础文件中没有的连写形式按排序追加
+    added = 0
+    for normalized in sorted(set(groups) - set(matches), key=lambda n: groups[n][0]):
+        key, user_words = groups[normalized]
+        words = merge_words([], user_words, mode, cap)
+        if words:
+            chunks.append(encode_record(key, words))
+            added += 1
+
+    total = count - removed_keys - len(folded) + added
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(struct.pack('<ii', V3_VERSION, total))
+        f.writelines(chunks)
+
+    return {
+        'base_keys': count,
+        'user_keys': len(groups),
+        'user_entries': sum(len(words) for _, words in groups.values()),
+        'keys_touched': touched,
+        'keys_folded': len(folded),
+        'keys_added': added,
+        'keys_removed': removed_keys,
+        'output_keys': total,
+        'cap': cap,
+    }
+
+
+def verify_merged_file(base_path: str, user: Dict[str, WordList], output_path: str,
+                       mode: str, cap: int) -> bool:
+    """完整解码基础文件与输出文件，逐拼音核对合并结果"""
+    print(f"\n正在验证合并结果: {output_path}")
+    try:
+        with open(base_path, 'rb') as f:
+            base = list(iter_v3_entries(f.read()))
+        with open(output_path, 'rb') as f:
+            output = list(iter_v3_entries(f.read()))
+    except Exception as e:
+        print(f"错误：无法读取文件 - {e}")
+        return False
+
+    # 按连写形式连接：同一形式的全部基础记录合并到第一条记录的位置与拼音写法
+    groups = group_user_entries(user)
+    group_words: Dict[str, WordList] = {}
+    for key, words in base:
+        normalized = normalize_pinyin(key)
+        if normalized in groups:
+            group_words.setdefault(normalized, []).extend(words)
+
+    expected = []
+    written = set()
+    for key, words in base:
+        normalized = normalize_pinyin(key)
+        if normalized in groups:
+            if normalized in written:
+                continue
+            written.add(normalized)
+            words = merge_words(group_words[normalized], groups[normalized][1], mode, cap)
+            if not words:
+                continue
+        expected.append((key, words))
+    for normalized in sorted(set(groups) - written, key=lambda n: groups[n][0]):
+        key, user_words = groups[normalized]
+        words = merge_words([], user_words, mode, cap)
+        if words:
+            expected.append((key, words))
+
+    mismatches = sum(1 for a, b in zip(expected, output) if a != b) + abs(len(expected) - len(output))
+    touched = [words for key, words in output if normalize_pinyin(key) in groups]
+    # 输出中涉及用户词条的连写形式各只有一条记录
+    single = len(touched) == len({normalize_pinyin(key) for key, _ in output if normalize_pinyin(key) in groups})
+    capped = cap <= 0 or all(len(words) <= cap for words in touched)
+    ordered = all(words[i][1] >= words[i + 1][1] for words in touched for i in range(len(words) - 1))
+
+    print(f"  拼音条目: 期望 {len(expected)}，实际 {len(output)}，不一致 {mismatches}")
+    print(f"  每拼音上限: {'✅' if capped else '❌'}，词频降序: {'✅' if ordered else '❌'}，"
+          f"同一连写形式只有一条记录: {'✅' if single else '❌'}")
+    ok = mismatches == 0 and capped and ordered and single
+    print("✅ 合并结果验证通过" if ok else "❌ 合并结果验证失败")
+    return ok
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="把导出的用户词典合并进预编译Trie文件")
+    parser.add_argument('base', help="基础版本3 .dat文件")
+    parser.add_argument('user', help="导出的用户词典（词语<TAB>拼音<TAB>词频）")
+    parser.add_argument('--output', help="输出文件，默认在基础文件旁生成 *_user.dat")
+    parser.add_argument('--mode', choices=MODES, default='replace',
+                        help="已有词的词频处理：replace 用户词频覆盖，max 取较大值，add 累加")
+    parser.add_argument('--max-words', type=int, help="每拼音最大词数，0表示不限，默认按词典类型取构建时的上限")
+    parser.add_argument('--no-verify', action='store_true', help="跳过完整解码验证（大文件时使用）")
+    args = parser.parse_args()
+
+    output = args.output or (args.base[:-4] if args.base.endswith('.dat') else args.base) + '_user.dat'
+    cap = default_cap(args.base) if args.max_words is None else args.max_words
+
+    print("=" * 60)
+    print("神迹输入法 - 用户词典合并工具")
+    print("=" * 60)
+    print(f"基础文件: {args.base}")
+    print(f"用户词典: {args.user}")
+    print(f"输出文件: {output}")
+    print(f"策略: {args.mode}，" + (f"每拼音最多{cap}个词" if cap > 0 else "每拼音词数不限"))
+    print("=" * 60)
+
+    for path in (args.base, args.user):
+        if not os.path.exists(path):
+            print(f"❌ 文件不存在: {path}")
+            return 1
+
+    start = time.perf_counter()
+    user = load_user_entries(args.user)
+    load_ms = (time.perf_counter() - start) * 1000
+    if not user:
+        print("❌ 用户词典为空")
+        return 1
+
+    start = time.perf_counter()
+    try:
+        stats = merge_file(args.base, user, output, args.mode, cap)
+    except Exception as e:
+        print(f"❌ 合并失败 - {e}")
+        return 1
+    merge_ms = (time.perf_counter() - start) * 1000
+
+    print(f"用户词典: {stats['user_entries']} 个词条，{stats['user_keys']} 个拼音（读取 {load_ms:.0f} ms）")
+    print(f"基础文件: {stats['base_keys']} 个拼音，改动 {stats['keys_touched']}，"
+          f"并入同一连写形式 {stats['keys_folded']}，新增 {stats['keys_added']}，删空 {stats['keys_removed']}")
+    print(f"合并完成: {stats['output_keys']} 个拼音，耗时 {merge_ms:.0f} ms，"
+          f"文件大小 {os.path.getsize(output)} 字节")
+
+    if not args.no_verify and not verify_merged_file(args.base, user, output, args.mode, cap):
+        print("❌ 验证文件失败")
+        return 1
+
+    print("=" * 60)
+    print("✅ 个性化词典文件生成成功！")
+    print(f"📁 输出文件: {output}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 设备端加载开销模型
+不安装到手机，离线估算 TrieManager 加载各个预编译资源时的对象分配、堆占用和耗时，
+把不同文件格式并排比较，在格式或构建参数改动造成低端机启动变慢、OOM之前发现问题。
+
+加载方式模型：
+    v3-trie    TrieManager.deserializeSimplifiedFormat + PinyinTrie.insert 的逐条模拟：
+               每次4字节读取的 ByteArray(4) 与 ByteBuffer.wrap、拼音/词语 String、连写拼音转换，
+               逐字符创建 TrieNode（各带一个 HashMap 和一个 ArrayList），HashMap 首次插入分配16槽的表、
+               超过0.75负载时翻倍扩容，ArrayList 首次插入容量10、按1.5倍增长，
+               TrieNode.addWord 每次插入后整表排序、满员后按最低词频替换；
+               chars 全量加载、每节点最多1000词，其他词典只加载词频>100的词、每节点最多50词。
+               asset 先复制到临时文件再读取，按3倍文件大小计IO。
+    v3-mmap    映射版本3文件，只为每个拼音键建立 连写String + 偏移 的有序索引（trie_reader 的 v3-mmap）
+    container  映射分段容器（合并索引、有序索引、纠错索引、预热表等），只解析分段目录
+
+对象大小按 ART 计算：对象头8字节、引用4字节、8字节对齐，纯ASCII字符串压缩为每字符1字节，
+其他字符串每个UTF-16单元2字节。耗时是粗略估计（分配次数、分配字节、排序/扫描的元素访问、IO字节各乘常数），
+设备常数见 DEVICE_PROFILES，应以真机测得的加载耗时校准。
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from trie_format import is_container, iter_v3_entries, read_container
+
+# ==================== ART对象大小 ====================
+
+OBJECT_HEADER = 8
+REFERENCE = 4
+
+
+def align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def array_bytes(length: int, element_size: int) -> int:
+    return align(OBJECT_HEADER + 4 + length * element_size)
+
+
+def string_bytes(text: str) -> int:
+    units = len(text.encode('utf-16-le')) // 2
+    compressed = all(ord(c) < 0x80 for c in text)
+    return align(OBJECT_HEADER + 8 + (units if compressed else units * 2))
+
+
+TRIE_NODE_BYTES = align(OBJECT_HEADER + 2 * REFERENCE + 1)
+HASHMAP_BYTES = align(OBJECT_HEADER + 4 * REFERENCE + 4 * 4)
+HASHMAP_NODE_BYTES = align(OBJECT_HEADER + 4 + 3 * REFERENCE)
+ARRAYLIST_BYTES = align(OBJECT_HEADER + 3 * 4)
+WORD_ITEM_BYTES = align(OBJECT_HEADER + REFERENCE + 4)
+BYTE_BUFFER_BYTES = 56
+CHARACTER_BYTES = align(OBJECT_HEADER + 2)
+COMPARATOR_BYTES = 16
+TIMSORT_BYTES = 48
+MAPPED_BUFFER_BYTES = 64
+TRIE_ROOT_BYTES = 160  # PinyinTrie + 根节点 + ReentrantReadWriteLock
+
+HASHMAP_INITIAL_CAPACITY = 16
+HASHMAP_LOAD_FACTOR = 0.75
+ARRAYLIST_DEFAULT_CAPACITY = 10
+TIMSORT_MIN_MERGE = 32
+MEMORY_CHECK_INTERVAL = 1000
+
+MAX_WORDS_PER_NODE = 50
+MAX_WORDS_PER_NODE_CHARS = 1000
+MIN_FREQUENCY = 100
+
+LOADERS = ['v3-trie', 'v3-mmap', 'container']
+
+# 设备常数：最大堆、每次分配、每字节分配、每次元素访问、每字节IO的耗时（纳秒）
+DEVICE_PROFILES = {
+    'low-end': {'heap_mb': 128, 'alloc_ns': 120, 'byte_ns': 0.6, 'visit_ns': 8, 'io_ns': 2.0},
+    'mid': {'heap_mb': 256, 'alloc_ns': 60, 'byte_ns': 0.3, 'visit_ns': 4, 'io_ns': 1.0},
+    'high': {'heap_mb': 512, 'alloc_ns': 30, 'byte_ns': 0.15, 'visit_ns': 2, 'io_ns': 0.5},
+}
+DEFAULT_PROFILE = 'low-end'
+DEFAULT_BASELINE_MB = 40
+
+
+# ==================== 分配记录 ====================
+
+class AllocationModel:
+    """记录分配的对象：retained 为加载结束后仍存活的字节，transient 为加载过程中成为垃圾的字节"""
+
+    def __init__(self):
+        self.objects: Counter = Counter()
+        self.allocated_bytes = 0
+        self.retained_bytes = 0
+        self.visits = 0
+        self.io_bytes = 0
+        self.mapped_bytes = 0
+        self.events: Counter = Counter()
+
+    def alloc(self, kind: str, size: int, retained: bool = False):
+        self.objects[kind] += 1
+        self.allocated_bytes += size
+        if retained:
+            self.retained_bytes += size
+
+    def release(self, size: int):
+        """先前计为存活的对象变成垃圾"""
+        self.retained_bytes -= size
+
+    def estimate_ms(self, profile: Dict) -> float:
+        total_ns = (sum(self.objects.values()) * profile['alloc_ns'] + self.allocated_bytes * profile['byte_ns']
+                    + self.visits * profile['visit_ns'] + self.io_bytes * profile['io_ns'])
+        return total_ns / 1e6
+
+
+# ==================== v3-trie：deserializeSimplifiedFormat + PinyinTrie ====================
+
+class ModelNode:
+    __slots__ = ('children', 'capacity', 'words', 'list_capacity')
+
+    def __init__(self):
+        self.children: Dict[str, 'ModelNode'] = {}
+        self.capacity = 0
+        self.words: List[tuple] = []
+        self.list_capacity = 0
+
+
+class TrieLoadModel(AllocationModel):
+    """逐条重放版本3文件的加载过程"""
+
+    def __init__(self, is_chars: bool, heap_limit_bytes: Optional[int] = None, baseline_bytes: int = 0):
+        super().__init__()
+        self.is_chars = is_chars
+        self.max_words = MAX_WORDS_PER_NODE_CHARS if is_chars else MAX_WORDS_PER_NODE
+        self.heap_limit_bytes = heap_limit_bytes
+        self.baseline_bytes = baseline_bytes
+        self.root = ModelNode()
+        self.alloc('PinyinTrie', TRIE_ROOT_BYTES, retained=True)
+        self.alloc('HashMap', HASHMAP_BYTES, retained=True)
+        self.alloc('ArrayList', ARRAYLIST_BYTES, retained=True)
+        self.loaded_keys = 0
+        self.truncated_at: Optional[int] = None
+
+    def read_int(self):
+        self.alloc('ByteArray', array_bytes(4, 1))
+        self.alloc('ByteBuffer', BYTE_BUFFER_BYTES)
+
+    def read_string(self, text: str, retained: bool = False) -> int:
+        self.alloc('ByteArray', array_bytes(len(text.encode('utf-8')), 1))
+        size = string_bytes(text)
+        self.alloc('String', size, retained)
+        return size
+
+    def box(self, char: str):
+        """Character.valueOf 只缓存0~127"""
+        if ord(char) > 127:
+            self.alloc('Character', CHARACTER_BYTES)
+
+    def child(self, node: ModelNode, char: str) -> ModelNode:
+        self.box(char)  # containsKey
+        if char not in node.children:
+            self.box(char)  # put
+            self.alloc('TrieNode', TRIE_NODE_BYTES, retained=True)
+            self.alloc('HashMap', HASHMAP_BYTES, retained=True)
+            self.alloc('ArrayList', ARRAYLIST_BYTES, retained=True)
+            self.alloc('HashMap.Node', HASHMAP_NODE_BYTES, retained=True)
+            if node.capacity == 0:
+                node.capacity = HASHMAP_INITIAL_CAPACITY
+                self.alloc('HashMap.table', array_bytes(node.capacity, REFERENCE), retained=True)
+            node.children[char] = ModelNode()
+            if len(node.children) > node.capacity * HASHMAP_LOAD_FACTOR:
+                self.release(array_bytes(node.capacity, REFERENCE))
+                node.capacity *= 2
+                self.alloc('HashMap.table', array_bytes(node.capacity, REFERENCE), retained=True)
+                self.visits += len(node.children)
+                self.events['HashMap扩容'] += 1
+        self.box(char)  # get
+        return node.children[char]
+
+    def sort_words(self, node: ModelNode):
+        """words.sortByDescending：比较器对象，≥32个元素时TimSort另分配临时数组"""
+        size = len(node.words)
+        self.alloc('Comparator', COMPARATOR_BYTES)
+        if size >= TIMSORT_MIN_MERGE:
+            self.alloc('TimSort', TIMSORT_BYTES)
+            self.alloc('TimSort.tmp', array_bytes(min(size >> 1, 256), REFERENCE))
+        self.visits += size
+        self.events['排序'] += 1
+
+    def add_word(self, node: ModelNode, frequency: int, string_size: int) -> bool:
+        if len(node.words) < self.max_words:
+            if len(node.words) == node.list_capacity:
+                if node.list_capacity:
+                    self.release(array_bytes(node.list_capacity, REFERENCE))
+                    self.events['ArrayList扩容'] += 1
+                node.list_capacity = max(ARRAYLIST_DEFAULT_CAPACITY, node.list_capacity + (node.list_capacity >> 1))
+                self.alloc('ArrayList.array', array_bytes(node.list_capacity, REFERENCE), retained=True)
+            node.words.append((frequency, string_size))
+            self.alloc('WordItem', WORD_ITEM_BYTES, retained=True)
+            self.sort_words(node)
+            return True
+
+        self.visits += len(node.words)  # minByOrNull
+        lowest = min(range(len(node.words)), key=lambda i: node.words[i][0])
+        if frequency <= node.words[lowest][0]:
+            return False
+        self.visits += len(node.words)  # remove
+        self.release(WORD_ITEM_BYTES + node.words[lowest][1])
+        node.words[lowest] = (frequency, string_size)
+        self.alloc('WordItem', WORD_ITEM_BYTES, retained=True)
+        self.events['替换低频词'] += 1
+        self.sort_words(node)
+        return True
+
+    def check_memory(self):
+        if self.heap_limit_bytes is None or self.truncated_at is not None:
+            return
+        if self.baseline_bytes + self.retained_bytes > self.heap_limit_bytes:
+            self.truncated_at = self.loaded_keys
+
+    def load_entry(self, pinyin: str, words):
+        if self.loaded_keys % MEMORY_CHECK_INTERVAL == 0:
+            self.check_memory()
+        if self.truncated_at is not None:
+            return
+        self.read_int()
+        self.read_string(pinyin)
+        self.read_int()
+        normalized = pinyin.replace(' ', '')
+        if normalized != pinyin:
+            self.alloc('String', string_bytes(normalized))
+        if normalized.lower() != normalized:
+            normalized = normalized.lower()
+            self.alloc('String', string_bytes(normalized))
+
+        for word, frequency in words:
+            self.read_int()
+            size = self.read_string(word)
+            self.read_int()
+            if not self.is_chars and frequency <= MIN_FREQUENCY:
+                self.events['跳过低频词'] += 1
+                continue
+            node = self.root
+            for char in normalized:
+                node = self.child(node, char)
+            if self.add_word(node, frequency, size):
+                self.retained_bytes += size
+            else:
+                self.events['节点已满丢弃'] += 1
+        self.loaded_keys += 1
+
+
+def model_v3_trie(path: str, profile: Dict, baseline_bytes: int) -> TrieLoadModel:
+    is_chars = os.path.basename(path).startswith('chars')
+    limit = (0.9 if is_chars else 0.8) * profile['heap_mb'] * 1024 * 1024
+    model = TrieLoadModel(is_chars, int(limit), baseline_bytes)
+    with open(path, 'rb') as f:
+        buf = f.read()
+    model.io_bytes = 3 * len(buf)
+    model.alloc('ByteArray', array_bytes(64 * 1024, 1))  # 复制缓冲区
+    model.alloc('ByteArray', array_bytes(64 * 1024, 1))  # BufferedInputStream
+    model.read_int()
+    model.read_int()
+    for pinyin, words in iter_v3_entries(buf):
+        model.load_entry(pinyin, words)
+    return model
+
+
+# ==================== v3-mmap / container ====================
+
+def model_v3_mmap(path: str) -> AllocationModel:
+    """映射文件，每个拼音键一个连写String，另有String数组和偏移IntArray，按键排序"""
+    model = AllocationModel()
+    with open(path, 'rb') as f:
+        buf = f.read()
+    model.mapped_bytes = len(buf)
+    model.io_bytes = len(buf)
+    model.alloc('MappedByteBuffer', MAPPED_BUFFER_BYTES, retained=True)
+    count = struct.unpack_from('<i', buf, 4)[0]
+    model.alloc('String[]', array_bytes(count, REFERENCE), retained=True)
+    model.alloc('IntArray', array_bytes(count, 4), retained=True)
+    for pinyin, words in iter_v3_entries(buf):
+        model.alloc('ByteArray', array_bytes(len(pinyin.encode('utf-8')), 1))
+        model.alloc('String', string_bytes(pinyin.replace(' ', '')), retained=True)
+        model.visits += len(words)  # 跳过候选
+    model.visits += int(count * max(count, 2).bit_length())
+    return model
+
+
+def model_container(path: str) -> AllocationModel:
+    """映射容器，只解析分段目录，每个分段一个视图"""
+    model = AllocationModel()
+    with open(path, 'rb') as f:
+        buf = f.read()
+    sections = read_container(buf)
+    model.mapped_bytes = len(buf)
+    model.alloc('MappedByteBuffer', MAPPED_BUFFER_BYTES, retained=True)
+    for tag, data in sections.items():
+        model.alloc('ByteBuffer', BYTE_BUFFER_BYTES, retained=True)
+        if tag == 'META':
+            model.alloc('String', string_bytes(bytes(data).decode('utf-8')), retained=True)
+            model.io_bytes += len(data)
+    model.io_bytes += 4096
+    return model
+
+
+# ==================== 汇总 ====================
+
+def model_file(path: str, loader: str, profile: Dict, baseline_bytes: int) -> AllocationModel:
+    if loader == 'v3-trie':
+        return model_v3_trie(path, profile, baseline_bytes)
+    if loader == 'v3-mmap':
+        return model_v3_mmap(path)
+    return model_container(path)
+
+
+def file_loaders(path: str) -> List[str]:
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    return ['container'] if is_container(head) else ['v3-trie', 'v3-mmap']
+
+
+def summarize(path: str, loader: str, model: AllocationModel, profile: Dict) -> Dict:
+    objects = model.objects
+    heap_bytes = profile['heap_mb'] * 1024 * 1024
+    row = {
+        'file': os.path.basename(path),
+        'loader': loader,
+        'file_bytes': os.path.getsize(path),
+        'strings': objects['String'],
+        'byte_arrays': objects['ByteArray'],
+        'trie_nodes': objects['TrieNode'],
+        'hashmaps': objects['HashMap'],
+        'hashmap_slots': 0,
+        'hashmap_resizes': model.events['HashMap扩容'],
+        'word_items': objects['WordItem'],
+        'objects': sum(objects.values()),
+        'allocated_bytes': model.allocated_bytes,
+        'retained_bytes': model.retained_bytes,
+        'mapped_bytes': model.mapped_bytes,
+        'visits': model.visits,
+        'heap_percent': model.retained_bytes * 100 / heap_bytes,
+        'estimated_ms': model.estimate_ms(profile),
+        'events': dict(model.events),
+        'truncated_at': None,
+    }
+    if isinstance(model, TrieLoadModel):
+        stack = [model.root]
+        while stack:
+            node = stack.pop()
+            row['hashmap_slots'] += node.capacity
+            stack.extend(node.children.values())
+        row['truncated_at'] = model.truncated_at
+    return row
+
+
+def print_table(rows: List[Dict]):
+    mb = 1024 * 1024
+    header = (f"{'文件':<24}{'加载方式':<11}{'String':>9}{'ByteArray':>10}{'TrieNode':>9}{'HashMap':>8}"
+              f"{'槽位':>9}{'扩容':>7}{'WordItem':>9}{'常驻MB':>8}{'分配MB':>8}{'映射MB':>8}{'占堆':>7}{'预估ms':>8}")
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['file']:<24}{r['loader']:<11}{r['strings']:>9}{r['byte_arrays']:>10}{r['trie_nodes']:>9}"
+              f"{r['hashmaps']:>8}{r['hashmap_slots']:>9}{r['hashmap_resizes']:>7}{r['word_items']:>9}"
+              f"{r['retained_bytes'] / mb:>8.2f}{r['allocated_bytes'] / mb:>8.1f}{r['mapped_bytes'] / mb:>8.2f}"
+              f"{r['heap_percent']:>6.1f}%{r['estimated_ms']:>8.0f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="离线估算预编译资源在设备上的加载开销")
+    parser.add_argument('paths', nargs='*', help="资源文件或目录，默认 app/src/main/assets/trie")
+    parser.add_argument('--loaders', default=','.join(LOADERS), help="要比较的加载方式，逗号分隔")
+    parser.add_argument('--device', choices=sorted(DEVICE_PROFILES), default=DEFAULT_PROFILE, help="设备常数")
+    parser.add_argument('--heap-mb', type=int, help="覆盖设备的最大堆（MB）")
+    parser.add_argument('--baseline-mb', type=float, default=DEFAULT_BASELINE_MB, help="开始加载前已用的堆（MB）")
+    parser.add_argument('--json', dest='json_path', help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    profile = dict(DEVICE_PROFILES[args.device])
+    if args.heap_mb:
+        profile['heap_mb'] = args.heap_mb
+    loaders = [loader for loader in args.loaders.split(',') if loader]
+    unknown = [loader for loader in loaders if loader not in LOADERS]
+    if unknown:
+        print(f"❌ 未知的加载方式: {', '.join(unknown)}")
+        return 1
+
+    paths = []
+    for path in args.paths or ["app/src/main/assets/trie"]:
+        if os.path.isdir(path):
+            paths += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.dat'))
+        elif os.path.exists(path):
+            paths.append(path)
+        else:
+            print(f"⚠️ 文件不存在，跳过: {path}")
+    if not paths:
+        print("❌ 没有可分析的资源文件")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 设备端加载开销模型")
+    print("=" * 60)
+    print(f"设备: {args.device}，最大堆 {profile['heap_mb']} MB，加载前已用 {args.baseline_mb} MB")
+    print(f"文件: {len(paths)} 个，加载方式: {', '.join(loaders)}")
+    print("=" * 60)
+
+    baseline_bytes = int(args.baseline_mb * 1024 * 1024)
+    rows = []
+    for path in paths:
+        for loader in file_loaders(path):
+            if loader not in loaders:
+                continue
+            try:
+                model = model_file(path, loader, profile, baseline_bytes)
+            except (ValueError, struct.error) as e:
+                print(f"⚠️ {path}/{loader}: {e}")
+                continue
+            rows.append(summarize(path, loader, model, profile))
+
+    if not rows:
+        print("❌ 没有可分析的文件与加载方式组合")
+        return 1
+    print_table(rows)
+
+    print()
+    heap_bytes = profile['heap_mb'] * 1024 * 1024
+    for loader in loaders:
+        selected = [r for r in rows if r['loader'] == loader]
+        if not selected:
+            continue
+        retained = sum(r['retained_bytes'] for r in selected)
+        estimated = sum(r['estimated_ms'] for r in selected)
+        total = baseline_bytes + retained
+        mark = "❌" if total > 0.8 * heap_bytes else "⚠️" if total > 0.5 * heap_bytes else "✅"
+        print(f"{mark} {loader}: 全部加载常驻 {retained / 1024 / 1024:.1f} MB（含基线占堆 {total * 100 / heap_bytes:.0f}%），"
+              f"预估 {estimated:.0f} ms")
+    for r in rows:
+        if r['truncated_at'] is not None:
+            print(f"❌ {r['file']}: 单独加载时在第 {r['truncated_at']} 个拼音条目超过内存上限，TrieManager 会提前停止加载")
+        if r['events'].get('节点已满丢弃'):
+            print(f"⚠️ {r['file']}: {r['events']['节点已满丢弃']} 个词因节点已满被丢弃，"
+                  f"另有 {r['events'].get('替换低频词', 0)} 次替换低频词")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'device': args.device, 'profile': profile, 'results': rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n📁 JSON报告: {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
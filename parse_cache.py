@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 词典解析结果缓存
+调整筛选比例、每拼音词数或截断策略时，构建工具每次都要重新解析整个 dict.yaml。
+本模块把解析并转换拼音后的词条存为列（拼音id、词频、词语缓冲区），
+以源文件内容的SHA-256和拼音规范化版本为键缓存为未压缩的 .npy 文件，读取时内存映射，
+源文件不变时参数扫描和重复构建直接跳过解析。
+
+缓存键：
+    源文件内容哈希（按 大小+修改时间 记住上次的哈希，文件未变时不重新计算）
+    NORMALIZATION_VERSION
+    解析器指纹：dict_parser、pinyin_alias 的源代码与当前别名表的哈希，改动列处理、跳过规则或 ü 别名后旧缓存自动失效
+    拼音转换函数源代码的指纹：改动 remove_tone_marks 等转换后旧缓存自动失效
+
+缓存目录（默认 .parse_cache，可用环境变量 PARSE_CACHE_DIR 指定，设为空串时不使用缓存）：
+    <词典名>-<内容哈希前16位>-n<规范化版本>-p<解析器指纹>-<转换指纹>/
+        meta.json        来源、哈希、词条数、解析时跳过的行数
+        keys.npy         uint8，去重后的拼音（已去声调，未合并空格），每个以换行结尾
+        key_offsets.npy  int64[拼音数+1]
+        key_ids.npy      int32[词条数]，按源文件顺序
+        frequencies.npy  int64[词条数]
+        words.npy        uint8，词语，每个以换行结尾
+        word_offsets.npy int64[词条数+1]
+同一源文件、同一拼音转换只保留最新的一份缓存：写入新缓存时按各缓存的 meta.json（来源文件名与转换指纹）
+找出内容哈希、规范化版本或解析器指纹已过期的旧缓存并删除；不同的转换函数（如 build_universal_trie 与
+build_unlimited_chars_trie 各自的 remove_tone_marks）各有一份缓存，交替运行时互不淘汰。
+词条与逐行解析的结果（过滤空拼音后）完全一致。
+
+用法:
+    columns = load_parsed_columns(path, remove_tone_marks)
+    selection = columns.top_fraction(0.3)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import dict_parser
+import pinyin_alias
+from columnar_build import pack_strings
+from dict_parser import RimeDictParser
+from trie_format import dict_source_path
+
+NORMALIZATION_VERSION = 2
+DEFAULT_CACHE_DIR = ".parse_cache"
+STAT_INDEX = "source_digests.json"
+ARRAYS = ['keys', 'key_offsets', 'key_ids', 'frequencies', 'words', 'word_offsets']
+
+
+def cache_dir() -> Optional[str]:
+    """缓存目录，环境变量 PARSE_CACHE_DIR 为空串时返回None（不使用缓存）"""
+    path = os.environ.get('PARSE_CACHE_DIR', DEFAULT_CACHE_DIR)
+    return path or None
+
+
+def parser_fingerprint() -> str:
+    """解析结果依赖的模块（dict_parser 的列与跳过规则、pinyin_alias 的规范写法）源代码与别名表的指纹"""
+    digest = hashlib.sha256()
+    for module in (dict_parser, pinyin_alias):
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    digest.update(json.dumps(pinyin_alias.alias_table(), ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:8]
+
+
+def transform_fingerprint(code_transform: Optional[Callable[[str], str]]) -> str:
+    """拼音转换函数的指纹：源代码的哈希，取不到源代码时退回函数名"""
+    if code_transform is None:
+        return 'none'
+    try:
+        source = inspect.getsource(code_transform)
+    except (OSError, TypeError):
+        source = f"{code_transform.__module__}.{code_transform.__qualname__}"
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:8]
+
+
+def source_digest(path: str, directory: Optional[str] = None) -> str:
+    """源文件内容的SHA-256；大小和修改时间与上次相同时直接使用记住的哈希"""
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    index_path = os.path.join(directory, STAT_INDEX) if directory else None
+    index: Dict[str, Dict] = {}
+    if index_path and os.path.exists(index_path):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+    key = os.path.abspath(path)
+    if key in index and index[key]['signature'] == signature:
+        return index[key]['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    if index_path:
+        index[key] = {'signature': signature, 'sha256': digest.hexdigest()}
+        os.makedirs(directory, exist_ok=True)
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+    return digest.hexdigest()
+
+
+class ParsedColumns:
+    """解析后的词条列：keys 为去重后的拼音，key_ids/frequencies/words 按源文件顺序"""
+
+    def __init__(self, keys: List[str], key_ids: np.ndarray, frequencies: np.ndarray,
+                 word_buffer: np.ndarray, word_offsets: np.ndarray, meta: Dict):
+        self.keys = keys
+        self.key_ids = key_ids
+        self.frequencies = frequencies
+        self.word_buffer = word_buffer
+        self.word_offsets = word_offsets
+        self.meta = meta
+
+    def __len__(self) -> int:
+        return len(self.key_ids)
+
+    def words(self) -> List[str]:
+        return bytes(self.word_buffer).decode('utf-8').split('\n')[:-1]
+
+    def iter_entries(self) -> Iterator[Tuple[str, str, int]]:
+        """按源文件顺序产出 (词语, 拼音, 词频)，与逐行解析的结果相同"""
+        keys = self.keys
+        return zip(self.words(), (keys[i] for i in self.key_ids.tolist()), self.frequencies.tolist())
+
+    def top_fraction(self, percentage: float) -> np.ndarray:
+        """按词频降序（同词频保持源文件顺序）取前 percentage 比例的词条下标，与 sorted(..., reverse=True) 一致"""
+        order = np.argsort(-self.frequencies, kind='stable')
+        return order[:int(len(order) * percentage)]
+
+
+def parse_columns(path: str, code_transform: Optional[Callable[[str], str]]) -> ParsedColumns:
+    """逐行解析源文件并转为列，跳过空拼音"""
+    key_ids_by_code: Dict[str, int] = {}
+    keys: List[str] = []
+    words: List[str] = []
+    key_ids = array('i')
+    frequencies = array('q')
+    empty = 0
+    with RimeDictParser(path) as parser:
+        for word, pinyin, frequency in parser.iter_entries(code_transform=code_transform):
+            if not pinyin:
+                empty += 1
+                continue
+            key_id = key_ids_by_code.get(pinyin)
+            if key_id is None:
+                key_id = key_ids_by_code[pinyin] = len(keys)
+                keys.append(pinyin)
+            key_ids.append(key_id)
+            words.append(word)
+            frequencies.append(frequency)
+        skipped = parser.skipped
+
+    word_buffer, word_offsets = pack_strings(words)
+    meta = {'entries': len(words), 'keys': len(keys), 'skipped': skipped, 'empty': empty}
+    return ParsedColumns(keys, np.frombuffer(key_ids, dtype=np.int32).copy(),
+                         np.frombuffer(frequencies, dtype=np.int64).copy(), word_buffer, word_offsets, meta)
+
+
+def save_columns(directory: str, columns: ParsedColumns):
+    """先写入临时目录再改名，中断的写入不会留下半个缓存"""
+    temp = f"{directory}.tmp{os.getpid()}"
+    shutil.rmtree(temp, ignore_errors=True)
+    os.makedirs(temp)
+    key_buffer, key_offsets = pack_strings(columns.keys)
+    arrays = {
+        'keys': key_buffer, 'key_offsets': key_offsets, 'key_ids': columns.key_ids,
+        'frequencies': columns.frequencies, 'words': columns.word_buffer, 'word_offsets': columns.word_offsets,
+    }
+    for name in ARRAYS:
+        np.save(os.path.join(temp, f"{name}.npy"), np.ascontiguousarray(arrays[name]), allow_pickle=False)
+    with open(os.path.join(temp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(columns.meta, f, ensure_ascii=False, indent=1)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temp, directory)
+
+
+def load_columns(directory: str) -> ParsedColumns:
+    """内存映射读取缓存的各列"""
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+              for name in ARRAYS}
+    with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    keys = bytes(arrays['keys']).decode('utf-8').split('\n')[:-1]
+    return ParsedColumns(keys, arrays['key_ids'], arrays['frequencies'],
+                         arrays['words'], arrays['word_offsets'], meta)
+
+
+def cache_entry_name(path: str, digest: str, code_transform: Optional[Callable[[str], str]]) -> str:
+    name = os.path.basename(path).split('.')[0]
+    return (f"{name}-{digest[:16]}-n{NORMALIZATION_VERSION}-p{parser_fingerprint()}"
+            f"-{transform_fingerprint(code_transform)}")
+
+
+def stale_entries(directory: str, path: str, transform: str, current: str) -> List[str]:
+    """同一源文件、同一转换指纹下除current以外的缓存目录（内容哈希、规范化版本或解析器指纹已过期）；
+    按 meta.json 判断而不是按目录名前缀，词典名含 '-' 时也不会误删其他词典的缓存"""
+    name = os.path.basename(path).split('.')[0]
+    stale = []
+    for entry in os.listdir(directory):
+        meta_path = os.path.join(directory, entry, 'meta.json')
+        if entry == current or not os.path.exists(meta_path):
+            continue
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if os.path.basename(meta.get('source', '')).split('.')[0] == name and meta.get('transform') == transform:
+            stale.append(entry)
+    return stale
+
+
+def load_parsed_columns(path: str, code_transform: Optional[Callable[[str], str]] = None,
+                        directory: Optional[str] = None) -> ParsedColumns:
+    """读取源文件的解析结果：缓存命中时内存映射读取，否则解析后写入缓存"""
+    directory = directory if directory is not None else cache_dir()
+    start = time.perf_counter()
+    if directory is None:
+        return parse_columns(path, code_transform)
+
+    digest = source_digest(path, directory)
+    entry_name = cache_entry_name(path, digest, code_transform)
+    entry = os.path.join(directory, entry_name)
+    if os.path.exists(os.path.join(entry, 'meta.json')):
+        columns = load_columns(entry)
+        print(f"解析缓存命中: {entry}（{len(columns)} 个词条，{(time.perf_counter() - start) * 1000:.1f} ms）")
+        return columns
+
+    columns = parse_columns(path, code_transform)
+    columns.meta.update({
+        'source': path,
+        'sha256': digest,
+        'normalization_version': NORMALIZATION_VERSION,
+        'parser': parser_fingerprint(),
+        'transform': transform_fingerprint(code_transform),
+    })
+    for stale in stale_entries(directory, path, columns.meta['transform'], entry_name):
+        shutil.rmtree(os.path.join(directory, stale), ignore_errors=True)
+    save_columns(entry, columns)
+    print(f"已写入解析缓存: {entry}（{len(columns)} 个词条，解析 {(time.perf_counter() - start) * 1000:.0f} ms）")
+    return columns
+
+
+def main():
+    """预先解析词典源文件写入缓存，或查看、清空缓存"""
+    from build_universal_trie import remove_tone_marks
+
+    directory = cache_dir()
+    if directory is None:
+        print("❌ 已通过 PARSE_CACHE_DIR 关闭解析缓存")
+        return 1
+    if sys.argv[1:] == ['clear']:
+        shutil.rmtree(directory, ignore_errors=True)
+        print(f"✅ 已清空解析缓存: {directory}")
+        return 0
+
+    source_dir = os.path.dirname(dict_source_path(''))
+    names = sys.argv[1:] or sorted(name.split('.')[0] for name in os.listdir(source_dir)
+                                   if name.endswith('.dict.yaml'))
+    for name in names:
+        path = name if name.endswith('.yaml') else dict_source_path(name)
+        if not os.path.exists(path):
+            print(f"⚠️ 词典源文件不存在，跳过: {path}")
+            continue
+        load_parsed_columns(path, remove_tone_marks, directory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - ü 的规范写法与别名表
+词典源文件里 ü 有多种写法：lü、带声调的 lǚ、lv、Rime 风格的 lu:，以及约定俗成省略两点的 lue/nue。
+原先 remove_tone_marks 把 ǚ 转成 ü、把不带声调的 ü 转成 v，同一个词可能落在几个不同的键下。
+
+规范写法：l/n 后的 ü 写作 ü（lü、nüe），与应用查询前的 lv -> lü 转换（UnifiedPinyinSplitter.preprocessVToU）、
+应用内音节表和已发布的词典资源一致；j/q/x/y 后的 ü 写作 u（ju、xue、yuan）。
+构建工具生成键时统一转为规范写法，查询时按别名表把任意写法转为规范写法后只查一次。
+音节切分自动机与双拼方案按键盘输入写作 v，KEY_SYLLABLES 为与自动机音节ID一一对应的规范写法。
+
+别名表（app/src/main/assets/trie/pinyin_aliases.json，有序索引文件的META中也附带一份）：
+    version    别名表版本（别名规则改动后 parse_cache 的缓存键随之变化，旧的解析缓存自动失效）
+    canonical  ü 的规范写法
+    syllables  音节别名 -> 规范音节（用于已切分的键，含 lue -> lüe 这类只能按音节判断的别名）
+    rewrites   连写查询的替换规则 [写法, 规范写法]，按顺序执行
+
+用法:
+    canonical_key('lv liang')  -> 'lü liang'
+    canonical_query('lu:se')   -> 'lüse'
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from build_syllable_automaton import SYLLABLES
+from dict_parser import RimeDictParser
+from trie_format import dict_source_path, iter_v3_entries, trie_asset_path
+
+ALIAS_VERSION = 1
+ALIAS_ASSET = "app/src/main/assets/trie/pinyin_aliases.json"
+CANONICAL_U = 'ü'
+# 其他写法：键盘输入的 v 与 Rime 风格的 u:
+U_SPELLINGS = ['v', 'u:']
+# l/n 后和零声母的 ü 保留两点；j/q/x/y 后只可能是 ü，规范写法省略两点
+U_KEEP_INITIALS = ('l', 'n', '')
+U_INITIALS = 'jqxy'
+
+
+def split_u(syllable: str, u: str) -> Optional[Tuple[str, str]]:
+    """以 l/n 或零声母加 u 开头的音节拆为 (声母, u 之后的部分)，否则返回None"""
+    for initial in U_KEEP_INITIALS:
+        if syllable.startswith(initial + u):
+            return initial, syllable[len(initial) + len(u):]
+    return None
+
+
+def key_syllable(syllable: str) -> str:
+    """音节表（键盘输入写法，ü 写作 v）中的音节转为规范写法：lv -> lü、nve -> nüe、van -> üan"""
+    parts = split_u(syllable, 'v')
+    return syllable if parts is None else parts[0] + CANONICAL_U + parts[1]
+
+
+def build_syllable_aliases(syllables: Sequence[str] = SYLLABLES) -> Dict[str, str]:
+    """由音节表生成音节别名：l/n 后和零声母的 ü 可写作 v、u:（lüe/nüe 还可写作 lue/nue），
+    j/q/x/y 后的 u 可写作 ü、v、u:；与规范写法的音节相同的写法不作为别名"""
+    known = {key_syllable(syllable) for syllable in syllables}
+    aliases: Dict[str, str] = {}
+    for canonical in sorted(known):
+        parts = split_u(canonical, CANONICAL_U)
+        variants = []
+        if parts is not None:
+            initial, rest = parts
+            variants = [initial + spelling + rest for spelling in U_SPELLINGS]
+            if initial and rest == 'e':
+                variants.append(initial + 'ue')
+        elif canonical[:1] in U_INITIALS and canonical[1:2] == 'u':
+            initial, rest = canonical[0], canonical[2:]
+            variants = [initial + spelling + rest for spelling in [CANONICAL_U] + U_SPELLINGS]
+        for variant in variants:
+            if variant not in known:
+                aliases[variant] = canonical
+    return dict(sorted(aliases.items()))
+
+
+def build_rewrites() -> List[Tuple[str, str]]:
+    """连写查询的替换规则：先把 v、u: 统一为 ü，再把 j/q/x/y 后的 ü 改为 u（没有以 j/q/x/y 结尾的音节，不会跨音节误改）"""
+    rewrites = [(spelling, CANONICAL_U) for spelling in U_SPELLINGS]
+    rewrites += [(initial + CANONICAL_U, initial + 'u') for initial in U_INITIALS]
+    return rewrites
+
+
+SYLLABLE_ALIASES = build_syllable_aliases()
+REWRITES = build_rewrites()
+# 与音节切分自动机的音节ID一一对应的规范写法
+KEY_SYLLABLES = [key_syllable(syllable) for syllable in SYLLABLES]
+
+
+def alias_table() -> Dict:
+    return {
+        'version': ALIAS_VERSION,
+        'canonical': CANONICAL_U,
+        'syllables': SYLLABLE_ALIASES,
+        'rewrites': [list(rule) for rule in REWRITES],
+    }
+
+
+def canonical_syllable(syllable: str, aliases: Optional[Dict[str, str]] = None) -> str:
+    return (SYLLABLE_ALIASES if aliases is None else aliases).get(syllable, syllable)
+
+
+def canonical_key(key: str, aliases: Optional[Dict[str, str]] = None) -> str:
+    """以空格分隔音节的拼音键转为规范写法，不在别名表中的音节原样保留"""
+    return ' '.join(canonical_syllable(syllable, aliases) for syllable in key.split(' '))
+
+
+def canonical_query(text: str, rewrites: Optional[Sequence[Sequence[str]]] = None) -> str:
+    """未切分（连写）的查询转为规范写法；lue/nue 需按音节判断，只在 canonical_key 中处理"""
+    for variant, canonical in (REWRITES if rewrites is None else rewrites):
+        text = text.replace(variant, canonical)
+    return text
+
+
+def canonical_trie_data(trie_data: Dict[str, List[Tuple[str, int]]]) -> Dict[str, List[Tuple[str, int]]]:
+    """旧的Trie文件中同一音节可能有几种写法：把键改为规范写法，合并后的候选按词频降序（重复词语由调用方去重）"""
+    result: Dict[str, List[Tuple[str, int]]] = {}
+    merged = set()
+    for key, words in trie_data.items():
+        canonical = canonical_key(key)
+        if canonical in result:
+            result[canonical] = result[canonical] + list(words)
+            merged.add(canonical)
+        else:
+            result[canonical] = words
+    for key in merged:
+        result[key].sort(key=lambda x: x[1], reverse=True)
+    return result
+
+
+def load_alias_table(path: str = ALIAS_ASSET) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_alias_table(path: str = ALIAS_ASSET) -> int:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = json.dumps(alias_table(), ensure_ascii=False, indent=1) + '\n'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    return len(data.encode('utf-8'))
+
+
+# ==================== 检查 ====================
+
+def scan_keys(keys) -> Dict:
+    """统计一组带空格的拼音键中需要改写的键，以及改写后与其他键合并的规范键"""
+    variants = Counter()
+    by_canonical = defaultdict(set)
+    for key in keys:
+        canonical = canonical_key(key)
+        by_canonical[canonical].add(key)
+        if canonical != key:
+            for syllable in key.split(' '):
+                if syllable in SYLLABLE_ALIASES:
+                    variants[syllable] += 1
+    merged = {canonical: sorted(spellings) for canonical, spellings in by_canonical.items() if len(spellings) > 1}
+    return {'rewritten': sum(variants.values()), 'variants': variants, 'merged': merged}
+
+
+def verify_alias_table(path: str) -> bool:
+    """检查别名资源文件与当前规则一致，且每个别名都能改写为音节表中的音节"""
+    print("=" * 60)
+    print("验证别名表...")
+    print("=" * 60)
+    ok = True
+    table = load_alias_table(path)
+    if table != alias_table():
+        print(f"❌ {path} 与当前别名规则不一致，请重新生成")
+        ok = False
+    known = set(KEY_SYLLABLES)
+    for variant, canonical in table['syllables'].items():
+        if canonical not in known or variant in known:
+            print(f"❌ 别名 {variant} -> {canonical} 无效")
+            ok = False
+        query = canonical_query(variant, table['rewrites'])
+        if variant[1:3] != 'ue' and query != canonical:
+            print(f"❌ 连写查询 {variant} 改写为 {query}，应为 {canonical}")
+            ok = False
+    for key, expected in [('lv se', 'lü se'), ('nu:e dai', 'nüe dai'), ('lue duo', 'lüe duo'), ('lü se', 'lü se'),
+                          ('xüe sheng', 'xue sheng'), ('jv zi', 'ju zi'), ('lu xian', 'lu xian')]:
+        if canonical_key(key, table['syllables']) != expected:
+            print(f"❌ {key} 应改写为 {expected}")
+            ok = False
+    print(f"{'✅' if ok else '❌'} 别名表：{len(table['syllables'])} 个音节别名，{len(table['rewrites'])} 条连写替换规则")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成 ü 写法的别名表，统计词典中的非规范写法")
+    parser.add_argument('--output', default=ALIAS_ASSET, help=f"别名表输出路径（默认 {ALIAS_ASSET}）")
+    parser.add_argument('--dicts', default='', help="逗号分隔的词典名，统计源文件与Trie文件中的非规范写法")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("神迹输入法 - ü 写法别名表生成工具")
+    print("=" * 60)
+    size = save_alias_table(args.output)
+    print(f"已写入别名表: {args.output}（{len(SYLLABLE_ALIASES)} 个音节别名，{size} 字节）")
+
+    for name in [name for name in args.dicts.split(',') if name]:
+        sources = []
+        if os.path.exists(dict_source_path(name)):
+            with RimeDictParser(dict_source_path(name)) as source:
+                keys = {' '.join(pinyin.lower().split()) for _, pinyin, _ in source.iter_entries()}
+            sources.append(('源文件', keys))
+        if os.path.exists(trie_asset_path(name)):
+            with open(trie_asset_path(name), 'rb') as f:
+                sources.append(('Trie', {key for key, _ in iter_v3_entries(f.read())}))
+        for label, keys in sources:
+            result = scan_keys(keys)
+            variants = ' '.join(f"{syllable}×{count}" for syllable, count in result['variants'].most_common())
+            print(f"{name} {label}: {len(keys)} 个键，需改写 {result['rewritten']} 处（{variants or '无'}），"
+                  f"改写后合并 {len(result['merged'])} 组重复键")
+            for canonical, spellings in list(result['merged'].items())[:5]:
+                print(f"  {canonical}: {' / '.join(spellings)}")
+
+    return 0 if verify_alias_table(args.output) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 候选可见性裁剪工具
+有些候选在所有能到达它的查询里都排不进前N个：同拼音的精确查询和它的每个前缀补全查询
+都有至少N个更靠前的词语。这些候选永远不会出现在候选栏的前几页，构建时可以直接删除。
+
+查询语义与 trie_reader 一致（均以去空格连写拼音查询）：
+    精确查询  连写形式等于查询串的全部拼音键
+    前缀查询  连写形式以查询串开头的全部拼音键（查询串为任意拼音键的非空前缀）
+同一词语在多个拼音键下只计最高词频。同词频的先后由存放顺序决定（trie_reader 的合并、
+应用内 PinyinTrie 的稳定排序），因此每个查询保留与第N名同词频的全部词语，而不只是前N个：
+设查询的第N名词频为t，词频（该查询内的最高值）不低于t的词语为该查询的可见词语。
+
+候选 (拼音键, 词语, 词频) 保留的条件：该词语是某个能到达该键的查询的可见词语。
+删除的候选所属词语在每个能到达它的查询里都严格低于第N名，可见词语的全部候选及其相对顺序保持不变，
+任何按词频降序、同词频按存放顺序排列的查询，前N名都不变。
+构建后把裁剪前后的文件分别用 trie_reader 的读取器打开，对全部精确查询和前缀查询逐一比较。
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from build_merged_trie import TRIE_TYPES
+from trie_format import load_v3_file, save_v3_file, trie_asset_path
+from trie_reader import normalize_pinyin, open_reader
+
+DEFAULT_TOP_N = 10
+DEFAULT_OUTPUT_DIR = "pruned_trie"
+
+READER_FORMATS = ['v3-mmap', 'v3-hashmap']
+
+WordList = List[Tuple[str, int]]
+TrieData = Dict[str, WordList]
+Visible = Dict[str, int]
+
+
+def visible_words(entries: Iterable[Tuple[str, int]], n: int) -> Visible:
+    """同一词语取最高词频，返回词频不低于第n名的全部词语 {词语: 最高词频}（含与第n名同词频的词语）"""
+    best: Visible = {}
+    for word, frequency in entries:
+        if word not in best or frequency > best[word]:
+            best[word] = frequency
+    if len(best) <= n:
+        return best
+    threshold = heapq.nlargest(n, best.values())[-1]
+    return {word: frequency for word, frequency in best.items() if frequency >= threshold}
+
+
+def query_tops(trie_data: TrieData, n: int) -> Tuple[Dict[str, Visible], Dict[str, Visible]]:
+    """计算全部精确查询和前缀查询的可见词语，返回 (精确查询结果, 前缀查询结果)
+
+    前缀查询自下而上合并：并集的可见词语一定是各部分的可见词语
+    （某词语在取得其最高词频的那一部分里不可见，说明该部分已有n个词语严格高于它，并集里也是如此）。
+    """
+    groups: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    for key, words in trie_data.items():
+        groups[normalize_pinyin(key)].extend(words)
+    exact = {normalized: visible_words(words, n) for normalized, words in groups.items()}
+
+    nodes: Set[str] = set()
+    for normalized in groups:
+        for length in range(1, len(normalized) + 1):
+            nodes.add(normalized[:length])
+
+    pending: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    for normalized, visible in exact.items():
+        pending[normalized].extend(visible.items())
+    prefix: Dict[str, Visible] = {}
+    for node in sorted(nodes, key=len, reverse=True):
+        visible = visible_words(pending.pop(node, ()), n)
+        prefix[node] = visible
+        if len(node) > 1:
+            pending[node[:-1]].extend(visible.items())
+    return exact, prefix
+
+
+def prune_trie_data(trie_data: TrieData, n: int) -> Tuple[TrieData, Dict]:
+    """删除在任何查询中都不可见的候选，保持拼音键和候选的原有顺序"""
+    exact, prefix = query_tops(trie_data, n)
+
+    pruned: TrieData = {}
+    stats = {'keys': len(trie_data), 'entries': 0, 'kept': 0, 'dropped_keys': 0,
+             'bytes_before': 8, 'bytes_after': 8, 'queries': len(exact) + len(prefix)}
+    for key, words in trie_data.items():
+        normalized = normalize_pinyin(key)
+        reaching = [exact[normalized]] + [prefix[normalized[:i]] for i in range(1, len(normalized) + 1)]
+        kept = [(word, frequency) for word, frequency in words
+                if any(word in visible for visible in reaching)]
+
+        key_bytes = len(key.encode('utf-8')) + 8
+        stats['entries'] += len(words)
+        stats['bytes_before'] += key_bytes + sum(8 + len(w.encode('utf-8')) for w, _ in words)
+        if kept:
+            pruned[key] = kept
+            stats['kept'] += len(kept)
+            stats['bytes_after'] += key_bytes + sum(8 + len(w.encode('utf-8')) for w, _ in kept)
+        else:
+            stats['dropped_keys'] += 1
+    return pruned, stats
+
+
+def brute_force_visible(trie_data: TrieData, query: str, n: int, exact: bool) -> Visible:
+    """直接扫描全部拼音键计算单个查询的可见词语，用于核对自下而上的合并"""
+    return visible_words((entry for key, words in trie_data.items()
+                          for entry in words
+                          if (normalize_pinyin(key) == query if exact else normalize_pinyin(key).startswith(query))), n)
+
+
+def reader_mismatches(original_path: str, pruned_path: str, format_name: str,
+                      exact_queries: List[str], prefix_queries: List[str], n: int) -> List[str]:
+    """用 trie_reader 的读取器分别打开裁剪前后的文件，返回前n名不一致的查询"""
+    before = open_reader(original_path, format_name)
+    after = open_reader(pruned_path, format_name)
+    try:
+        changed = [f"精确 {q}" for q in exact_queries if before.lookup(q, n) != after.lookup(q, n)]
+        changed += [f"前缀 {q}" for q in prefix_queries if before.search_prefix(q, n) != after.search_prefix(q, n)]
+        return changed
+    finally:
+        before.close()
+        after.close()
+
+
+def verify_pruning(original_path: str, original: TrieData, pruned: TrieData, n: int,
+                   brute_force_samples: int = 200) -> bool:
+    """用 trie_reader 证明裁剪前后每个精确查询和前缀查询的前n名完全一致；并抽样用暴力扫描核对可见词语的合并"""
+    print(f"\n正在验证裁剪结果（前 {n} 名）...")
+    exact, prefix = query_tops(original, n)
+    exact_queries, prefix_queries = sorted(exact), sorted(prefix)
+
+    rng = random.Random(7)
+    queries = rng.sample(prefix_queries, min(brute_force_samples, len(prefix_queries)))
+    mismatches = sum(1 for q in queries if brute_force_visible(original, q, n, exact=False) != prefix[q])
+    queries = rng.sample(exact_queries, min(brute_force_samples, len(exact_queries)))
+    mismatches += sum(1 for q in queries if brute_force_visible(original, q, n, exact=True) != exact[q])
+
+    print(f"  精确查询: {len(exact_queries)} 个，前缀查询: {len(prefix_queries)} 个")
+    ok = mismatches == 0
+    with tempfile.TemporaryDirectory() as tmp:
+        pruned_path = os.path.join(tmp, os.path.basename(original_path))
+        save_v3_file(pruned_path, pruned)
+        for format_name in READER_FORMATS:
+            changed = reader_mismatches(original_path, pruned_path, format_name, exact_queries, prefix_queries, n)
+            print(f"  {format_name}: 前{n}名发生变化的查询 {len(changed)} 个")
+            for q in changed[:5]:
+                print(f"  ❌ {q}")
+            ok = ok and not changed
+    print(f"  暴力扫描抽样核对不一致: {mismatches}")
+
+    print("✅ 所有查询的前N名保持不变" if ok else "❌ 裁剪改变了查询结果")
+    return ok
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="删除在任何查询中都排不进前N名的候选")
+    parser.add_argument('--dicts', default='place,people,poetry', help="要裁剪的词典，逗号分隔")
+    parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N, help="需要保持不变的前N名")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="输出目录（指定为资源目录即原地替换）")
+    parser.add_argument('--no-verify', action='store_true', help="跳过前N名不变的验证")
+    args = parser.parse_args()
+
+    names = [name for name in args.dicts.split(',') if name]
+    unknown = [name for name in names if name not in TRIE_TYPES]
+    if unknown:
+        print(f"❌ 未知词典: {', '.join(unknown)}")
+        return 1
+    if args.top_n < 1:
+        print("❌ --top-n 至少为1")
+        return 1
+
+    print("=" * 60)
+    print("神迹输入法 - 候选可见性裁剪工具")
+    print("=" * 60)
+    print(f"词典: {', '.join(names)}")
+    print(f"保持前 {args.top_n} 名不变，输出目录: {args.output_dir}")
+    print("=" * 60)
+
+    total_before = total_after = 0
+    for name in names:
+        path = trie_asset_path(name)
+        if not os.path.exists(path):
+            print(f"⚠️ 词典不存在，跳过: {name}")
+            continue
+
+        print(f"\n{name}: 正在计算候选可见性...")
+        original = load_v3_file(path)
+        pruned, stats = prune_trie_data(original, args.top_n)
+        dropped = stats['entries'] - stats['kept']
+        saved = stats['bytes_before'] - stats['bytes_after']
+        print(f"  查询数: {stats['queries']}，候选: {stats['entries']} -> {stats['kept']}（删除 {dropped}，"
+              f"{dropped / max(stats['entries'], 1):.1%}），删除空拼音键 {stats['dropped_keys']} 个")
+        print(f"  文件大小: {stats['bytes_before']} -> {stats['bytes_after']} 字节，节省 {saved} 字节"
+              f"（{saved / max(stats['bytes_before'], 1):.1%}）")
+
+        if not args.no_verify and not verify_pruning(path, original, pruned, args.top_n):
+            print(f"❌ {name} 验证失败，未写出文件")
+            return 1
+
+        output_path = os.path.join(args.output_dir, os.path.basename(path))
+        file_size = save_v3_file(output_path, pruned)
+        print(f"  已写出: {output_path}（{file_size} 字节）")
+        total_before += stats['bytes_before']
+        total_after += file_size
+
+    print("=" * 60)
+    print(f"✅ 裁剪完成！合计 {total_before} -> {total_after} 字节，节省 {total_before - total_after} 字节")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 本地候选查询服务
+用内存映射读取器加载预编译词典，通过Unix套接字或本机TCP提供JSON Lines查询，
+供QA、按键模拟器和桌面原型直接查询与应用相同的词典，无需Android设备。
+
+请求（每行一个JSON对象，id原样返回）:
+    {"id": 1, "op": "exact", "dict": "chars", "pinyin": "zhong", "limit": 10}
+    {"id": 2, "op": "prefix", "dict": "base", "pinyin": "beij", "limit": 10}
+    {"id": 3, "op": "federated", "dicts": ["chars", "base"], "pinyin": "beij", "limit": 10,
+     "prefix": true, "weights": {"base": 1.2}}
+    {"id": 4, "op": "batch", "queries": [{...}, {...}]}
+    {"id": 5, "op": "stats"}
+响应:
+    {"id": 1, "ok": true, "results": [["中", 915], ...]}
+    {"id": 3, "ok": true, "results": [{"word": "北京", "frequency": 900, "source": "base", "score": 1080.0}, ...]}
+    {"id": 9, "ok": false, "error": "..."}
+
+用法:
+    python query_server.py serve --socket /tmp/shenji.sock
+    python query_server.py serve --port 8765 --dicts chars,base,place,people
+    python query_server.py query --port 8765 '{"op": "prefix", "dict": "chars", "pinyin": "zh"}'
+    python query_server.py selftest
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from build_merged_trie import TRIE_TYPES
+from trie_format import iter_v3_entries, trie_asset_path
+from trie_reader import SortedKeyReader, TrieReader, detect_formats, normalize_pinyin, open_reader
+
+# 联合查询时各词典的默认权重（词频 × 权重 排序），参照InputStrategy中各查询策略的优先级
+DEFAULT_WEIGHTS = {
+    'chars': 1.0,
+    'base': 0.9,
+    'correlation': 0.9,
+    'associational': 0.8,
+    'place': 0.6,
+    'people': 0.6,
+    'poetry': 0.4,
+    'corrections': 0.5,
+    'compatible': 0.5,
+}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 1000
+DEFAULT_CACHE_SIZE = 20000
+# 单个请求行的最大字节数（asyncio流的缓冲上限），超过时回复错误并关闭连接
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class LRUCache:
+    """查询结果LRU缓存"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def request_dict_names(value) -> Optional[List[str]]:
+    """federated请求的dicts：省略时为None（查询全部已加载词典），否则必须是词典名字符串列表"""
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(name, str) and name for name in value):
+        raise ValueError("dicts必须是词典名字符串列表")
+    return value
+
+
+def request_weights(value) -> Dict[str, float]:
+    """federated请求的weights：必须是 {词典名: 数值} 对象"""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError("weights必须是 {词典名: 权重} 对象")
+    weights = {}
+    for name, weight in value.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+            raise ValueError(f"词典 {name} 的权重必须是数值")
+        weights[name] = float(weight)
+    return weights
+
+
+class QueryService:
+    """查询逻辑，与传输层无关"""
+
+    def __init__(self, readers: Dict[str, TrieReader], weights: Optional[Dict[str, float]] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        self.readers = readers
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        self.cache = LRUCache(cache_size)
+        self.queries = 0
+        self.started = time.time()
+
+    def close(self):
+        for reader in self.readers.values():
+            reader.close()
+
+    def _reader(self, name: str) -> TrieReader:
+        reader = self.readers.get(name)
+        if reader is None:
+            raise ValueError(f"词典未加载: {name}（已加载: {', '.join(self.readers)}）")
+        return reader
+
+    def _query(self, name: str, pinyin: str, limit: int, prefix: bool) -> List[Tuple[str, int]]:
+        reader = self._reader(name)
+        if prefix:
+            return reader.search_prefix(pinyin, limit)
+        return reader.lookup(pinyin, limit)
+
+    def federated(self, names: List[str], pinyin: str, limit: int, prefix: bool,
+                  weights: Dict[str, float]) -> List[Dict]:
+        """多词典联合查询：每个词典取前limit个候选，按 词频×权重 合并，同一词语保留得分最高的来源"""
+        best: Dict[str, Dict] = {}
+        for name in names:
+            weight = weights.get(name, self.weights.get(name, 1.0))
+            for word, frequency in self._query(name, pinyin, limit, prefix):
+                score = frequency * weight
+                current = best.get(word)
+                if current is None or score > current['score']:
+                    best[word] = {'word': word, 'frequency': frequency, 'source': name, 'score': score}
+        ranked = sorted(best.values(), key=lambda x: (-x['score'], TRIE_TYPES.index(x['source'])
+                                                      if x['source'] in TRIE_TYPES else len(TRIE_TYPES)))
+        return ranked[:limit]
+
+    def handle(self, request: Dict) -> Dict:
+        """处理一个请求对象，返回响应对象（不抛出异常）"""
+        response = {'id': request.get('id')} if 'id' in request else {}
+        try:
+            results = self._dispatch(request)
+            response['ok'] = True
+            response['results'] = results
+        except (ValueError, TypeError, KeyError) as e:
+            response['ok'] = False
+            response['error'] = str(e)
+        return response
+
+    def _dispatch(self, request: Dict):
+        op = request.get('op')
+        if op == 'batch':
+            queries = request.get('queries')
+            if not isinstance(queries, list):
+                raise ValueError("batch请求需要queries列表")
+            # 响应列表与queries逐项对应，不是对象的项返回错误响应
+            return [self.handle(query) if isinstance(query, dict)
+                    else {'ok': False, 'error': "batch中的查询必须是JSON对象"} for query in queries]
+        if op == 'stats':
+            return self.stats()
+        if op == 'ping':
+            return 'pong'
+        if op not in ('exact', 'prefix', 'federated'):
+            raise ValueError(f"未知操作: {op}")
+
+        pinyin = normalize_pinyin(str(request.get('pinyin', '')))
+        if not pinyin:
+            raise ValueError("缺少pinyin")
+        limit = max(1, min(int(request.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+        self.queries += 1
+
+        if op == 'federated':
+            names = request_dict_names(request.get('dicts')) or list(self.readers)
+            weights = request_weights(request.get('weights'))
+            prefix = bool(request.get('prefix', True))
+            key = (op, tuple(names), pinyin, limit, prefix, tuple(sorted(weights.items())))
+            cached = self.cache.get(key)
+            if cached is None:
+                cached = self.federated(names, pinyin, limit, prefix, weights)
+                self.cache.put(key, cached)
+            return cached
+
+        name = request.get('dict')
+        if not name or not isinstance(name, str):
+            raise ValueError("缺少dict或dict不是字符串")
+        key = (op, name, pinyin, limit)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = [list(item) for item in self._query(name, pinyin, limit, op == 'prefix')]
+            self.cache.put(key, cached)
+        return cached
+
+    def stats(self) -> Dict:
+        return {
+            'dicts': {name: {'format': r.format_name, 'load_ms': round(r.load_ms, 2)}
+                      for name, r in self.readers.items()},
+            'queries': self.queries,
+            'cache_size': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'uptime_s': round(time.time() - self.started, 1),
+        }
+
+
+def load_readers(dict_names: List[str], merged_path: Optional[str] = None,
+                 format_name: str = 'v3-mmap') -> Dict[str, TrieReader]:
+    """加载词典读取器；指定合并索引时每个来源词典共用该文件"""
+    readers = {}
+    for name in dict_names:
+        if merged_path:
+            path, kwargs, fmt = merged_path, {'source': name}, None
+        else:
+            path, kwargs, fmt = trie_asset_path(name), {}, format_name
+        if not os.path.exists(path):
+            print(f"⚠️ 文件不存在，跳过: {path}")
+            continue
+        if fmt is not None and fmt not in detect_formats(path):
+            fmt = None
+        try:
+            readers[name] = open_reader(path, fmt, **kwargs)
+        except ValueError as e:
+            print(f"⚠️ {name}: {e}")
+    return readers
+
+
+# ==================== 传输层 ====================
+
+async def handle_connection(service: QueryService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """逐行读取请求并按顺序写回响应"""
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # 行超过缓冲上限：超出部分无法可靠地与下一个请求分开，回复错误后关闭连接
+                error = {'ok': False, 'error': "无效请求: 请求行超过缓冲上限"}
+                writer.write(json.dumps(error, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+                break
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("请求必须是JSON对象")
+                response = service.handle(request)
+            except ValueError as e:
+                response = {'ok': False, 'error': f"无效请求: {e}"}
+            writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            await writer.drain()
+    except (ConnectionResetError, BrokenPipeError, asyncio.CancelledError):
+        # 客户端断开或服务关闭
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(service: QueryService, socket_path: Optional[str] = None,
+                       host: str = '127.0.0.1', port: int = 0,
+                       limit: int = MAX_LINE_BYTES) -> asyncio.AbstractServer:
+    def callback(r, w):
+        return handle_connection(service, r, w)
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return await asyncio.start_unix_server(callback, path=socket_path, limit=limit)
+    return await asyncio.start_server(callback, host=host, port=port, limit=limit)
+
+
+async def open_client(socket_path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0):
+    if socket_path:
+        return await asyncio.open_unix_connection(socket_path, limit=MAX_LINE_BYTES)
+    return await asyncio.open_connection(host, port, limit=MAX_LINE_BYTES)
+
+
+async def send_requests(requests: List[Dict], socket_path: Optional[str] = None,
+                        host: str = '127.0.0.1', port: int = 0) -> List[Dict]:
+    """发送一组请求（流水线方式）并按顺序读取响应"""
+    reader, writer = await open_client(socket_path, host, port)
+    try:
+        for request in requests:
+            writer.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        await writer.drain()
+        return [json.loads(await reader.readline()) for _ in requests]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+# ==================== 自检 ====================
+
+def verify_server(service: QueryService, sample_keys: int = 300) -> bool:
+    """启动临时Unix套接字服务，比较服务返回与直接调用读取器的结果，并测量吞吐"""
+    print("\n正在验证查询服务...")
+    cases = []
+    for name, reader in service.readers.items():
+        if isinstance(reader, SortedKeyReader):
+            keys = [reader.normalized_key(i) for i in range(reader.key_count())]
+        else:
+            with open(reader.path, 'rb') as f:
+                keys = sorted({normalize_pinyin(key) for key, _ in iter_v3_entries(f.read())})
+        step = max(1, len(keys) // sample_keys)
+        for key in keys[::step][:sample_keys]:
+            cases.append((name, key))
+            cases.append((name, key[:2]))
+    if not cases:
+        print("❌ 没有可用于验证的词典")
+        return False
+
+    requests = []
+    expected = []
+    for i, (name, key) in enumerate(cases):
+        reader = service.readers[name]
+        requests.append({'id': 2 * i, 'op': 'exact', 'dict': name, 'pinyin': key})
+        expected.append([list(x) for x in reader.lookup(key, DEFAULT_LIMIT)])
+        requests.append({'id': 2 * i + 1, 'op': 'prefix', 'dict': name, 'pinyin': key})
+        expected.append([list(x) for x in reader.search_prefix(key, DEFAULT_LIMIT)])
+
+    names = list(service.readers)
+    federated = {'id': 'f', 'op': 'federated', 'dicts': names, 'pinyin': cases[0][1], 'limit': 20}
+    batch = {'id': 'b', 'op': 'batch', 'queries': requests[:10] + ['not an object']}
+    # 格式错误的请求应返回错误响应，连接保持可用
+    invalid = [{'op': 'nope'},
+               {'op': 'federated', 'pinyin': 'a', 'weights': [1]},
+               {'op': 'federated', 'pinyin': 'a', 'weights': {names[0]: 'x'}},
+               {'op': 'federated', 'pinyin': 'a', 'dicts': names[0]},
+               {'op': 'exact', 'pinyin': 'a', 'dict': [names[0]]}]
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, 'query.sock')
+            server = await start_server(service, socket_path=socket_path)
+            async with server:
+                start = time.perf_counter()
+                responses = await send_requests(requests, socket_path=socket_path)
+                elapsed = time.perf_counter() - start
+                extra = await send_requests([federated, batch, {'op': 'stats'}] + invalid + [{'op': 'ping'}],
+                                            socket_path=socket_path)
+            # 超过缓冲上限的请求行：应收到错误响应，随后连接被关闭
+            small_path = os.path.join(tmp, 'small.sock')
+            server = await start_server(service, socket_path=small_path, limit=4096)
+            async with server:
+                reader, writer = await open_client(small_path)
+                writer.write(b'{"op": "ping", "pad": "' + b'x' * 65536 + b'"}\n')
+                await writer.drain()
+                oversized = json.loads(await reader.readline())
+                closed = await reader.read() == b''
+                writer.close()
+            return responses, elapsed, extra, oversized.get('ok') is False and closed
+
+    responses, elapsed, extra, oversized_ok = asyncio.run(run())
+
+    mismatches = 0
+    for request, response, want in zip(requests, responses, expected):
+        if response.get('id') != request['id'] or not response.get('ok') or response['results'] != want:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  ❌ 结果不一致: {request} -> {response.get('results', response.get('error'))[:5]}")
+
+    fed_results = extra[0].get('results') or []
+    fed_ok = extra[0].get('ok') and all(
+        fed_results[i]['score'] >= fed_results[i + 1]['score'] for i in range(len(fed_results) - 1))
+    batch_results = extra[1].get('results') or []
+    batch_ok = (extra[1].get('ok') and len(batch_results) == 11
+                and [r.get('results') for r in batch_results[:10]] == expected[:10]
+                and batch_results[10].get('ok') is False)
+    error_ok = all(response.get('ok') is False for response in extra[3:-1]) and extra[-1].get('results') == 'pong'
+
+    print(f"  请求数: {len(requests)}，耗时 {elapsed * 1000:.1f} ms，约 {len(requests) / elapsed:.0f} 次/秒")
+    print(f"  结果不一致: {mismatches}")
+    print(f"  联合查询: {'✅' if fed_ok else '❌'} ({len(fed_results)} 个候选)")
+    print(f"  批量查询: {'✅' if batch_ok else '❌'}")
+    print(f"  错误请求: {'✅' if error_ok else '❌'} ({len(invalid)} 个)")
+    print(f"  超长请求行: {'✅' if oversized_ok else '❌'}")
+    print(f"  缓存: {extra[2]['results']['cache_hits']} 命中 / {extra[2]['results']['cache_misses']} 未命中")
+
+    ok = mismatches == 0 and fed_ok and batch_ok and error_ok and oversized_ok
+    print("✅ 查询服务验证通过" if ok else "❌ 查询服务验证失败")
+    return ok
+
+
+# ==================== 命令行 ====================
+
+def parse_weights(text: Optional[str]) -> Dict[str, float]:
+    weights = {}
+    for item in (text or '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            weights[name.strip()] = float(value)
+    return weights
+
+
+def run_serve(args) -> int:
+    dict_names = [d for d in args.dicts.split(',') if d]
+    readers = load_readers(dict_names, args.merged, args.format)
+    if not readers:
+        print("❌ 没有可加载的词典")
+        return 1
+
+    service = QueryService(readers, parse_weights(args.weights), args.cache_size)
+    print("=" * 60)
+    print("神迹输入法 - 本地候选查询服务")
+    print("=" * 60)
+    for name, reader in readers.items():
+        print(f"  {name}: {reader.format_name}，加载 {reader.load_ms:.1f} ms")
+
+    async def serve():
+        server = await start_server(service, args.socket, args.host, args.port)
+        where = args.socket or ', '.join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        print(f"✅ 正在监听 {where}（Ctrl+C 退出）")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\n已停止")
+    finally:
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+def run_query(args) -> int:
+    requests = [json.loads(text) for text in args.requests]
+    responses = asyncio.run(send_requests(requests, args.socket, args.host, args.port))
+    for response in responses:
+        print(json.dumps(response, ensure_ascii=False))
+    return 0 if all(r.get('ok') for r in responses) else 1
+
+
+def run_selftest(args) -> int:
+    dict_names = [d for d in args.dicts.split(',') if d]
+    readers = load_readers(dict_names, args.merged, args.format)
+    if not readers:
+        print("❌ 没有可加载的词典")
+        return 1
+    service = QueryService(readers)
+    try:
+        return 0 if verify_server(service) else 1
+    finally:
+        service.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地候选查询服务")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_dict_options(p):
+        p.add_argument('--dicts', default=','.join(TRIE_TYPES), help="加载的词典，逗号分隔（不存在的文件会跳过）")
+        p.add_argument('--merged', help="从合并索引文件按来源加载词典")
+        p.add_argument('--format', default='v3-mmap', help="版本3文件使用的读取格式")
+
+    def add_address_options(p):
+        p.add_argument('--socket', help="Unix套接字路径（优先于TCP）")
+        p.add_argument('--host', default='127.0.0.1', help="TCP监听地址")
+        p.add_argument('--port', type=int, default=8765, help="TCP端口")
+
+    serve = sub.add_parser('serve', help="启动查询服务")
+    add_dict_options(serve)
+    add_address_options(serve)
+    serve.add_argument('--weights', help="联合查询权重覆盖，如 base=1.2,place=0.8")
+    serve.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help="LRU缓存条目数，0表示关闭")
+
+    query = sub.add_parser('query', help="向运行中的服务发送请求")
+    add_address_options(query)
+    query.add_argument('requests', nargs='+', help="JSON请求，每个参数一个")
+
+    selftest = sub.add_parser('selftest', help="在临时套接字上启动服务并核对结果")
+    add_dict_options(selftest)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        return run_serve(args)
+    if args.command == 'query':
+        return run_query(args)
+    return run_selftest(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 双拼方案
+双拼每个音节固定两键：第一键是声母（zh/ch/sh 各占一个键），第二键是韵母；
+零声母音节按方案单独规定（如小鹤 ang -> ah，微软 ang -> oh）。
+
+方案表是资源目录下的JSON数据文件（app/src/main/assets/shuangpin/<方案>.json）：
+    name          方案显示名
+    initials      双字母声母的键位，单字母声母就是本身
+    finals        韵母键位，ü 按词典习惯写作 v（lv、nve）
+    zero_initial  零声母音节的完整两键编码
+新增方案只需增加数据文件。编码结果可能含字母以外的键（微软双拼 ing 为 ';'）。
+"""
+
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+SCHEME_DIR = "app/src/main/assets/shuangpin"
+
+INITIALS = ['zh', 'ch', 'sh'] + list('bpmfdtnlgkhjqxrzcsyw')
+
+
+def scheme_path(scheme: str) -> str:
+    return os.path.join(SCHEME_DIR, f"{scheme}.json")
+
+
+def available_schemes() -> List[str]:
+    if not os.path.isdir(SCHEME_DIR):
+        return []
+    return sorted(name[:-5] for name in os.listdir(SCHEME_DIR) if name.endswith('.json'))
+
+
+def split_syllable(syllable: str):
+    """拆成 (声母, 韵母)，零声母音节的声母为空串"""
+    for initial in INITIALS:
+        if syllable.startswith(initial) and len(syllable) > len(initial):
+            return initial, syllable[len(initial):]
+    return '', syllable
+
+
+class ShuangpinScheme:
+    """双拼方案：全拼音节与两键编码的对应"""
+
+    def __init__(self, scheme: str, table: Dict):
+        self.scheme = scheme
+        self.name = table.get('name', scheme)
+        self.initials = table.get('initials', {})
+        self.finals = table['finals']
+        self.zero_initial = table.get('zero_initial', {})
+
+    def syllable_code(self, syllable: str) -> Optional[str]:
+        """单个音节的两键编码，方案无法表示的音节返回None；词典中写作 ü 的音节按 v 处理"""
+        syllable = syllable.replace('ü', 'v')
+        if syllable in self.zero_initial:
+            return self.zero_initial[syllable]
+        initial, final = split_syllable(syllable)
+        if not initial or final not in self.finals:
+            return None
+        return self.initials.get(initial, initial) + self.finals[final]
+
+    def encode_key(self, key: str) -> Optional[str]:
+        """带空格的拼音键转为双拼编码，含无法表示的音节时返回None"""
+        codes = []
+        for syllable in key.split(' '):
+            code = self.syllable_code(syllable)
+            if code is None:
+                return None
+            codes.append(code)
+        return ''.join(codes)
+
+    def check(self, syllables: List[str]) -> Dict:
+        """统计音节表中无法编码的音节和编码相同的音节组"""
+        unencodable = []
+        by_code = defaultdict(list)
+        for syllable in syllables:
+            code = self.syllable_code(syllable)
+            if code is None:
+                unencodable.append(syllable)
+            else:
+                by_code[code].append(syllable)
+        shared = {code: group for code, group in by_code.items() if len(group) > 1}
+        return {'unencodable': unencodable, 'shared': shared}
+
+
+def load_scheme(scheme: str) -> ShuangpinScheme:
+    """按方案名（资源目录下的数据文件）或JSON文件路径加载方案"""
+    path = scheme if scheme.endswith('.json') else scheme_path(scheme)
+    with open(path, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+    name = os.path.splitext(os.path.basename(path))[0]
+    codes = list(table['finals'].values()) + list(table.get('initials', {}).values())
+    if any(len(code) != 1 for code in codes) or any(len(code) != 2 for code in table.get('zero_initial', {}).values()):
+        raise ValueError(f"双拼方案 {name}：声母、韵母应为单键，零声母音节应为两键")
+    return ShuangpinScheme(name, table)
+
+
+def main():
+    """列出各方案对音节表的覆盖情况，或把拼音转为双拼编码"""
+    from build_syllable_automaton import SYLLABLES
+
+    schemes = available_schemes()
+    if not schemes:
+        print(f"❌ 未找到双拼方案数据文件: {SCHEME_DIR}")
+        return 1
+    words = sys.argv[1:]
+    for scheme in schemes:
+        table = load_scheme(scheme)
+        if words:
+            codes = [table.encode_key(word.replace("'", ' ')) or '?' for word in words]
+            print(f"{table.name}({scheme}): {' '.join(codes)}")
+            continue
+        result = table.check(SYLLABLES)
+        print(f"{table.name}({scheme}): 音节表 {len(SYLLABLES)} 个，无法编码 {len(result['unencodable'])} 个"
+              f"（{' '.join(result['unencodable'])}）")
+        for code, group in sorted(result['shared'].items()):
+            print(f"  ⚠️ {code}: {' / '.join(group)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
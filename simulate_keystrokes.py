@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 按键回放模拟器
+把打字会话文件逐键回放到Python读取器上，记录每次按键后候选查询的耗时分布，
+按词典和文件格式分别统计p50/p95/p99，用用户能感受到的指标比较各种格式。
+
+会话文件格式：每行一次上屏前的按键序列，字母逐个输入，'<' 表示退格，
+空格和 ' 作为音节分隔被忽略，# 开头为注释。例如：
+    zhongguo
+    beijinh<g
+    xi'an
+
+用法:
+    python simulate_keystrokes.py generate --dicts chars,place --count 2000 --output session.txt
+    python simulate_keystrokes.py replay session.txt --dicts chars,place --formats v3-hashmap,v3-mmap
+"""
+
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from pinyin_alias import CANONICAL_U
+from trie_format import iter_v3_entries, trie_asset_path
+from trie_reader import detect_formats, normalize_pinyin, open_reader
+
+BACKSPACE = '<'
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+# ==================== 会话生成 ====================
+
+def key_weights(dict_names: List[str]) -> Tuple[List[str], List[int]]:
+    """统计各拼音的词频总量，作为会话抽样权重"""
+    weights: Dict[str, int] = {}
+    for name in dict_names:
+        path = trie_asset_path(name)
+        if not os.path.exists(path):
+            print(f"⚠️ 词典文件不存在，跳过: {path}")
+            continue
+        with open(path, 'rb') as f:
+            for key, words in iter_v3_entries(f.read()):
+                weights[key] = weights.get(key, 0) + sum(max(freq, 1) for _, freq in words)
+    keys = sorted(weights)
+    return keys, [weights[k] for k in keys]
+
+
+def typed_form(key: str) -> str:
+    """拼音键在键盘上的输入写法：连写，ü 按 v 输入（回放时经别名改写回 ü，与应用的 v -> ü 处理一致）"""
+    return normalize_pinyin(key).replace(CANONICAL_U, 'v')
+
+
+def generate_session(dict_names: List[str], count: int, typo_rate: float, seed: int) -> List[str]:
+    """按词频抽样拼音，并以typo_rate的概率插入一次误按加退格"""
+    keys, weights = key_weights(dict_names)
+    if not keys:
+        return []
+
+    rng = random.Random(seed)
+    cumulative = []
+    total = 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    lines = []
+    for _ in range(count):
+        key = keys[bisect.bisect_right(cumulative, rng.random() * total)]
+        typed = typed_form(key)
+        if typed and rng.random() < typo_rate:
+            pos = rng.randrange(len(typed))
+            typed = typed[:pos] + rng.choice(LETTERS) + BACKSPACE + typed[pos:]
+        lines.append(typed)
+    return lines
+
+
+# ==================== 会话回放 ====================
+
+def load_session(path: str) -> List[str]:
+    lines = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                lines.append(line)
+    return lines
+
+
+def keystroke_buffers(line: str) -> List[str]:
+    """展开一行按键序列，返回每次按键后的输入缓冲区（空缓冲区不查询）"""
+    buffers = []
+    buffer = ''
+    for char in line:
+        if char == BACKSPACE:
+            buffer = buffer[:-1]
+        elif char in " '":
+            continue
+        else:
+            buffer += char.lower()
+        if buffer:
+            buffers.append(buffer)
+    return buffers
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def replay(reader, session: List[str], limit: int) -> Dict:
+    """回放会话，记录每次按键的查询耗时（微秒）"""
+    latencies = []
+    empty = 0
+    for line in session:
+        for buffer in keystroke_buffers(line):
+            start = time.perf_counter_ns()
+            result = reader.search_prefix(buffer, limit)
+            latencies.append((time.perf_counter_ns() - start) / 1000)
+            if not result:
+                empty += 1
+
+    latencies.sort()
+    return {
+        'keystrokes': len(latencies),
+        'empty_results': empty,
+        'load_ms': round(reader.load_ms, 2),
+        'mean_us': round(sum(latencies) / len(latencies), 1) if latencies else 0,
+        'p50_us': round(percentile(latencies, 50), 1),
+        'p95_us': round(percentile(latencies, 95), 1),
+        'p99_us': round(percentile(latencies, 99), 1),
+        'max_us': round(latencies[-1], 1) if latencies else 0,
+    }
+
+
+def run_replay(args) -> int:
+    session = load_session(args.session)
+    if not session:
+        print(f"❌ 会话文件为空: {args.session}")
+        return 1
+
+    dict_names = [d for d in args.dicts.split(',') if d]
+    wanted_formats = [f for f in args.formats.split(',') if f] if args.formats else None
+
+    print("=" * 60)
+    print("神迹输入法 - 按键回放模拟器")
+    print("=" * 60)
+    print(f"会话文件: {args.session} ({len(session)} 次上屏)")
+    print(f"词典: {', '.join(dict_names)}")
+    print("=" * 60)
+
+    results = []
+    targets = [(name, trie_asset_path(name), {}) for name in dict_names]
+    if args.merged:
+        # 合并索引按来源词典分别统计，便于与独立文件逐项对比
+        targets += [(name, args.merged, {'source': name}) for name in dict_names]
+
+    for name, path, kwargs in targets:
+        if not os.path.exists(path):
+            print(f"⚠️ 文件不存在，跳过: {path}")
+            continue
+        for format_name in detect_formats(path):
+            if wanted_formats and format_name not in wanted_formats:
+                continue
+            try:
+                reader = open_reader(path, format_name, **kwargs)
+            except ValueError as e:
+                print(f"⚠️ {name}/{format_name}: {e}")
+                continue
+            try:
+                stats = replay(reader, session, args.limit)
+            finally:
+                reader.close()
+            stats.update({'dict': name, 'format': format_name, 'file_bytes': os.path.getsize(path)})
+            results.append(stats)
+
+    if not results:
+        print("❌ 没有可回放的词典文件")
+        return 1
+
+    header = f"{'词典':<14}{'格式':<12}{'加载ms':>10}{'按键数':>8}{'p50us':>9}{'p95us':>9}{'p99us':>9}{'最大us':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['dict']:<14}{r['format']:<12}{r['load_ms']:>10}{r['keystrokes']:>8}"
+              f"{r['p50_us']:>9}{r['p95_us']:>9}{r['p99_us']:>9}{r['max_us']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n📁 JSON报告: {args.json_path}")
+    return 0
+
+
+def run_generate(args) -> int:
+    dict_names = [d for d in args.dicts.split(',') if d]
+    lines = generate_session(dict_names, args.count, args.typo_rate, args.seed)
+    if not lines:
+        print("❌ 没有可用于抽样的词典")
+        return 1
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(f"# 合成会话: {','.join(dict_names)}, {len(lines)} 次上屏, 误按率 {args.typo_rate}\n")
+        for line in lines:
+            f.write(line + '\n')
+    print(f"✅ 已生成 {len(lines)} 行会话: {args.output}")
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="按键回放模拟器")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help="按词典词频生成合成会话")
+    gen.add_argument('--dicts', default='chars,place,people', help="抽样词典，逗号分隔")
+    gen.add_argument('--count', type=int, default=1000, help="上屏次数")
+    gen.add_argument('--typo-rate', type=float, default=0.1, help="每次上屏插入误按加退格的概率")
+    gen.add_argument('--seed', type=int, default=42, help="随机种子")
+    gen.add_argument('--output', default='session.txt', help="输出会话文件")
+
+    rep = sub.add_parser('replay', help="回放会话并统计按键查询耗时")
+    rep.add_argument('session', help="会话文件")
+    rep.add_argument('--dicts', default='chars,place,people', help="回放的词典，逗号分隔")
+    rep.add_argument('--formats', help="只测试指定格式，逗号分隔，默认测试文件支持的全部格式")
+    rep.add_argument('--merged', help="同时按来源回放该合并索引文件")
+    rep.add_argument('--limit', type=int, default=10, help="每次查询的候选数")
+    rep.add_argument('--json', dest='json_path', help="把结果写入JSON文件")
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        return run_generate(args)
+    return run_replay(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
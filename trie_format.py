@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 预编译资源通用二进制容器
+为新增的各类预编译资源（联想表、合并索引等）提供统一的分段文件格式，
+以及字符串池、版本3 Trie文件读取等公共工具。
+
+容器布局（LITTLE_ENDIAN）：
+    magic(4) 'SJTD' | 格式版本(i32) | 分段数(i32)
+    分段目录：每段 标签(4字节ASCII) | 偏移(u32) | 长度(u32)
+    分段数据：按8字节对齐依次存放
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTAINER_MAGIC = b'SJTD'
+CONTAINER_VERSION = 1
+V3_VERSION = 3
+
+_HEADER = struct.Struct('<4sii')
+_SECTION = struct.Struct('<4sII')
+_ALIGN = 8
+
+
+def _padding(length: int) -> int:
+    return (-length) % _ALIGN
+
+
+def write_container(output_path: str, sections: Sequence[Tuple[str, bytes]]) -> int:
+    """把若干分段写入容器文件，返回文件大小"""
+    directory_size = _HEADER.size + _SECTION.size * len(sections)
+    offset = directory_size + _padding(directory_size)
+
+    entries = []
+    for tag, payload in sections:
+        tag_bytes = tag.encode('ascii')
+        if len(tag_bytes) != 4:
+            raise ValueError(f"分段标签必须为4个字符: {tag}")
+        entries.append((tag_bytes, offset, len(payload)))
+        offset += len(payload) + _padding(len(payload))
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(output_path, 'wb') as f:
+        f.write(_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, len(sections)))
+        for entry in entries:
+            f.write(_SECTION.pack(*entry))
+        f.write(b'\0' * _padding(directory_size))
+        for _, payload in sections:
+            f.write(payload)
+            f.write(b'\0' * _padding(len(payload)))
+
+    return os.path.getsize(output_path)
+
+
+def is_container(buf) -> bool:
+    """判断缓冲区是否为分段容器（版本3文件以整数3开头）"""
+    return len(buf) >= 4 and bytes(buf[:4]) == CONTAINER_MAGIC
+
+
+def read_container(buf) -> Dict[str, memoryview]:
+    """解析容器目录，返回 标签 -> 分段数据视图（零拷贝）"""
+    view = memoryview(buf)
+    magic, version, count = _HEADER.unpack_from(view, 0)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("不是有效的预编译资源容器")
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"不支持的容器版本: {version}")
+
+    sections = {}
+    for i in range(count):
+        tag, offset, length = _SECTION.unpack_from(view, _HEADER.size + i * _SECTION.size)
+        sections[tag.decode('ascii')] = view[offset:offset + length]
+    return sections
+
+
+class MappedFile:
+    """只读内存映射文件，支持with语句"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        try:
+            self.buffer.close()
+        except BufferError:
+            # 读取器仍持有零拷贝视图时无法立即解除映射，交由垃圾回收释放
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==================== 数组与字符串池 ====================
+
+def pack_array(typecode: str, values) -> bytes:
+    """把整数序列打包为小端数组字节"""
+    arr = array(typecode, values)
+    if arr.itemsize > 1 and struct.pack('=H', 1) != struct.pack('<H', 1):
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def view_array(section: memoryview, typecode: str) -> memoryview:
+    """把分段视图转换为定长整数数组视图（零拷贝，仅支持小端主机）"""
+    return section.cast(typecode)
+
+
+def pack_json(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def unpack_json(section: memoryview):
+    return json.loads(bytes(section).decode('utf-8'))
+
+
+def pack_string_pool(strings: Sequence[str]) -> bytes:
+    """字符串池：数量(u32) | 偏移表(u32 × (n+1)) | UTF-8数据"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = [0]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return struct.pack('<I', len(encoded)) + pack_array('I', offsets) + b''.join(encoded)
+
+
+class StringPool:
+    """字符串池读取器，按下标零拷贝访问；若写入时已排序可二分查找"""
+
+    def __init__(self, section: memoryview):
+        count = struct.unpack_from('<I', section, 0)[0]
+        table_end = 4 + 4 * (count + 1)
+        self.count = count
+        self.offsets = section[4:table_end].cast('I')
+        self.data = section[table_end:]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def raw(self, index: int) -> bytes:
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]])
+
+    def __getitem__(self, index: int) -> str:
+        return self.raw(index).decode('utf-8')
+
+    def find(self, text: str) -> int:
+        """在按UTF-8字节序排序的池中二分查找，未找到返回-1"""
+        target = text.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.raw(lo) == target:
+            return lo
+        return -1
+
+
+# ==================== 变长整数 ====================
+
+def append_varint(out: bytearray, value: int):
+    """无符号LEB128：每字节低7位为数据，最高位表示后面还有字节"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(buf, pos: int) -> Tuple[int, int]:
+    """读取一个无符号LEB128，返回 (值, 下一个位置)"""
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+# ==================== 布隆过滤器 ====================
+
+FNV64_OFFSET = 0xCBF29CE484222325
+FNV64_PRIME = 0x100000001B3
+_MASK64 = (1 << 64) - 1
+
+
+def fnv1a_64(data: bytes) -> int:
+    """FNV-1a 64位哈希，应用侧可按同样规则实现"""
+    h = FNV64_OFFSET
+    for byte in data:
+        h = ((h ^ byte) * FNV64_PRIME) & _MASK64
+    return h
+
+
+class BloomFilter:
+    """布隆过滤器：k个位置由一次FNV-1a哈希的高低32位做双重哈希 h1 + i*h2 得到，
+    位数组按小端字节存放（第n位在第n//8字节的第n%8位）"""
+
+    def __init__(self, bits, bit_count: int, hash_count: int):
+        self.bits = bits
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+
+    @staticmethod
+    def parameters(count: int, fpr: float) -> Tuple[int, int]:
+        """按元素数和目标误判率计算 (位数, 哈希数)，位数向上取整到64的倍数"""
+        count = max(count, 1)
+        bit_count = math.ceil(-count * math.log(fpr) / (math.log(2) ** 2))
+        bit_count = max(64, (bit_count + 63) // 64 * 64)
+        hash_count = max(1, round(bit_count / count * math.log(2)))
+        return bit_count, hash_count
+
+    @classmethod
+    def build(cls, keys: Sequence[str], fpr: float) -> 'BloomFilter':
+        bit_count, hash_count = cls.parameters(len(keys), fpr)
+        bloom = cls(bytearray(bit_count // 8), bit_count, hash_count)
+        for key in keys:
+            for position in bloom._positions(key):
+                bloom.bits[position >> 3] |= 1 << (position & 7)
+        return bloom
+
+    def _positions(self, key: str) -> Iterator[int]:
+        h = fnv1a_64(key.encode('utf-8'))
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.bit_count
+
+    def might_contain(self, key: str) -> bool:
+        """False表示一定不存在；True表示可能存在"""
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def expected_fpr(self, count: int) -> float:
+        return (1 - math.exp(-self.hash_count * count / self.bit_count)) ** self.hash_count
+
+    def meta(self) -> Dict:
+        return {'bits': self.bit_count, 'hashes': self.hash_count, 'hash': 'fnv1a64-double'}
+
+
+# ==================== 有序拼音键 ====================
+
+def key_order(key: str) -> Tuple[str, str]:
+    """拼音键排序规则：先按去空格连写形式（与应用内Trie一致），再按原始键"""
+    return key.replace(' ', ''), key
+
+
+def lower_bound(count: int, is_less) -> int:
+    """在长度为count的有序序列中查找第一个不小于目标的位置，is_less(i)判断第i项是否小于目标"""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if is_less(mid):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# ==================== 版本3 Trie文件 ====================
+
+def iter_v3_entries(buf) -> Iterator[Tuple[str, List[Tuple[str, int]]]]:
+    """顺序读取版本3简化格式，逐个产出 (拼音, [(词语, 词频), ...])"""
+    view = memoryview(buf)
+    version, count = struct.unpack_from('<ii', view, 0)
+    if version != V3_VERSION:
+        raise ValueError(f"不支持的版本号 {version}，期望版本3")
+
+    unpack_int = struct.Struct('<i').unpack_from
+    pos = 8
+    for _ in range(count):
+        key_len = unpack_int(view, pos)[0]
+        pos += 4
+        key = bytes(view[pos:pos + key_len]).decode('utf-8')
+        pos += key_len
+        word_count = unpack_int(view, pos)[0]
+        pos += 4
+        words = []
+        for _ in range(word_count):
+            word_len = unpack_int(view, pos)[0]
+            pos += 4
+            word = bytes(view[pos:pos + word_len]).decode('utf-8')
+            pos += word_len
+            words.append((word, unpack_int(view, pos)[0]))
+            pos += 4
+        yield key, words
+
+
+def load_v3_file(path: str) -> Dict[str, List[Tuple[str, int]]]:
+    """把版本3文件完整读入 拼音 -> 词语列表 的字典"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return dict(iter_v3_entries(data))
+
+
+def save_v3_file(path: str, trie_data: Dict[str, List[Tuple[str, int]]]) -> int:
+    """按字典顺序写出版本3文件（拼音 -> [(词语, 词频)]），返回文件大小"""
+    out = bytearray(struct.pack('<ii', V3_VERSION, len(trie_data)))
+    pack_int = struct.Struct('<i').pack
+    for key, words in trie_data.items():
+        key_bytes = key.encode('utf-8')
+        out += pack_int(len(key_bytes)) + key_bytes + pack_int(len(words))
+        for word, frequency in words:
+            word_bytes = word.encode('utf-8')
+            out += pack_int(len(word_bytes)) + word_bytes + pack_int(frequency)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(out)
+    return len(out)
+
+
+def trie_asset_path(dict_name: str) -> str:
+    return f"app/src/main/assets/trie/{dict_name}_trie.dat"
+
+
+def indexed_asset_path(dict_name: str) -> str:
+    return f"app/src/main/assets/trie/{dict_name}_indexed.dat"
+
+
+def mph_asset_path(dict_name: str) -> str:
+    return f"app/src/main/assets/trie/{dict_name}_mph.dat"
+
+
+def bloom_asset_path(dict_name: str) -> str:
+    return f"app/src/main/assets/trie/{dict_name}_bloom.dat"
+
+
+def dict_source_path(dict_name: str) -> str:
+    return f"app/src/main/assets/cn_dicts/{dict_name}.dict.yaml"
+
+
+def load_source_entries(dict_name: str) -> Optional[List[Tuple[str, str, int]]]:
+    """读取词典源文件的全部词条 (词语, 无声调拼音, 词频)，文件不存在时返回None"""
+    from build_universal_trie import parse_dict_file
+
+    path = dict_source_path(dict_name)
+    if not os.path.exists(path):
+        return None
+    return parse_dict_file(path, 1.0)
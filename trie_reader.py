@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+神迹输入法 - 预编译Trie文件的Python读取器
+为模拟器、查询服务等工具提供统一的查询接口，按文件格式区分实现：
+
+    v3-hashmap  版本3文件整体读入后构建字符Trie，与应用内TrieManager的加载方式一致
+    v3-mmap     内存映射版本3文件，打开时扫描一次建立有序偏移索引，候选按需解码
+                （两种版本3读取器在文件旁有 {词典}_bloom.dat 时先查布隆过滤器，见 build_bloom_filter.py）
+    merged      多词典合并索引（build_merged_trie.py），磁盘上即为有序索引
+    indexed     单词典有序索引（build_indexed_trie.py），拼音键可为前缀压缩块
+
+所有读取器都以去空格连写的拼音查询，与应用内PinyinTrie一致。
+"""
+
+import heapq
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pinyin_alias import canonical_query
+from trie_format import MappedFile, is_container, iter_v3_entries, lower_bound, read_container
+
+WordList = List[Tuple[str, int]]
+
+
+def normalize_pinyin(pinyin: str) -> str:
+    """去掉音节分隔并转小写（与TrieManager加载时的处理一致），ü 的各种写法改为规范写法，
+    旧文件中 lü/lv 两种写法的键与查询都落到同一个连写形式上"""
+    return canonical_query(pinyin.replace(' ', '').replace("'", '').lower())
+
+
+def open_bloom_sidecar(path: str):
+    """版本3文件旁的布隆过滤器附属文件（build_bloom_filter.py），没有或已过期时返回None"""
+    from build_bloom_filter import BloomSidecar
+    return BloomSidecar.for_trie(path)
+
+
+def distinct_head(words: Iterator[Tuple[str, int]], limit: int) -> WordList:
+    """从按词频降序的候选中取前limit个不同的词语（同一词语多音时只保留最高词频）"""
+    seen = set()
+    result = []
+    for word, frequency in words:
+        if word not in seen:
+            seen.add(word)
+            result.append((word, frequency))
+            if len(result) >= limit:
+                break
+    return result
+
+
+def top_candidates(lists: Iterator[WordList], limit: int) -> WordList:
+    """合并多组按词频降序且已去重的候选，取前limit个；跨组的同一词语只保留最高词频"""
+    best: Dict[str, int] = {}
+    for words in lists:
+        for word, frequency in words:
+            if frequency > best.get(word, -1):
+                best[word] = frequency
+    return heapq.nlargest(limit, best.items(), key=lambda x: x[1])
+
+
+class TrieReader(ABC):
+    """读取器基类，子类未实现查询方法时无法实例化"""
+
+    format_name = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.load_ms = 0.0
+
+    @abstractmethod
+    def lookup(self, pinyin: str, limit: int = 50) -> WordList:
+        """精确查询一个拼音"""
+
+    @abstractmethod
+    def search_prefix(self, prefix: str, limit: int = 10) -> WordList:
+        """查询以prefix开头的所有拼音，返回词频最高的limit个候选"""
+
+    def close(self):
+        pass
+
+
+class V3HashMapReader(TrieReader):
+    """版本3文件：整体读入并构建字符Trie（对应应用内的加载后HashMap查询）"""
+
+    format_name = 'v3-hashmap'
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        start = time.perf_counter()
+        self.root: Dict = {}
+        with open(path, 'rb') as f:
+            data = f.read()
+        for key, words in iter_v3_entries(data):
+            node = self.root
+            for char in normalize_pinyin(key):
+                node = node.setdefault(char, {})
+            node.setdefault('', []).extend(words)
+        # 同一节点可能来自多个原始拼音（如 "xi an" 与 "xian"），加载后按词频重排
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char:
+                    stack.append(child)
+                else:
+                    child.sort(key=lambda x: x[1], reverse=True)
+        self.bloom = open_bloom_sidecar(path)
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def _find(self, pinyin: str) -> Optional[Dict]:
+        node = self.root
+        for char in normalize_pinyin(pinyin):
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def lookup(self, pinyin: str, limit: int = 50) -> WordList:
+        # 布隆过滤器判定不存在时直接返回，省去逐字符走Trie
+        if self.bloom is not None and not self.bloom.might_contain(pinyin):
+            return []
+        node = self._find(pinyin)
+        return distinct_head(node.get('', []), limit) if node else []
+
+    def search_prefix(self, prefix: str, limit: int = 10) -> WordList:
+        node = self._find(prefix)
+        if node is None:
+            return []
+
+        def subtree_lists():
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                for char, child in current.items():
+                    if char:
+                        stack.append(child)
+                    else:
+                        yield distinct_head(child, limit)
+
+        return top_candidates(subtree_lists(), limit)
+
+    def close(self):
+        if self.bloom is not None:
+            self.bloom.close()
+
+
+class SortedKeyReader(TrieReader):
+    """按连写拼音排序的索引读取器基类，子类提供键与候选的访问方式"""
+
+    @abstractmethod
+    def key_count(self) -> int:
+        """键的个数"""
+
+    @abstractmethod
+    def normalized_key(self, index: int) -> str:
+        """第index个键的连写形式"""
+
+    @abstractmethod
+    def candidates(self, index: int, limit: int) -> WordList:
+        """返回第index个键的前limit个不同候选（按词频降序）"""
+
+    def key(self, index: int) -> str:
+        """第index个键的原始写法（音节间含空格）；只保存连写形式的格式返回连写形式"""
+        return self.normalized_key(index)
+
+    def iter_entries(self) -> Iterator[Tuple[str, WordList]]:
+        """按键表顺序产出 (拼音键, 全部不同候选)，供分析工具遍历整个文件"""
+        for index in range(self.key_count()):
+            yield self.key(index), self.candidates(index, sys.maxsize)
+
+    def lower_bound_key(self, is_less: Callable[[str], bool]) -> int:
+        """第一个不满足 is_less(连写键) 的键下标；键表有自己的查找结构时由子类覆盖"""
+        return lower_bound(self.key_count(), lambda i: is_less(self.normalized_key(i)))
+
+    def key_range(self, prefix: str, exact: bool = False) -> Tuple[int, int]:
+        """返回连写形式等于（exact）或以prefix开头的键下标区间"""
+        start = self.lower_bound_key(lambda key: key < prefix)
+        if exact:
+            end = self.lower_bound_key(lambda key: key <= prefix)
+        else:
+            size = len(prefix)
+            end = self.lower_bound_key(lambda key: key[:size] <= prefix)
+        return start, max(start, end)
+
+    def lookup(self, pinyin: str, limit: int = 50) -> WordList:
+        start, end = self.key_range(normalize_pinyin(pinyin), exact=True)
+        return top_candidates((self.candidates(i, limit) for i in range(start, end)), limit)
+
+    def search_prefix(self, prefix: str, limit: int = 10) -> WordList:
+        start, end = self.key_range(normalize_pinyin(prefix))
+        return top_candidates((self.candidates(i, limit) for i in range(start, end)), limit)
+
+
+class V3MappedReader(SortedKeyReader):
+    """版本3文件：内存映射，打开时扫描一次记录每个键的候选偏移并排序"""
+
+    format_name = 'v3-mmap'
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        start = time.perf_counter()
+        self._file = MappedFile(path)
+        buf = self._file.buffer
+        unpack_int = struct.Struct('<i').unpack_from
+
+        count = unpack_int(buf, 4)[0]
+        index = []
+        pos = 8
+        for _ in range(count):
+            key_len = unpack_int(buf, pos)[0]
+            key = buf[pos + 4:pos + 4 + key_len].decode('utf-8')
+            pos += 4 + key_len
+            index.append((normalize_pinyin(key), pos))
+            word_count = unpack_int(buf, pos)[0]
+            pos += 4
+            for _ in range(word_count):
+                pos += 8 + unpack_int(buf, pos)[0]
+        index.sort()
+        self._keys = [key for key, _ in index]
+        self._offsets = [offset for _, offset in index]
+        self.bloom = open_bloom_sidecar(path)
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def key_count(self) -> int:
+        return len(self._keys)
+
+    def normalized_key(self, index: int) -> str:
+        return self._keys[index]
+
+    def entry_offset(self, index: int) -> int:
+        """第index个键的候选在版本3文件中的字节偏移"""
+        return self._offsets[index]
+
+    def _iter_words(self, index: int) -> Iterator[Tuple[str, int]]:
+        buf = self._file.buffer
+        unpack_int = struct.Struct('<i').unpack_from
+        pos = self._offsets[index]
+        word_count = unpack_int(buf, pos)[0]
+        pos += 4
+        for _ in range(word_count):
+            word_len = unpack_int(buf, pos)[0]
+            yield buf[pos + 4:pos + 4 + word_len].decode('utf-8'), unpack_int(buf, pos + 4 + word_len)[0]
+            pos += 8 + word_len
+
+    def lookup(self, pinyin: str, limit: int = 50) -> WordList:
+        # 布隆过滤器判定不存在时直接返回，省去二分查找
+        if self.bloom is not None and not self.bloom.might_contain(pinyin):
+            return []
+        return super().lookup(pinyin, limit)
+
+    def candidates(self, index: int, limit: int) -> WordList:
+        return distinct_head(self._iter_words(index), limit)
+
+    def close(self):
+        if self.bloom is not None:
+            self.bloom.close()
+        self._file.close()
+
+
+class MergedIndexReader(SortedKeyReader):
+    """合并索引文件：可限定单个来源词典，词频取该来源的词频，未限定时取各来源最高词频"""
+
+    format_name = 'merged'
+
+    def __init__(self, path: str, source: Optional[str] = None):
+        super().__init__(path)
+        from build_merged_trie import MergedTrieReader
+
+        start = time.perf_counter()
+        self._reader = MergedTrieReader(path)
+        self.source = source
+        if source is not None and source not in self._reader.sources:
+            raise ValueError(f"合并索引中没有来源词典: {source}")
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def key_count(self) -> int:
+        return len(self._reader.keys)
+
+    def normalized_key(self, index: int) -> str:
+        return self._reader.keys[index].replace(' ', '')
+
+    def key(self, index: int) -> str:
+        return self._reader.keys[index]
+
+    def candidates(self, index: int, limit: int) -> WordList:
+        return self._reader.top_candidates_at(index, limit, self.source)
+
+    def close(self):
+        self._reader.close()
+
+
+class IndexedIndexReader(SortedKeyReader):
+    """单词典有序索引文件：候选已去重并按词频降序，查找直接使用文件内的键表"""
+
+    format_name = 'indexed'
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        from build_indexed_trie import IndexedTrie
+
+        start = time.perf_counter()
+        self._trie = IndexedTrie(path)
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def key_count(self) -> int:
+        return self._trie.key_count()
+
+    def normalized_key(self, index: int) -> str:
+        return self._trie.key(index).replace(' ', '')
+
+    def key(self, index: int) -> str:
+        return self._trie.key(index)
+
+    def lower_bound_key(self, is_less: Callable[[str], bool]) -> int:
+        return self._trie.lower_bound(lambda key: is_less(key.replace(' ', '')))
+
+    def lookup(self, pinyin: str, limit: int = 50) -> WordList:
+        # 布隆过滤器判定不存在时直接返回，省去二分查找
+        if not self._trie.might_contain(normalize_pinyin(pinyin)):
+            return []
+        return super().lookup(pinyin, limit)
+
+    def candidates(self, index: int, limit: int) -> WordList:
+        return self._trie.candidates(index, limit)
+
+    def close(self):
+        self._trie.close()
+
+
+# 格式名 -> 构造函数，新增格式在此注册
+READERS: Dict[str, Callable[..., TrieReader]] = {
+    V3HashMapReader.format_name: V3HashMapReader,
+    V3MappedReader.format_name: V3MappedReader,
+    MergedIndexReader.format_name: MergedIndexReader,
+    IndexedIndexReader.format_name: IndexedIndexReader,
+}
+
+
+def detect_formats(path: str) -> List[str]:
+    """根据文件头返回可用于该文件的读取格式"""
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    if not is_container(head):
+        return [V3HashMapReader.format_name, V3MappedReader.format_name]
+    # 分段目录位于文件头部，只需解析标签
+    sections = read_container(head)
+    if 'CMSK' in sections:
+        return [MergedIndexReader.format_name]
+    if 'KIDX' in sections:
+        return [IndexedIndexReader.format_name]
+    return []
+
+
+def open_reader(path: str, format_name: Optional[str] = None, **kwargs) -> TrieReader:
+    """打开预编译文件，未指定格式时使用文件头检测到的第一种"""
+    if format_name is None:
+        formats = detect_formats(path)
+        if not formats:
+            raise ValueError(f"无法识别的文件格式: {path}")
+        format_name = formats[0]
+    if format_name not in READERS:
+        raise ValueError(f"未知的读取格式: {format_name}")
+    return READERS[format_name](path, **kwargs)